@@ -0,0 +1,102 @@
+"""
+Per-dataset cost of the standard actions on header-heavy datasets: every element called through the dataset-level
+action with its tag, which looks the element up again and converts it, compared with the element handlers of
+actions.ELEMENT_HANDLERS resolved per VR by apply_action.
+
+The rules dataset has one element for every tag of the standard tables, with a value of its dictionary VR. The
+datasets are parsed from the encoded file before each round, so that the elements are raw as in a real run.
+
+Usage: python -m benchmarks.bench_actions [--files N] [--rounds N]
+"""
+import argparse
+import gc
+import io
+import time
+
+import pydicom
+from pydicom.datadict import dictionary_VR
+from pydicom.sequence import Sequence
+
+from benchmarks.synthetic import make_ct_dataset, make_nested_dataset
+from src.actions import apply_action, keep
+from src.profile import compile_profile
+
+# Value of each VR for the rules dataset, the ambiguous VRs take the first one
+_VALUES = {
+    'AE': 'STATION', 'AS': '045Y', 'AT': 0x00100010, 'CS': 'VALUE', 'DA': '20230412', 'DS': ['0.5', '0.5'],
+    'DT': '20230412101010', 'FD': 1.5, 'FL': 1.5, 'IS': '3', 'LO': 'long string', 'LT': 'long text', 'OB': b'\1\2',
+    'OD': bytes(8), 'OF': bytes(4), 'OL': bytes(4), 'OV': bytes(8), 'OW': b'\1\2', 'PN': 'Doe^John',
+    'SH': 'short', 'SL': -1, 'SS': -1, 'ST': 'short text', 'SV': -1, 'TM': '101010', 'UC': 'unlimited',
+    'UI': '1.2.826.0.1.3680043.8.498.1', 'UL': 1, 'UN': b'unknown', 'UR': 'http://example.com', 'US': 1,
+    'UT': 'unlimited text', 'UV': 1,
+}
+
+
+def make_rules_dataset(profile) -> pydicom.Dataset:
+    dataset = make_ct_dataset()
+    for group, element in profile.actions:
+        # The file meta information, command and delimitation elements cannot be written in a dataset
+        if group in (0x0000, 0x0002) or group >= 0xFFFE or (group, element) == (0x7FE0, 0x0010):
+            continue
+        try:
+            vr = dictionary_VR((group, element)).split(' or ')[0]
+        except KeyError:
+            continue
+        if vr == 'SQ':
+            item = pydicom.Dataset()
+            item.PatientName = 'Doe^Jane'
+            item.StudyDate = '20230412'
+            item.ReferencedSOPInstanceUID = '1.2.826.0.1.3680043.8.498.2'
+            dataset.add_new((group, element), vr, Sequence([item]))
+        else:
+            dataset.add_new((group, element), vr, _VALUES[vr])
+    return dataset
+
+
+def encode(dataset: pydicom.Dataset) -> bytes:
+    buffer = io.BytesIO()
+    dataset.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def call_action(action, dataset, tag) -> None:
+    action(dataset, (tag.group, tag.element))
+
+
+def apply_actions(dataset: pydicom.Dataset, profile, apply) -> None:
+    get_action = profile.get_action
+    for tag in list(dataset.keys()):
+        action = get_action(tag)
+        if action is not None and action is not keep:
+            apply(action, dataset, tag)
+
+
+def measure(data: bytes, files: int, profile, apply) -> float:
+    datasets = [pydicom.dcmread(io.BytesIO(data)) for _ in range(files)]
+    gc.collect()
+    start = time.perf_counter()
+    for dataset in datasets:
+        apply_actions(dataset, profile, apply)
+    return (time.perf_counter() - start) / files
+
+
+def run(files: int, rounds: int) -> None:
+    profile = compile_profile()
+    datasets = (('standard rules', make_rules_dataset(profile)), ('nested', make_nested_dataset()))
+    for name, dataset in datasets:
+        data = encode(dataset)
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise
+        called = handled = float('inf')
+        for _ in range(rounds):
+            called = min(called, measure(data, files, profile, call_action))
+            handled = min(handled, measure(data, files, profile, apply_action))
+        print('{:15s} {:4d} elements: action(dataset, tag) {:8.1f} us/dataset, element handlers {:8.1f} us/dataset, '
+              'x{:.2f}'.format(name, len(dataset), called * 1e6, handled * 1e6, called / handled))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the element handlers of the standard actions')
+    parser.add_argument('--files', type=int, default=100, help='Number of datasets per round')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.files, args.rounds)
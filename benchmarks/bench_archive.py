@@ -0,0 +1,79 @@
+"""
+Files per second of the anonymization of a ZIP archive of small instances: extracted to disk, anonymized file by file
+and packed again, compared with the members streamed through src.archive without touching the disk.
+
+Usage: python -m benchmarks.bench_archive [--files N] [--workers N] [--rounds N]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from benchmarks.synthetic import make_ct_dataset
+from src.anonymizer import anonymize_dicom_file
+from src.archive import anonymize_archive
+from src.profile import compile_profile
+from src.utils import iter_files
+
+
+def make_archive(path: str, files: int) -> None:
+    dataset = make_ct_dataset(64, 64)
+    with tempfile.TemporaryDirectory() as folder, zipfile.ZipFile(path, 'w') as archive:
+        file_path = os.path.join(folder, 'instance.dcm')
+        for index in range(files):
+            dataset.SOPInstanceUID = dataset.file_meta.MediaStorageSOPInstanceUID = '1.2.3.4.{}'.format(index)
+            dataset.save_as(file_path, enforce_file_format=True)
+            archive.write(file_path, 'study/series/{:06d}.dcm'.format(index))
+
+
+def run_unpacked(archive_path: str, folder: str, profile) -> float:
+    """
+    Extract, anonymize the files and pack them again
+    """
+    input_folder = os.path.join(folder, 'extracted')
+    output_folder = os.path.join(folder, 'anonymized')
+    start = time.perf_counter()
+    with zipfile.ZipFile(archive_path) as archive:
+        archive.extractall(input_folder)
+    for relative_path in iter_files(input_folder):
+        output_path = os.path.join(output_folder, relative_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        anonymize_dicom_file(os.path.join(input_folder, relative_path), output_path, profile=profile)
+    with zipfile.ZipFile(os.path.join(folder, 'unpacked.zip'), 'w') as archive:
+        for relative_path in iter_files(output_folder):
+            archive.write(os.path.join(output_folder, relative_path), relative_path)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(input_folder)
+    shutil.rmtree(output_folder)
+    return elapsed
+
+
+def run_streamed(archive_path: str, folder: str, profile, workers: int) -> float:
+    start = time.perf_counter()
+    anonymize_archive(archive_path, os.path.join(folder, 'streamed.zip'), profile, workers=workers)
+    return time.perf_counter() - start
+
+
+def run(files: int, workers: int, rounds: int) -> None:
+    profile = compile_profile()
+    with tempfile.TemporaryDirectory() as folder:
+        archive_path = os.path.join(folder, 'input.zip')
+        make_archive(archive_path, files)
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise
+        unpacked = streamed = float('inf')
+        for _ in range(rounds):
+            unpacked = min(unpacked, run_unpacked(archive_path, folder, profile))
+            streamed = min(streamed, run_streamed(archive_path, folder, profile, workers))
+        print('{} members: extract, anonymize and pack {:7.1f} files/s, streamed with {} worker(s) {:7.1f} files/s'
+              .format(files, files / unpacked, workers, files / streamed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the archive mode')
+    parser.add_argument('--files', type=int, default=2000, help='Number of members of the archive')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes of the streamed mode')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.files, args.workers, args.rounds)
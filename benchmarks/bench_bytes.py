@@ -0,0 +1,66 @@
+"""
+Latency per instance (p50 / p99) of the in-memory anonymization of small CT slices, compared with the file based
+anonymization through temporary files, as done by a DICOM router without anonymize_bytes.
+
+Usage: python -m benchmarks.bench_bytes [--instances N] [--size N] [--directory PATH]
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import make_ct_dataset
+from src.anonymizer import anonymize_bytes, anonymize_dicom_file
+from src.profile import compile_profile
+
+
+def make_instance(size: int) -> bytes:
+    out = io.BytesIO()
+    make_ct_dataset(size, size).save_as(out, enforce_file_format=True)
+    return out.getvalue()
+
+
+def percentile(latencies: list, percent: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+
+def through_files(data: bytes, directory: str) -> bytes:
+    in_file = os.path.join(directory, 'bench_bytes_in.dcm')
+    out_file = os.path.join(directory, 'bench_bytes_out.dcm')
+    with open(in_file, 'wb') as fp:
+        fp.write(data)
+    anonymize_dicom_file(in_file, out_file)
+    with open(out_file, 'rb') as fp:
+        data = fp.read()
+    os.remove(in_file)
+    os.remove(out_file)
+    return data
+
+
+def run(instances: int, size: int, directory: str) -> None:
+    data = make_instance(size)
+    profile = compile_profile()
+    print('{} instances of {:.0f} kB'.format(instances, len(data) / 1e3))
+
+    for name, function in (('temporary files', lambda: through_files(data, directory)),
+                           ('anonymize_bytes', lambda: anonymize_bytes(data, profile=profile)),
+                           ('memoryview', lambda: anonymize_bytes(memoryview(data), profile=profile))):
+        function()
+        latencies = []
+        for _ in range(instances):
+            start = time.perf_counter()
+            function()
+            latencies.append(time.perf_counter() - start)
+        print('{:16s} p50 {:7.2f} ms  p99 {:7.2f} ms'.format(name, percentile(latencies, 50) * 1e3,
+                                                           percentile(latencies, 99) * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the latency of the in-memory anonymization')
+    parser.add_argument('--instances', type=int, default=1000, help='Number of anonymized instances')
+    parser.add_argument('--size', type=int, default=512, help='Rows and columns of the CT slices')
+    parser.add_argument('--directory', type=str, default=tempfile.gettempdir(), help='Directory of the temporary files')
+    args = parser.parse_args()
+    run(args.instances, args.size, args.directory)
@@ -0,0 +1,118 @@
+"""
+Size and cost of the output codecs of src.compression on a CT series with a smooth phantom and noise in its pixel
+data, and per-file time of the anonymization with the compression done by the caller or by the writer threads.
+
+Usage: python -m benchmarks.bench_compression [--slices N] [--size N] [--rounds N]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import pydicom
+from pydicom.uid import generate_uid
+
+from benchmarks.synthetic import make_ct_dataset
+from src.anonymizer import anonymize_dataset, anonymize_dicom_file
+from src.compression import CODECS, ZSTD, OutputWriter, check_codec, compressed_path, write_compressed
+from src.profile import compile_profile
+
+
+def phantom(size: int, seed: int) -> bytes:
+    """
+    12 bits image of an ellipse with soft tissue values and Gaussian noise, in air
+    """
+    import numpy as np
+
+    generator = np.random.default_rng(seed)
+    y, x = np.ogrid[-1:1:size * 1j, -1:1:size * 1j]
+    body = (x / 0.8) ** 2 + (y / 0.6) ** 2 <= 1
+    image = np.where(body, 1040.0, 24.0) + generator.normal(0, 12, (size, size))
+    return np.clip(image, 0, 4095).astype('<u2').tobytes()
+
+
+def write_series(folder: str, slices: int, size: int) -> list:
+    template = make_ct_dataset(size, size)
+    template.StudyInstanceUID = generate_uid()
+    template.SeriesInstanceUID = generate_uid()
+    paths = []
+    for index in range(slices):
+        template.SOPInstanceUID = template.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        template.InstanceNumber = index + 1
+        template.PixelData = phantom(size, index)
+        path = os.path.join(folder, 'ct_{:05d}.dcm'.format(index))
+        template.save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def measure_caller(paths: list, output_folder: str, profile, codec: str) -> float:
+    """
+    Read, anonymize, compress and write each file in turn
+    """
+    gc.collect()
+    start = time.perf_counter()
+    for path in paths:
+        dataset = pydicom.dcmread(path)
+        anonymize_dataset(dataset, profile=profile)
+        write_compressed(dataset, compressed_path(os.path.join(output_folder, os.path.basename(path)), codec), codec)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def measure_writer(paths: list, output_folder: str, profile, codec: str) -> tuple:
+    """
+    Read and anonymize each file while the previous ones are compressed and written by the writer thread
+    """
+    writer = OutputWriter(codec)
+    gc.collect()
+    start = time.perf_counter()
+    for path in paths:
+        anonymize_dicom_file(path, compressed_path(os.path.join(output_folder, os.path.basename(path)), codec),
+                             profile=profile, writer=writer)
+    errors = writer.close()
+    if errors:
+        raise RuntimeError(errors)
+    return (time.perf_counter() - start) / len(paths), writer.report
+
+
+def run(slices: int, size: int, rounds: int) -> None:
+    profile = compile_profile()
+    codecs = list(CODECS)
+    try:
+        check_codec(ZSTD)
+    except ImportError:
+        print('zstandard is not installed, zstd skipped')
+        codecs.remove(ZSTD)
+    with tempfile.TemporaryDirectory() as folder:
+        input_folder = os.path.join(folder, 'in')
+        output_folder = os.path.join(folder, 'out')
+        os.makedirs(input_folder)
+        os.makedirs(output_folder)
+        paths = write_series(input_folder, slices, size)
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise
+        caller = {}
+        writer = {}
+        reports = {}
+        for _ in range(rounds):
+            for codec in codecs:
+                caller[codec] = min(caller.get(codec, float('inf')),
+                                    measure_caller(paths, output_folder, profile, codec))
+                seconds, reports[codec] = measure_writer(paths, output_folder, profile, codec)
+                writer[codec] = min(writer.get(codec, float('inf')), seconds)
+        for codec in codecs:
+            report = reports[codec]
+            input_bytes, output_bytes = report.input_bytes[codec], report.output_bytes[codec]
+            print('{:8s} {} slices {}x{}: {:5.1f}% saved, {:7.2f} CPU ms/file, {:7.2f} ms/file compressed by the '
+                  'caller, {:7.2f} ms/file by the writer thread'.format(
+                      codec, slices, size, size, 100 * (1 - output_bytes / input_bytes),
+                      report.cpu_seconds[codec] / slices * 1e3, caller[codec] * 1e3, writer[codec] * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the output codecs')
+    parser.add_argument('--slices', type=int, default=50, help='Number of slices of the series')
+    parser.add_argument('--size', type=int, default=512, help='Number of rows and columns of the slices')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.slices, args.size, args.rounds)
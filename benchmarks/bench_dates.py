@@ -0,0 +1,95 @@
+"""
+Per-file cost of the date shifting of src.date_shift on datasets with hundreds of date elements (per-frame functional
+groups of multi-frame images), compared with the constant dates and with a shift parsing the values one at a time.
+
+Usage: python -m benchmarks.bench_dates [--frames N] [--files N] [--rounds N]
+"""
+import argparse
+import copy
+import datetime
+import gc
+import time
+
+import pydicom
+from pydicom.sequence import Sequence
+
+from benchmarks.synthetic import make_ct_dataset
+from src import date_shift
+from src.actions import set_date_shifter
+from src.anonymizer import anonymize_dataset
+from src.date_shift import DateShifter
+from src.profile import compile_profile
+
+
+def make_multi_frame_dataset(frames: int) -> pydicom.Dataset:
+    """
+    Dataset with two date times per frame in its per-frame functional groups, and the usual study dates
+    """
+    dataset = make_ct_dataset(16, 16)
+    dataset.StudyDate = dataset.SeriesDate = dataset.ContentDate = '20230412'
+    dataset.PatientBirthDate = '19800229'
+    dataset.AcquisitionDateTime = '20230412101533.000000'
+    per_frame = []
+    for frame in range(frames):
+        content = pydicom.Dataset()
+        content.FrameAcquisitionDateTime = '20230412101533.{:06d}'.format(frame)
+        content.FrameReferenceDateTime = '20230412101533.{:06d}+0200'.format(frame)
+        item = pydicom.Dataset()
+        item.FrameContentSequence = Sequence([content])
+        per_frame.append(item)
+    dataset.PerFrameFunctionalGroupsSequence = Sequence(per_frame)
+    return dataset
+
+
+def shift_dates_one_by_one(dates, days: int) -> list:
+    """
+    Reference: parse and format every date with datetime
+    """
+    shifted = []
+    for date in dates:
+        try:
+            shifted.append((datetime.datetime.strptime(date, '%Y%m%d') + datetime.timedelta(days)).strftime('%Y%m%d'))
+        except ValueError:
+            shifted.append(None)
+    return shifted
+
+
+def measure(template, files: int, profile) -> float:
+    datasets = [copy.deepcopy(template) for _ in range(files)]
+    gc.collect()
+    start = time.perf_counter()
+    for dataset in datasets:
+        anonymize_dataset(dataset, profile=profile)
+    return (time.perf_counter() - start) / files
+
+
+def run(frames: int, files: int, rounds: int) -> None:
+    profile = compile_profile()
+    shifter = DateShifter(b'benchmark secret')
+    vectorized = date_shift.shift_dates
+    template = make_multi_frame_dataset(frames)
+    # Best of the rounds, the modes are interleaved so that they see the same machine noise
+    constant = batched = one_by_one = float('inf')
+    for _ in range(rounds):
+        set_date_shifter(None)
+        constant = min(constant, measure(template, files, profile))
+        set_date_shifter(shifter)
+        batched = min(batched, measure(template, files, profile))
+        date_shift.shift_dates = shift_dates_one_by_one
+        try:
+            one_by_one = min(one_by_one, measure(template, files, profile))
+        finally:
+            date_shift.shift_dates = vectorized
+    set_date_shifter(None)
+    print('{} date elements: constant dates {:8.1f} us/file, shifted with NumPy {:8.1f} us/file, '
+          'shifted one by one {:8.1f} us/file'.format(2 * frames + 5, constant * 1e6, batched * 1e6,
+                                                       one_by_one * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the date shifting')
+    parser.add_argument('--frames', type=int, default=200, help='Number of frames, with two date times each')
+    parser.add_argument('--files', type=int, default=50, help='Number of files per round')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.frames, args.files, args.rounds)
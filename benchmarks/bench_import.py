@@ -0,0 +1,65 @@
+"""
+Import time of the anonymizer (python -X importtime) and cost of the first access to the tag tables, loaded from
+the compiled modules or parsed from the JSON file.
+
+Usage: python -m benchmarks.bench_import [--runs N]
+"""
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+
+_FIRST_USE = '''
+import time
+start = time.perf_counter()
+from src import dicomfields
+if {json}:
+    tags = dicomfields.load_json_tags()
+    tables = [dicomfields.convert_tags(tags[name]) for name in dicomfields.TABLE_NAMES]
+else:
+    tables = [getattr(dicomfields, name) for name in dicomfields.TABLE_NAMES]
+print(time.perf_counter() - start)
+'''
+
+
+def import_times(module: str, root: str) -> dict:
+    """
+    Cumulative import time in microseconds of the modules of the project, see python -X importtime
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)], cwd=root,
+                            check=True, capture_output=True, text=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name.startswith('src'):
+            times[name] = int(cumulative)
+    return times
+
+
+def run(runs: int) -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Measure with the bytecode cache, as an installed package, even if PYTHONDONTWRITEBYTECODE is set
+    compileall.compile_dir(os.path.join(root, 'src'), quiet=1)
+    for module in ('src.actions', 'src.anonymizer'):
+        samples = [import_times(module, root) for _ in range(runs)]
+        print('import {}'.format(module))
+        for name in samples[0]:
+            print('    {:28s} {:8.1f} ms'.format(name, statistics.median(sample[name] for sample in samples) / 1e3))
+
+    for name, from_json in (('compiled modules', False), ('JSON file', True)):
+        samples = [float(subprocess.run([sys.executable, '-c', _FIRST_USE.format(json=from_json)], cwd=root,
+                                        check=True, capture_output=True, text=True).stdout)
+                   for _ in range(runs)]
+        print('tag tables from the {:16s} {:8.2f} ms'.format(name, statistics.median(samples) * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the import time and the loading of the tag tables')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs, the median is reported')
+    args = parser.parse_args()
+    run(args.runs)
@@ -0,0 +1,76 @@
+"""
+Per-file cost of the repeating group rules of the standard profile, e.g. (60xx,3000) Overlay Data, matched with the
+mask table of the profile, compared with the profile without them and with one dataset.walk per masked rule.
+
+Usage: python -m benchmarks.bench_masked [--files N] [--rounds N]
+"""
+import argparse
+import copy
+import gc
+import time
+
+from benchmarks.synthetic import make_ct_dataset, make_nested_dataset
+from src.anonymizer import anonymize_dataset
+from src.profile import AnonymizationProfile, compile_profile
+
+
+def add_overlays(dataset, overlays: int = 4):
+    for index in range(overlays):
+        group = 0x6000 + 2 * index
+        dataset.add_new((group, 0x0010), 'US', 64)
+        dataset.add_new((group, 0x0011), 'US', 64)
+        dataset.add_new((group, 0x4000), 'LT', 'Overlay comment {}'.format(index))
+        dataset.add_new((group, 0x3000), 'OW', bytes(64 * 64 // 8))
+    return dataset
+
+
+def walk_masked_rules(dataset, profile: AnonymizationProfile) -> None:
+    """
+    Reference: one walk of the whole dataset per repeating group rule
+    """
+    for (group, element, group_mask, element_mask), action in profile.masked_actions:
+        def callback(sub_dataset, data_element):
+            tag = data_element.tag
+            if tag.group & group_mask == group and tag.element & element_mask == element:
+                action(sub_dataset, (tag.group, tag.element))
+        dataset.walk(callback)
+
+
+def measure(template, files: int, anonymize) -> float:
+    datasets = [copy.deepcopy(template) for _ in range(files)]
+    gc.collect()
+    start = time.perf_counter()
+    for dataset in datasets:
+        anonymize(dataset)
+    return (time.perf_counter() - start) / files
+
+
+def run(files: int, rounds: int) -> None:
+    profile = compile_profile()
+    unmasked = AnonymizationProfile(profile.actions, (), profile.private_tags)
+    for name, template in (('CT', make_ct_dataset()), ('CT with overlays', add_overlays(make_ct_dataset())),
+                           ('nested', make_nested_dataset())):
+        def walked_anonymize(dataset):
+            anonymize_dataset(dataset, profile=unmasked)
+            walk_masked_rules(dataset, profile)
+
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise
+        without = masked = walked = float('inf')
+        for _ in range(rounds):
+            without = min(without, measure(template, files, lambda dataset: anonymize_dataset(dataset,
+                                                                                              profile=unmasked)))
+            masked = min(masked, measure(template, files, lambda dataset: anonymize_dataset(dataset,
+                                                                                           profile=profile)))
+            walked = min(walked, measure(template, files, walked_anonymize))
+
+        print('{:18s} without masked rules {:8.1f} us/file, mask table {:8.1f} us/file (+{:4.1f}%), '
+              'walk per rule {:8.1f} us/file'.format(name, without * 1e6, masked * 1e6,
+                                                     (masked / without - 1) * 100, walked * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the repeating group rules')
+    parser.add_argument('--files', type=int, default=200, help='Number of files per dataset and round')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.files, args.rounds)
@@ -0,0 +1,81 @@
+"""
+Peak memory and throughput of anonymize_dicom_file reading a large multi-frame file with Python file reads, through a
+memory map, and with the pixel data streamed. Each mode runs in its own process, and the pixel data of the outputs is
+compared byte for byte.
+
+The pages of the mapped file are counted in the resident memory of the process, they belong to the page cache and
+are not copies: the peak of the anonymous memory (RssAnon, sampled while the file is anonymized) is reported too.
+
+Usage: python -m benchmarks.bench_memory_map [--size-mb N] [--directory PATH]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.bench_streaming import make_large_file, same_pixel_data
+
+_MEASURE = '''
+import json, sys, threading, time
+from src.anonymizer import anonymize_dicom_file
+
+def read_status(field):
+    with open("/proc/self/status") as status:
+        return int([line for line in status if line.startswith(field)][0].split()[1])
+
+peak_anonymous_kb = 0
+done = threading.Event()
+
+def sample():
+    global peak_anonymous_kb
+    while not done.wait(0.005):
+        peak_anonymous_kb = max(peak_anonymous_kb, read_status("RssAnon"))
+
+sampler = threading.Thread(target=sample)
+sampler.start()
+start = time.perf_counter()
+anonymize_dicom_file(sys.argv[1], sys.argv[2], **json.loads(sys.argv[3]))
+elapsed = time.perf_counter() - start
+done.set()
+sampler.join()
+peak_anonymous_kb = max(peak_anonymous_kb, read_status("RssAnon"))
+print(json.dumps({"seconds": elapsed, "max_rss_kb": read_status("VmHWM"), "max_anonymous_kb": peak_anonymous_kb}))
+'''
+
+_MODES = (('file reads', {}), ('memory map', {'memory_map': True}), ('streamed', {'stream_pixel_data': True}))
+
+
+def run(size_mb: int, directory: str) -> None:
+    if not os.path.exists('/proc/self/status'):
+        raise SystemExit('The memory is read from /proc, Linux only')
+    in_file = os.path.join(directory, 'bench_memory_map_in.dcm')
+    make_large_file(in_file, size_mb)
+    size = os.path.getsize(in_file)
+    print('input: {:.0f} MB'.format(size / 1e6))
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out_files = {}
+    for index, (name, options) in enumerate(_MODES):
+        out_file = os.path.join(directory, 'bench_memory_map_out_{}.dcm'.format(index))
+        output = subprocess.run([sys.executable, '-c', _MEASURE, in_file, out_file, json.dumps(options)], cwd=root,
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print('{:10s} {:6.2f}s {:7.1f} MB/s  peak RSS {:7.1f} MB  peak anonymous RSS {:7.1f} MB'.format(
+            name, result['seconds'], size / result['seconds'] / 1e6, result['max_rss_kb'] / 1024,
+            result['max_anonymous_kb'] / 1024))
+        out_files[name] = out_file
+
+    reference = out_files['file reads']
+    print('identical pixel data:', all(same_pixel_data(reference, path) for path in out_files.values()))
+    for path in [in_file] + list(out_files.values()):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the memory-mapped reading')
+    parser.add_argument('--size-mb', type=int, default=1024, help='Size of the pixel data of the input file')
+    parser.add_argument('--directory', type=str, default=tempfile.gettempdir(), help='Directory of the files')
+    args = parser.parse_args()
+    run(args.size_mb, args.directory)
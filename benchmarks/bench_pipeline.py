@@ -0,0 +1,100 @@
+"""
+Files per second of the sequential loop and of the asynchronous pipeline on a simulated high latency file system:
+every read and every write of a file sleeps for a fixed latency, like a round trip to a network mount.
+
+Usage: python -m benchmarks.bench_pipeline [--files N] [--latency-ms N] [--io-concurrency N] [--directory PATH]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import make_ct_dataset
+from src.anonymizer import anonymize_dicom_file
+from src.pipeline import read_file, run_pipeline, write_file
+from src.profile import compile_profile
+
+
+class SlowFileSystem:
+    """
+    Local stand-in for a network file system, adding a latency to every read and every write
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def read(self, path: str) -> bytes:
+        time.sleep(self.latency)
+        return read_file(path)
+
+    def write(self, path: str, data: bytes) -> None:
+        time.sleep(self.latency)
+        write_file(path, data)
+
+
+def make_files(directory: str, files: int) -> list:
+    dataset = make_ct_dataset(256, 256)
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, 'in', '{}.dcm'.format(index))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dataset.SOPInstanceUID = '1.2.3.4.{}'.format(index)
+        dataset.save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def run_sequential(paths: list, out_folder: str, file_system: SlowFileSystem) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        # Same latency as the pipeline, the file is read and written once
+        time.sleep(file_system.latency)
+        anonymize_dicom_file(path, os.path.join(out_folder, os.path.basename(path)))
+        time.sleep(file_system.latency)
+    return time.perf_counter() - start
+
+
+def run_async(paths: list, out_folder: str, file_system: SlowFileSystem, io_concurrency: int,
+              queue_size: int) -> float:
+    tasks = [(path, os.path.join(out_folder, os.path.basename(path)), None) for path in paths]
+    errors = []
+    start = time.perf_counter()
+    asyncio.run(run_pipeline(tasks, compile_profile(), on_result=lambda result: errors.append(result['error']),
+                             io_concurrency=io_concurrency, queue_size=queue_size, read=file_system.read,
+                             write=file_system.write))
+    elapsed = time.perf_counter() - start
+    if any(error is not None for error in errors):
+        raise RuntimeError([error for error in errors if error is not None][0])
+    return elapsed
+
+
+def run(files: int, latency_ms: float, io_concurrency: int, queue_size: int, directory: str) -> None:
+    directory = tempfile.mkdtemp(dir=directory)
+    try:
+        paths = make_files(directory, files)
+        file_system = SlowFileSystem(latency_ms / 1000)
+        print('{} files, {:.0f} ms latency per read and per write'.format(files, latency_ms))
+
+        out_folder = os.path.join(directory, 'out_sequential')
+        os.makedirs(out_folder)
+        elapsed = run_sequential(paths, out_folder, file_system)
+        print('sequential          {:8.1f} files/s'.format(files / elapsed))
+
+        out_folder = os.path.join(directory, 'out_async')
+        elapsed = run_async(paths, out_folder, file_system, io_concurrency, queue_size)
+        print('pipeline ({:2d} I/O)   {:8.1f} files/s'.format(io_concurrency, files / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the asynchronous pipeline on a slow file system')
+    parser.add_argument('--files', type=int, default=200, help='Number of files')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Latency of every read and write')
+    parser.add_argument('--io-concurrency', type=int, default=8, help='Concurrent reads and writes of the pipeline')
+    parser.add_argument('--queue-size', type=int, default=16, help='Size of the queues of the pipeline')
+    parser.add_argument('--directory', type=str, default=tempfile.gettempdir(), help='Directory of the files')
+    args = parser.parse_args()
+    run(args.files, args.latency_ms, args.io_concurrency, args.queue_size, args.directory)
@@ -0,0 +1,44 @@
+"""
+Per-file overhead of building the anonymization rules for every dataset versus sharing a compiled profile.
+
+Usage: python -m benchmarks.bench_profile [--files N]
+"""
+import argparse
+import copy
+import time
+
+from benchmarks.synthetic import make_ct_dataset
+from src.actions import initialize_actions
+from src.anonymizer import anonymize_dataset
+from src.profile import compile_profile
+
+
+def run(files: int) -> None:
+    template = make_ct_dataset()
+    datasets = [copy.deepcopy(template) for _ in range(2 * files)]
+    profile = compile_profile()
+
+    start = time.perf_counter()
+    for _ in range(files):
+        initialize_actions()
+    setup = (time.perf_counter() - start) / files
+
+    start = time.perf_counter()
+    for dataset in datasets[:files]:
+        anonymize_dataset(dataset, {})
+    rebuilt = (time.perf_counter() - start) / files
+
+    start = time.perf_counter()
+    for dataset in datasets[files:]:
+        anonymize_dataset(dataset, profile=profile)
+    shared = (time.perf_counter() - start) / files
+
+    print('initialize_actions:          {:8.1f} us/file'.format(setup * 1e6))
+    print('anonymize_dataset (rebuilt): {:8.1f} us/file'.format(rebuilt * 1e6))
+    print('anonymize_dataset (profile): {:8.1f} us/file'.format(shared * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the compiled anonymization profile')
+    parser.add_argument('--files', type=int, default=500, help='Number of datasets to anonymize')
+    run(parser.parse_args().files)
@@ -0,0 +1,96 @@
+"""
+Cost of the pseudonyms of a batch whose identifying values repeat across the files: the pseudonym function called for
+every value, the front cache of each worker, and the front caches backed by a cache shared by the workers (see
+src.pseudonym). The files are lists of the values of the pseudonymized tags, spread across a pool of workers by
+chunks as in main.py, so that only the pseudonyms are measured.
+
+The pseudonyms are computed with a number of PBKDF2 iterations (--iterations), 1 for a plain HMAC-SHA256. The number
+of pseudonyms computed by all the workers is reported with the time of the batch.
+
+Usage: python -m benchmarks.bench_pseudonym [--files N] [--patients N] [--workers N] [--iterations N] [--rounds N]
+"""
+import argparse
+import multiprocessing
+import time
+
+from src.actions import get_pseudonymizer, set_pseudonymizer
+from src.pseudonym import PSEUDONYM_TAGS, CachedPseudonymizer, KeyedPseudonyms, start_shared_cache
+from src.stats import enable_stats, get_stats
+
+
+def make_files(files: int, patients: int) -> list:
+    """
+    Values of the pseudonymized tags of each file, the files of a patient share their values and all the patients
+    share the values of their institution
+    """
+    institution_values = {(0x0008, 0x0080): 'General Hospital', (0x0008, 0x0081): '1 Main Street',
+                          (0x0008, 0x1010): 'CT01', (0x0008, 0x1040): 'Radiology'}
+    batch = []
+    for index in range(files):
+        patient = index % patients
+        batch.append([institution_values.get(tag, 'Patient {} value {:04X}{:04X}'.format(patient, *tag))
+                      for tag in PSEUDONYM_TAGS])
+    return batch
+
+
+def _init_worker(pseudonymizer) -> None:
+    set_pseudonymizer(pseudonymizer)
+    enable_stats()
+
+
+def _pseudonymize_file(values: list) -> int:
+    """
+    Pseudonymize the values of a file
+    Returns:
+        int: number of pseudonyms computed, the misses of the caches
+    """
+    pseudonymizer = get_pseudonymizer()
+    for value in values:
+        pseudonymizer(value)
+    lookups = get_stats().pop()['pseudonym_lookups']
+    return lookups.get('misses', 0) if isinstance(pseudonymizer, CachedPseudonymizer) else len(values)
+
+
+def measure(batch: list, workers: int, pseudonymizer) -> tuple:
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(pseudonymizer,)) as pool:
+        # Wait for the workers to start
+        pool.map(abs, range(workers))
+        start = time.perf_counter()
+        computed = sum(pool.imap(_pseudonymize_file, batch, chunksize=4))
+        return time.perf_counter() - start, computed
+
+
+def run(files: int, patients: int, workers: int, iterations: int, rounds: int) -> None:
+    batch = make_files(files, patients)
+    pseudonyms = KeyedPseudonyms(b'benchmark secret', iterations)
+    manager, shared = start_shared_cache(64 * 1024 * 1024)
+    try:
+        modes = (('uncached', lambda: pseudonyms), ('front caches', lambda: CachedPseudonymizer(pseudonyms)),
+                 ('front + shared caches', lambda: CachedPseudonymizer(pseudonyms, shared=shared)))
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise. The shared cache is
+        # emptied before each round by a new manager process
+        results = {name: (float('inf'), 0) for name, _ in modes}
+        for _ in range(rounds):
+            for name, make_pseudonymizer in modes:
+                if name == 'front + shared caches':
+                    manager.shutdown()
+                    manager, shared = start_shared_cache(64 * 1024 * 1024)
+                results[name] = min(results[name], measure(batch, workers, make_pseudonymizer()))
+        print('{} files, {} values per file, {} patients, {} workers, {} iteration(s):'.format(
+            files, len(PSEUDONYM_TAGS), patients, workers, iterations))
+        for name, (elapsed, computed) in results.items():
+            print('  {:22s} {:8.3f}s {:9.0f} values/s, {:6d} pseudonyms computed'.format(
+                name, elapsed, files * len(PSEUDONYM_TAGS) / elapsed, computed))
+    finally:
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pseudonym caches')
+    parser.add_argument('--files', type=int, default=500, help='Number of files of the batch')
+    parser.add_argument('--patients', type=int, default=100, help='Number of patients of the batch')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--iterations', type=int, default=10000, help='Number of PBKDF2 iterations of the pseudonyms')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.files, args.patients, args.workers, args.iterations, args.rounds)
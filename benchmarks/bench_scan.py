@@ -0,0 +1,63 @@
+"""
+Per-file cost of the scan of src.scan on the synthetic corpora: the headers walked in the encoded bytes, compared with
+the headers read by pydicom up to the pixel data.
+
+Usage: python -m benchmarks.bench_scan [--corpus NAME ...] [--scale N] [--rounds N]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import pydicom
+
+from benchmarks.corpus import CORPORA, generate_corpus
+from src import scan
+from src.profile import compile_profile
+from src.utils import iter_files
+
+
+def scan_with_pydicom(path: str, profile, report: scan.ScanReport) -> None:
+    """
+    Reference: read the header with pydicom, then resolve the rules as scan_file
+    """
+    dataset = pydicom.dcmread(path, stop_before_pixels=True)
+    report.files += 1
+    scan._scan_elements(scan._dataset_elements(dataset), profile, frozenset(), report)
+
+
+def measure(paths: list, profile, scan_function) -> float:
+    report = scan.ScanReport()
+    gc.collect()
+    start = time.perf_counter()
+    for path in paths:
+        scan_function(path, profile, report)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def run(corpora: list, scale: int, rounds: int) -> None:
+    profile = compile_profile()
+    with tempfile.TemporaryDirectory() as folder:
+        for name in corpora:
+            corpus_folder = os.path.join(folder, name)
+            generate_corpus(corpus_folder, name, scale)
+            paths = [os.path.join(corpus_folder, path) for path in iter_files(corpus_folder)]
+            # Best of the rounds, the modes are interleaved so that they see the same machine noise
+            walked = read = float('inf')
+            for _ in range(rounds):
+                walked = min(walked, measure(paths, profile, scan.scan_file))
+                read = min(read, measure(paths, profile, scan_with_pydicom))
+            print('{:14s} {:5d} files: walked {:8.1f} us/file ({:7.0f} files/s), pydicom {:8.1f} us/file '
+                  '({:7.0f} files/s), x{:.1f}'.format(name, len(paths), walked * 1e6, 1 / walked, read * 1e6,
+                                                     1 / read, read / walked))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the scan mode')
+    parser.add_argument('--corpus', nargs='*', choices=sorted(CORPORA), default=sorted(CORPORA),
+                        help='Corpora to scan')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplier of the number of files of the corpora')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.corpus, args.scale, args.rounds)
@@ -0,0 +1,85 @@
+"""
+Per-slice cost of the anonymization of a long CT series with a shared src.series.SeriesCache, compared with the files
+anonymized independently. The slices are small so that the header dominates.
+
+Usage: python -m benchmarks.bench_series [--slices N] [--rounds N]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import pydicom
+from pydicom.uid import generate_uid
+
+from benchmarks.synthetic import make_ct_dataset
+from src.anonymizer import anonymize_dataset, anonymize_dicom_file
+from src.profile import compile_profile
+from src.series import SeriesCache
+
+
+def write_series(folder: str, slices: int) -> list:
+    template = make_ct_dataset(64, 64)
+    template.StudyInstanceUID = generate_uid()
+    template.SeriesInstanceUID = generate_uid()
+    paths = []
+    for index in range(slices):
+        template.SOPInstanceUID = template.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        template.InstanceNumber = index + 1
+        template.ImagePositionPatient = [0, 0, index]
+        template.SliceLocation = index
+        path = os.path.join(folder, 'ct_{:05d}.dcm'.format(index))
+        template.save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def measure_datasets(paths: list, profile, series: bool) -> float:
+    datasets = [pydicom.dcmread(path) for path in paths]
+    cache = SeriesCache(profile) if series else None
+    gc.collect()
+    start = time.perf_counter()
+    for dataset in datasets:
+        anonymize_dataset(dataset, profile=profile, series_cache=cache)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def measure_files(paths: list, output_folder: str, profile, series: bool) -> float:
+    cache = SeriesCache(profile) if series else None
+    gc.collect()
+    start = time.perf_counter()
+    for path in paths:
+        anonymize_dicom_file(path, os.path.join(output_folder, os.path.basename(path)), profile=profile,
+                             series_cache=cache)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def run(slices: int, rounds: int) -> None:
+    profile = compile_profile()
+    with tempfile.TemporaryDirectory() as folder:
+        input_folder = os.path.join(folder, 'in')
+        output_folder = os.path.join(folder, 'out')
+        os.makedirs(input_folder)
+        os.makedirs(output_folder)
+        paths = write_series(input_folder, slices)
+        # Best of the rounds, the modes are interleaved so that they see the same machine noise
+        results = {}
+        for _ in range(rounds):
+            for name, measure in (('anonymize_dataset', lambda series: measure_datasets(paths, profile, series)),
+                                  ('anonymize_dicom_file', lambda series: measure_files(paths, output_folder,
+                                                                                        profile, series))):
+                for series in (False, True):
+                    results[name, series] = min(results.get((name, series), float('inf')), measure(series))
+        for name in ('anonymize_dataset', 'anonymize_dicom_file'):
+            per_file, per_series = results[name, False], results[name, True]
+            print('{:21s} {} slices: per file {:7.1f} us/slice, series cache {:7.1f} us/slice ({:+.1f}%)'.format(
+                name, slices, per_file * 1e6, per_series * 1e6, (per_series / per_file - 1) * 100))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the series cache')
+    parser.add_argument('--slices', type=int, default=2000, help='Number of slices of the series')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.slices, args.rounds)
@@ -0,0 +1,113 @@
+"""
+Latency of the local anonymization service on localhost, per single instance request and per batch request,
+compared with starting main.py for every instance.
+
+Usage: python -m benchmarks.bench_service [--instances N] [--batch N] [--workers N] [--unix-socket PATH]
+"""
+import argparse
+import http.client
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import make_ct_dataset
+from src.profile import compile_profile
+from src.service import (DICOM_CONTENT_TYPE, AnonymizationService, make_multipart, make_server,
+                         parse_multipart)
+from src.uid import KeyedUIDMapper
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__('localhost')
+        self.unix_socket = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_socket)
+
+
+def make_instance(size: int) -> bytes:
+    out = io.BytesIO()
+    make_ct_dataset(size, size).save_as(out, enforce_file_format=True)
+    return out.getvalue()
+
+
+def percentile(latencies: list, percent: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+
+def request(connection: http.client.HTTPConnection, method: str, path: str, body: bytes = None,
+            content_type: str = DICOM_CONTENT_TYPE) -> http.client.HTTPResponse:
+    headers = {'Content-Type': content_type} if body is not None else {}
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    response.body = response.read()
+    return response
+
+
+def run(instances: int, batch: int, workers: int, unix_socket: str) -> None:
+    data = make_instance(256)
+    # The workers need the same UIDs
+    service = AnonymizationService(compile_profile(), uid_mapper=KeyedUIDMapper(b'benchmark secret'), workers=workers)
+    server = make_server(service, port=0, unix_socket=unix_socket)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if unix_socket is not None:
+        connection = UnixHTTPConnection(unix_socket)
+    else:
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+
+    try:
+        latencies = []
+        for _ in range(instances):
+            start = time.perf_counter()
+            response = request(connection, 'POST', '/anonymize', data)
+            latencies.append(time.perf_counter() - start)
+            assert response.status == 200, response.body
+        print('single instance   p50 {:7.2f} ms  p99 {:7.2f} ms'.format(percentile(latencies, 50) * 1e3,
+                                                                      percentile(latencies, 99) * 1e3))
+
+        content_type, body = make_multipart([(DICOM_CONTENT_TYPE, data)] * batch)
+        latencies = []
+        for _ in range(max(1, instances // batch)):
+            start = time.perf_counter()
+            response = request(connection, 'POST', '/anonymize', body, content_type)
+            latencies.append(time.perf_counter() - start)
+            assert len(parse_multipart(response.getheader('Content-Type'), response.body)) == batch
+        print('batch of {:3d}      p50 {:7.2f} ms  p99 {:7.2f} ms per instance'.format(
+            batch, percentile(latencies, 50) * 1e3 / batch, percentile(latencies, 99) * 1e3 / batch))
+
+        print(request(connection, 'GET', '/metrics').body.decode())
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+        if unix_socket is not None:
+            os.remove(unix_socket)
+
+    # Cold start of the command line for a single instance
+    with tempfile.TemporaryDirectory() as directory:
+        in_file = os.path.join(directory, 'in.dcm')
+        with open(in_file, 'wb') as fp:
+            fp.write(data)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', in_file, os.path.join(directory, 'out.dcm'), '--workers', '1'],
+                       cwd=root, check=True, capture_output=True)
+        print('main.py per instance  {:7.2f} ms'.format((time.perf_counter() - start) * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the local anonymization service')
+    parser.add_argument('--instances', type=int, default=200, help='Number of single instance requests')
+    parser.add_argument('--batch', type=int, default=20, help='Number of instances per batch request')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--unix-socket', type=str, default=None, help='Use this Unix socket instead of TCP')
+    args = parser.parse_args()
+    run(args.instances, args.batch, args.workers, args.unix_socket)
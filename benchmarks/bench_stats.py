@@ -0,0 +1,45 @@
+"""
+Per-file overhead of the statistics of src.stats, disabled and enabled, on anonymize_dataset.
+
+Usage: python -m benchmarks.bench_stats [--files N] [--rounds N]
+"""
+import argparse
+import copy
+import gc
+import time
+
+from benchmarks.synthetic import make_ct_dataset, make_nested_dataset
+from src.anonymizer import anonymize_dataset
+from src.profile import compile_profile
+from src.stats import disable_stats, enable_stats
+
+
+def measure(template, files: int, profile) -> float:
+    datasets = [copy.deepcopy(template) for _ in range(files)]
+    gc.collect()
+    start = time.perf_counter()
+    for dataset in datasets:
+        anonymize_dataset(dataset, profile=profile)
+    return (time.perf_counter() - start) / files
+
+
+def run(files: int, rounds: int) -> None:
+    profile = compile_profile()
+    for name, template in (('CT', make_ct_dataset()), ('nested', make_nested_dataset())):
+        disabled = enabled = float('inf')
+        for _ in range(rounds):
+            disable_stats()
+            disabled = min(disabled, measure(template, files, profile))
+            enable_stats()
+            enabled = min(enabled, measure(template, files, profile))
+        disable_stats()
+        print('{:8s} disabled {:8.1f} us/file, enabled {:8.1f} us/file (+{:4.1f}%)'.format(
+            name, disabled * 1e6, enabled * 1e6, (enabled / disabled - 1) * 100))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the overhead of the statistics')
+    parser.add_argument('--files', type=int, default=200, help='Number of files per round')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds, the best one is reported')
+    args = parser.parse_args()
+    run(args.files, args.rounds)
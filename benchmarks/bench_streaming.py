@@ -0,0 +1,89 @@
+"""
+Peak memory and duration of anonymize_dicom_file with and without streaming of the pixel data, on a large
+multi-frame file. Each mode runs in its own process, and the pixel data of both outputs is compared byte for byte.
+
+Usage: python -m benchmarks.bench_streaming [--size-mb N] [--directory PATH]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import make_ct_dataset
+from src import streaming
+
+# ru_maxrss is kept across exec on Linux, the peak of the new process is read from /proc when possible
+_MEASURE = '''
+import json, resource, sys, time
+from src.anonymizer import anonymize_dicom_file
+start = time.perf_counter()
+anonymize_dicom_file(sys.argv[1], sys.argv[2], stream_pixel_data=sys.argv[3] == "1")
+elapsed = time.perf_counter() - start
+try:
+    with open("/proc/self/status") as status:
+        max_rss_kb = int([line for line in status if line.startswith("VmHWM")][0].split()[1])
+except OSError:
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "max_rss_kb": max_rss_kb}))
+'''
+
+
+def make_large_file(path: str, size_mb: int) -> None:
+    rows = columns = 512
+    frames = max(1, size_mb * 1024 * 1024 // (rows * columns * 2))
+    dataset = make_ct_dataset(rows, columns)
+    dataset.NumberOfFrames = frames
+    dataset.PixelData = os.urandom(rows * columns * 2) * frames
+    dataset.save_as(path, enforce_file_format=True)
+
+
+def pixel_data_range(path: str) -> tuple:
+    with open(path, 'rb') as fp:
+        dataset, start = streaming.read_header(fp)
+        return start, streaming.pixel_data_end(fp, start, *dataset.original_encoding)
+
+
+def same_pixel_data(path, other_path) -> bool:
+    (start, end), (other_start, other_end) = pixel_data_range(path), pixel_data_range(other_path)
+    if end - start != other_end - other_start:
+        return False
+    with open(path, 'rb') as fp, open(other_path, 'rb') as other_fp:
+        fp.seek(start)
+        other_fp.seek(other_start)
+        remaining = end - start
+        while remaining > 0:
+            size = min(streaming.CHUNK_SIZE, remaining)
+            if fp.read(size) != other_fp.read(size):
+                return False
+            remaining -= size
+    return True
+
+
+def run(size_mb: int, directory: str) -> None:
+    in_file = os.path.join(directory, 'bench_streaming_in.dcm')
+    make_large_file(in_file, size_mb)
+    print('input: {:.0f} MB'.format(os.path.getsize(in_file) / 1e6))
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out_files = {}
+    for name, stream in (('in memory', '0'), ('streamed', '1')):
+        out_file = os.path.join(directory, 'bench_streaming_out_{}.dcm'.format(stream))
+        output = subprocess.run([sys.executable, '-c', _MEASURE, in_file, out_file, stream], cwd=root,
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print('{:10s} {:6.2f}s  peak RSS {:7.1f} MB'.format(name, result['seconds'], result['max_rss_kb'] / 1024))
+        out_files[name] = out_file
+
+    print('identical pixel data:', same_pixel_data(out_files['in memory'], out_files['streamed']))
+    for path in [in_file] + list(out_files.values()):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the streaming of the pixel data')
+    parser.add_argument('--size-mb', type=int, default=512, help='Size of the pixel data of the input file')
+    parser.add_argument('--directory', type=str, default=tempfile.gettempdir(), help='Directory of the files')
+    args = parser.parse_args()
+    run(args.size_mb, args.directory)
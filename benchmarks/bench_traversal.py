@@ -0,0 +1,71 @@
+"""
+Single-pass traversal of anonymize_dataset versus the previous engine which looked up every rule of the table and
+walked the whole dataset for every repeating group rule.
+
+Usage: python -m benchmarks.bench_traversal [--files N] [--depth D] [--private-groups G]
+"""
+import argparse
+import copy
+import time
+
+from benchmarks.synthetic import make_nested_dataset
+from src.actions import delete
+from src.anonymizer import anonymize_dataset
+from src.profile import compile_profile
+
+# Overlay and curve data, as in the DICOM standard
+MASKED_RULES = {
+    (0x5000, 0x0000, 0xFF00, 0x0000): delete,
+    (0x6000, 0x3000, 0xFF00, 0xFFFF): delete,
+    (0x6000, 0x4000, 0xFF00, 0xFFFF): delete,
+}
+
+
+def anonymize_dataset_per_rule(dataset, profile):
+    """
+    Previous engine: one lookup per rule and one walk of the dataset per repeating group rule
+    """
+    for tag, action in profile.actions.items():
+        if tag[0] == 0x0002:
+            action(dataset.file_meta, tag)
+        else:
+            action(dataset, tag)
+
+    for tag, action in profile.masked_actions:
+        def _range_callback(dataset, data_element):
+            if data_element.tag.group & tag[2] == tag[0] and data_element.tag.element & tag[3] == tag[1]:
+                action(dataset, (data_element.tag.group, data_element.tag.element))
+        dataset.walk(_range_callback)
+
+    dataset.remove_private_tags()
+
+
+def measure(function, datasets) -> float:
+    start = time.perf_counter()
+    for dataset in datasets:
+        function(dataset)
+    return (time.perf_counter() - start) / len(datasets)
+
+
+def run(files: int, depth: int, private_groups: int) -> None:
+    template = make_nested_dataset(depth, private_groups)
+    profile = compile_profile(MASKED_RULES)
+    print('{} elements, {} rules, {} repeating group rules'.format(
+        len(list(template.iterall())), len(profile.actions), len(profile.masked_actions)))
+
+    per_rule = measure(lambda dataset: anonymize_dataset_per_rule(dataset, profile),
+                       [copy.deepcopy(template) for _ in range(files)])
+    single_pass = measure(lambda dataset: anonymize_dataset(dataset, profile=profile),
+                          [copy.deepcopy(template) for _ in range(files)])
+
+    print('per rule:    {:8.1f} us/dataset'.format(per_rule * 1e6))
+    print('single pass: {:8.1f} us/dataset'.format(single_pass * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the dataset traversal of anonymize_dataset')
+    parser.add_argument('--files', type=int, default=200, help='Number of datasets to anonymize')
+    parser.add_argument('--depth', type=int, default=8, help='Nesting level of the sequences')
+    parser.add_argument('--private-groups', type=int, default=50, help='Number of private groups')
+    args = parser.parse_args()
+    run(args.files, args.depth, args.private_groups)
@@ -0,0 +1,65 @@
+"""
+Lookups per second of the persistent UID store, with one transaction per batch of UIDs (e.g. one per file).
+
+Usage: python -m benchmarks.bench_uid_store [--entries N] [--lookups N] [--batch N] [--database PATH]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.uid import PersistentUIDMapper
+
+
+def fill(mapper: PersistentUIDMapper, entries: int, batch: int = 100000) -> None:
+    connection = mapper.connection
+    count = len(mapper)
+    while count < entries:
+        size = min(batch, entries - count)
+        connection.execute('BEGIN')
+        connection.executemany('INSERT INTO uid_map (old_uid, new_uid) VALUES (?, ?)',
+                               (('1.2.3.{}'.format(index), '2.25.{}'.format(index))
+                                for index in range(count, count + size)))
+        connection.execute('COMMIT')
+        count += size
+
+
+def run(entries: int, lookups: int, batch: int, database: str) -> None:
+    start = time.perf_counter()
+    fill(PersistentUIDMapper(database), entries)
+    print('{} entries filled in {:.1f}s'.format(entries, time.perf_counter() - start))
+
+    # A new mapper has an empty cache, every lookup goes to the database
+    mapper = PersistentUIDMapper(database, cache_size=batch)
+    existing = ['1.2.3.{}'.format(random.randrange(entries)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for index in range(0, lookups, batch):
+        mapper.prepare(existing[index:index + batch])
+    elapsed = time.perf_counter() - start
+    print('existing UIDs, batches of {}: {:10.0f} lookups/s'.format(batch, lookups / elapsed))
+
+    start = time.perf_counter()
+    for uid in existing[:lookups // 10]:
+        mapper._cache.clear()
+        mapper(uid)
+    elapsed = time.perf_counter() - start
+    print('existing UIDs, one by one:    {:10.0f} lookups/s'.format(lookups // 10 / elapsed))
+
+    new = ['1.2.4.{}.{}'.format(os.getpid(), index) for index in range(lookups)]
+    start = time.perf_counter()
+    for index in range(0, lookups, batch):
+        mapper.prepare(new[index:index + batch])
+    elapsed = time.perf_counter() - start
+    print('new UIDs, batches of {}:      {:10.0f} lookups/s'.format(batch, lookups / elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the persistent UID store')
+    parser.add_argument('--entries', type=int, default=10000000, help='Number of UIDs in the store')
+    parser.add_argument('--lookups', type=int, default=100000, help='Number of UIDs looked up')
+    parser.add_argument('--batch', type=int, default=50, help='Number of UIDs looked up per transaction')
+    parser.add_argument('--database', type=str, default=os.path.join(tempfile.gettempdir(), 'bench_uid_store.db'),
+                        help='SQLite database, kept between runs to avoid filling it again')
+    args = parser.parse_args()
+    run(args.entries, args.lookups, args.batch, args.database)
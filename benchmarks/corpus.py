@@ -0,0 +1,192 @@
+"""
+Reproducible synthetic DICOM corpora for the benchmark suite, generated offline with pydicom. The same name, scale
+and seed always give the same files, UIDs included.
+
+Corpora:
+    cr             small computed radiography images
+    ct_series      512x512 CT series
+    enhanced_mr    multi-frame enhanced MR with per-frame functional groups
+    deep_sq        deeply nested sequences
+    private_heavy  many private groups and elements
+    jpeg           encapsulated JPEG baseline images (synthetic fragments, not decodable)
+
+Usage: python -m benchmarks.corpus DIRECTORY [--corpus NAME ...] [--scale N] [--seed N]
+"""
+import argparse
+import os
+import random
+from typing import Callable, Dict, Iterator, Tuple
+
+import pydicom
+from pydicom.encaps import encapsulate
+from pydicom.sequence import Sequence
+from pydicom.uid import (PYDICOM_ROOT_UID, ComputedRadiographyImageStorage, EnhancedMRImageStorage,
+                         JPEGBaseline8Bit, generate_uid)
+
+from benchmarks.synthetic import make_ct_dataset, make_nested_dataset
+
+
+class _Generator:
+    """
+    Deterministic source of UIDs and pixel data
+    """
+
+    def __init__(self, name: str, seed: int):
+        self.random = random.Random('{}-{}'.format(name, seed))
+
+    def uid(self) -> str:
+        return generate_uid(entropy_srcs=[str(self.random.getrandbits(128))])
+
+    def pixels(self, size: int) -> bytes:
+        return self.random.randbytes(size)
+
+    def identify(self, dataset: pydicom.Dataset, study_uid: str, series_uid: str, patient: int) -> None:
+        """
+        Set the study, series and patient of a synthetic dataset and replace its other random UIDs, e.g. of nested
+        sequences, with deterministic ones
+        """
+        dataset.StudyInstanceUID = study_uid
+        dataset.SeriesInstanceUID = series_uid
+        dataset.PatientID = 'PAT{:06d}'.format(patient)
+        dataset.PatientName = 'Patient^{}'.format(patient)
+
+        replaced = {}
+
+        def replace_random_uid(_, element):
+            if element.VR == 'UI' and isinstance(element.value, str) and element.value.startswith(PYDICOM_ROOT_UID) \
+                    and element.value not in (study_uid, series_uid):
+                if element.value not in replaced:
+                    replaced[element.value] = self.uid()
+                element.value = replaced[element.value]
+        dataset.file_meta.walk(replace_random_uid)
+        dataset.walk(replace_random_uid)
+
+
+def _cr(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    for index in range(20 * scale):
+        dataset = make_ct_dataset(256, 256)
+        dataset.file_meta.MediaStorageSOPClassUID = dataset.SOPClassUID = ComputedRadiographyImageStorage
+        dataset.Modality = 'CR'
+        dataset.BodyPartExamined = 'CHEST'
+        dataset.ViewPosition = 'PA'
+        dataset.PixelData = generator.pixels(256 * 256 * 2)
+        generator.identify(dataset, generator.uid(), generator.uid(), index)
+        yield 'cr_{:04d}.dcm'.format(index), dataset
+
+
+def _ct_series(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    for series in range(scale):
+        study_uid, series_uid = generator.uid(), generator.uid()
+        for index in range(20):
+            dataset = make_ct_dataset(512, 512)
+            dataset.InstanceNumber = index + 1
+            dataset.ImagePositionPatient = [0, 0, index]
+            dataset.SliceLocation = index
+            dataset.PixelData = generator.pixels(512 * 512 * 2)
+            generator.identify(dataset, study_uid, series_uid, series)
+            yield os.path.join('series_{:03d}'.format(series), 'ct_{:04d}.dcm'.format(index)), dataset
+
+
+def _enhanced_mr(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    rows = columns = 128
+    frames = 32
+    for index in range(2 * scale):
+        dataset = make_ct_dataset(rows, columns)
+        dataset.file_meta.MediaStorageSOPClassUID = dataset.SOPClassUID = EnhancedMRImageStorage
+        dataset.Modality = 'MR'
+        dataset.NumberOfFrames = frames
+        shared = pydicom.Dataset()
+        measures = pydicom.Dataset()
+        measures.PixelSpacing = [1, 1]
+        measures.SliceThickness = 1
+        shared.PixelMeasuresSequence = Sequence([measures])
+        dataset.SharedFunctionalGroupsSequence = Sequence([shared])
+        per_frame = []
+        for frame in range(frames):
+            item = pydicom.Dataset()
+            content = pydicom.Dataset()
+            content.FrameAcquisitionDateTime = '20230412101533.{:06d}'.format(frame)
+            content.InStackPositionNumber = frame + 1
+            item.FrameContentSequence = Sequence([content])
+            position = pydicom.Dataset()
+            position.ImagePositionPatient = [0, 0, frame]
+            item.PlanePositionSequence = Sequence([position])
+            per_frame.append(item)
+        dataset.PerFrameFunctionalGroupsSequence = Sequence(per_frame)
+        dataset.PixelData = generator.pixels(rows * columns * 2 * frames)
+        generator.identify(dataset, generator.uid(), generator.uid(), index)
+        yield 'mr_{:04d}.dcm'.format(index), dataset
+
+
+def _deep_sq(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    for index in range(20 * scale):
+        dataset = make_nested_dataset(depth=32, private_groups=0)
+        generator.identify(dataset, generator.uid(), generator.uid(), index)
+        yield 'deep_{:04d}.dcm'.format(index), dataset
+
+
+def _private_heavy(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    for index in range(20 * scale):
+        dataset = make_nested_dataset(depth=1, private_groups=100, private_elements=50)
+        generator.identify(dataset, generator.uid(), generator.uid(), index)
+        yield 'private_{:04d}.dcm'.format(index), dataset
+
+
+def _jpeg(generator: _Generator, scale: int) -> Iterator[Tuple[str, pydicom.Dataset]]:
+    frames = 4
+    for index in range(10 * scale):
+        dataset = make_ct_dataset(512, 512)
+        dataset.file_meta.TransferSyntaxUID = JPEGBaseline8Bit
+        dataset.BitsAllocated = dataset.BitsStored = 8
+        dataset.HighBit = 7
+        dataset.NumberOfFrames = frames
+        # Start and end of image markers around random entropy coded data
+        fragments = [b'\xff\xd8' + generator.pixels(40000) + b'\xff\xd9' for _ in range(frames)]
+        dataset.PixelData = encapsulate(fragments)
+        dataset['PixelData'].VR = 'OB'
+        generator.identify(dataset, generator.uid(), generator.uid(), index)
+        yield 'jpeg_{:04d}.dcm'.format(index), dataset
+
+
+CORPORA: Dict[str, Callable] = {
+    'cr': _cr,
+    'ct_series': _ct_series,
+    'enhanced_mr': _enhanced_mr,
+    'deep_sq': _deep_sq,
+    'private_heavy': _private_heavy,
+    'jpeg': _jpeg,
+}
+
+
+def generate_corpus(directory: str, name: str, scale: int = 1, seed: int = 0) -> Tuple[int, int]:
+    """
+    Write a synthetic corpus
+    Args:
+        directory: output folder, created if needed
+        name: name of the corpus, see CORPORA
+        scale: multiplier of the number of files
+        seed: seed of the UIDs and of the pixel data
+    Returns:
+        tuple: (number of files, total size in bytes)
+    """
+    generator = _Generator(name, seed)
+    count = size = 0
+    for relative_path, dataset in CORPORA[name](generator, scale):
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dataset.save_as(path, enforce_file_format=True)
+        count += 1
+        size += os.path.getsize(path)
+    return count, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic DICOM corpora')
+    parser.add_argument('directory', type=str, help='Output folder, one sub-folder per corpus')
+    parser.add_argument('--corpus', choices=sorted(CORPORA), action='append', help='Corpus to generate, all if not set')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplier of the number of files')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the UIDs and of the pixel data')
+    args = parser.parse_args()
+    for corpus in args.corpus or CORPORA:
+        files, size = generate_corpus(os.path.join(args.directory, corpus), corpus, args.scale, args.seed)
+        print('{:14s} {:5d} files {:8.1f} MB'.format(corpus, files, size / 1e6))
@@ -0,0 +1,163 @@
+"""
+Benchmark suite: generate the synthetic corpora (see benchmarks/corpus.py), then measure anonymize_dataset and
+anonymize_dicom_file on each of them in a fresh process: files/s, MB/s, peak RSS and time per stage (see src.stats).
+The results are stored as JSON, and can be compared with the results of another commit.
+
+Usage:
+    python -m benchmarks.suite [--corpus NAME ...] [--scale N] [--output results.json]
+    python -m benchmarks.suite --compare baseline.json [--output results.json] [--threshold 0.1]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pydicom
+
+from benchmarks.corpus import CORPORA, generate_corpus
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics compared with --compare, True if higher is better
+_COMPARED_METRICS = {'files_per_second': True, 'megabytes_per_second': True, 'peak_rss_mb': False}
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of the current process. ru_maxrss is kept across exec on Linux, /proc is read when possible
+    """
+    try:
+        with open('/proc/self/status') as status:
+            return int([line for line in status if line.startswith('VmHWM')][0].split()[1]) / 1024
+    except (OSError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def list_files(folder: str) -> list:
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(folder) for name in names)
+
+
+def measure(mode: str, corpus_folder: str, output_folder: str) -> dict:
+    """
+    Anonymize a corpus in the current process, called in a fresh process by run
+    Args:
+        mode: 'anonymize_dataset' (datasets read before the measure, nothing written) or 'anonymize_dicom_file'
+        corpus_folder: folder of the corpus
+        output_folder: folder of the anonymized files
+    Returns:
+        dict: the measures
+    """
+    from src.anonymizer import anonymize_dataset, anonymize_dicom_file
+    from src.profile import compile_profile
+    from src.stats import enable_stats
+
+    profile = compile_profile()
+    files = list_files(corpus_folder)
+    size = sum(os.path.getsize(path) for path in files)
+    if mode == 'anonymize_dataset':
+        datasets = [pydicom.dcmread(path) for path in files]
+        stats = enable_stats()
+        start = time.perf_counter()
+        for dataset in datasets:
+            anonymize_dataset(dataset, delete_private_tags=True, profile=profile)
+    else:
+        stats = enable_stats()
+        start = time.perf_counter()
+        for index, path in enumerate(files):
+            anonymize_dicom_file(path, os.path.join(output_folder, '{}.dcm'.format(index)), delete_private_tags=True,
+                                 profile=profile)
+    elapsed = time.perf_counter() - start
+    return {'files': len(files), 'bytes': size, 'seconds': elapsed, 'files_per_second': len(files) / elapsed,
+            'megabytes_per_second': size / elapsed / 1e6, 'peak_rss_mb': peak_rss_mb(),
+            'stage_seconds': dict(stats.stage_seconds), 'action_seconds': dict(stats.action_seconds)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=_ROOT, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(corpora: list, scale: int, seed: int, directory: str) -> dict:
+    results = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+               'pydicom': pydicom.__version__, 'scale': scale, 'seed': seed, 'corpora': {}}
+    with tempfile.TemporaryDirectory(dir=directory) as folder:
+        for corpus in corpora:
+            corpus_folder = os.path.join(folder, corpus)
+            generate_corpus(corpus_folder, corpus, scale, seed)
+            results['corpora'][corpus] = {}
+            for mode in ('anonymize_dataset', 'anonymize_dicom_file'):
+                output_folder = os.path.join(folder, 'out_' + corpus)
+                os.makedirs(output_folder, exist_ok=True)
+                output = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--measure', mode, corpus_folder,
+                                         output_folder], cwd=_ROOT, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.splitlines()[-1])
+                results['corpora'][corpus][mode] = result
+                print('{:14s} {:21s} {:5d} files {:8.1f} files/s {:8.1f} MB/s  peak RSS {:7.1f} MB'.format(
+                    corpus, mode, result['files'], result['files_per_second'], result['megabytes_per_second'],
+                    result['peak_rss_mb']))
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare the results with the results of another commit
+    Args:
+        results: results of run
+        baseline: results of run on the other commit
+        threshold: relative change above which a metric is reported as a regression
+    Returns:
+        list: description of the regressions
+    """
+    regressions = []
+    print('compared with {}'.format(baseline.get('commit')))
+    for corpus, modes in results['corpora'].items():
+        for mode, result in modes.items():
+            reference = baseline.get('corpora', {}).get(corpus, {}).get(mode)
+            if reference is None:
+                continue
+            for metric, higher_is_better in _COMPARED_METRICS.items():
+                change = result[metric] / reference[metric] - 1
+                regression = -change if higher_is_better else change
+                print('{:14s} {:21s} {:22s} {:+7.1%}'.format(corpus, mode, metric, change))
+                if regression > threshold:
+                    regressions.append('{} {} {}: {:+.1%}'.format(corpus, mode, metric, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark suite on synthetic DICOM corpora')
+    parser.add_argument('--corpus', choices=sorted(CORPORA), action='append', help='Corpus to run, all if not set')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplier of the number of files of the corpora')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the corpora')
+    parser.add_argument('--directory', type=str, default=tempfile.gettempdir(), help='Directory of the corpora')
+    parser.add_argument('--output', type=str, default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=str, default=None, help='Compare with the results of this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change reported as a regression by --compare')
+    parser.add_argument('--measure', nargs=3, metavar=('MODE', 'CORPUS_FOLDER', 'OUTPUT_FOLDER'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure(*args.measure)))
+        sys.exit(0)
+
+    results = run(args.corpus or list(CORPORA), args.scale, args.seed, args.directory)
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print('Regression: {}'.format(regression))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,105 @@
+"""
+Synthetic DICOM datasets for the benchmarks. Nothing is read from disk so the benchmarks can run offline.
+"""
+import pydicom
+from pydicom.dataset import FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+
+def make_ct_dataset(rows: int = 64, columns: int = 64) -> pydicom.Dataset:
+    """
+    Create a CT image dataset with the usual patient, study and series identifying attributes
+    Args:
+        rows: number of rows of the image
+        columns: number of columns of the image
+    Returns:
+        pydicom.Dataset: dataset with file meta information
+    """
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = pydicom.Dataset()
+    dataset.file_meta = file_meta
+    dataset.SOPClassUID = CTImageStorage
+    dataset.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    dataset.StudyInstanceUID = generate_uid()
+    dataset.SeriesInstanceUID = generate_uid()
+    dataset.FrameOfReferenceUID = generate_uid()
+    dataset.StudyDate = '20230412'
+    dataset.SeriesDate = '20230412'
+    dataset.ContentDate = '20230412'
+    dataset.StudyTime = '101532.123'
+    dataset.AcquisitionDateTime = '20230412101533.000000'
+    dataset.AccessionNumber = 'ACC000123'
+    dataset.Modality = 'CT'
+    dataset.InstitutionName = 'General Hospital'
+    dataset.InstitutionAddress = '1 Hospital Street'
+    dataset.ReferringPhysicianName = 'Doe^John'
+    dataset.StationName = 'CT01'
+    dataset.StudyDescription = 'CT Chest'
+    dataset.SeriesDescription = 'Axial 1mm'
+    dataset.OperatorsName = 'Smith^Jane'
+    dataset.PatientName = 'Patient^Test'
+    dataset.PatientID = '123456'
+    dataset.PatientBirthDate = '19700101'
+    dataset.PatientSex = 'F'
+    dataset.PatientAge = '053Y'
+    dataset.PatientWeight = '60'
+    dataset.DeviceSerialNumber = 'SN0001'
+    dataset.StudyID = '42'
+    dataset.SeriesNumber = 1
+    dataset.InstanceNumber = 1
+    dataset.ImageComments = 'Synthetic image'
+
+    referenced = pydicom.Dataset()
+    referenced.ReferencedSOPClassUID = CTImageStorage
+    referenced.ReferencedSOPInstanceUID = generate_uid()
+    dataset.ReferencedImageSequence = Sequence([referenced])
+
+    block = dataset.private_block(0x0009, 'SYNTHETIC VENDOR', create=True)
+    block.add_new(0x01, 'LO', 'vendor value')
+    block.add_new(0x02, 'DS', '1.5')
+
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = 'MONOCHROME2'
+    dataset.Rows = rows
+    dataset.Columns = columns
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 12
+    dataset.HighBit = 11
+    dataset.PixelRepresentation = 0
+    dataset.PixelData = bytes(rows * columns * 2)
+    return dataset
+
+
+def make_nested_dataset(depth: int = 8, private_groups: int = 50, private_elements: int = 20) -> pydicom.Dataset:
+    """
+    Create a CT dataset with deeply nested sequences and many private groups
+    Args:
+        depth: nesting level of the sequences
+        private_groups: number of private groups, each one with its own private creator
+        private_elements: number of private elements in each private group
+    Returns:
+        pydicom.Dataset: dataset with file meta information
+    """
+    dataset = make_ct_dataset()
+
+    item = dataset
+    for level in range(depth):
+        sub_item = pydicom.Dataset()
+        sub_item.ReferencedSOPClassUID = CTImageStorage
+        sub_item.ReferencedSOPInstanceUID = generate_uid()
+        sub_item.CodeMeaning = 'Level {}'.format(level)
+        sub_item.ContentDate = '20230412'
+        item.ContentSequence = Sequence([sub_item])
+        item = sub_item
+
+    for index in range(private_groups):
+        group = 0x0011 + 2 * index
+        block = dataset.private_block(group, 'SYNTHETIC VENDOR {}'.format(index), create=True)
+        for offset in range(private_elements):
+            block.add_new(offset, 'LO', 'private value {}'.format(offset))
+    return dataset
@@ -1,80 +1,567 @@
 import argparse
+import asyncio
+import collections
+import hashlib
 import json
+import multiprocessing
 import os
+import time
+from typing import Optional
 
 import tqdm
 
-from src.anonymizer import anonymize_dicom_file
-from src.utils import is_dicom_file
+from src.actions import generate_actions, set_date_shifter, set_pseudonymizer, set_uid_mapper
+from src.anonymizer import PATCHED, REWRITTEN, anonymize_dicom_file
+from src.archive import anonymize_archive, is_archive_path
+from src.compression import CODECS, CompressionReport, OutputWriter, check_codec, compressed_path
+from src.date_shift import DateShifter
+from src.manifest import DONE, FAILED, SKIPPED, Manifest, hash_file
+from src.pipeline import run_pipeline
+from src.profile import AnonymizationProfile, compile_profile
+from src.pseudonym import PSEUDONYM_TAGS, CachedPseudonymizer, KeyedPseudonyms, start_shared_cache
+from src.series import SeriesCache, group_by_series
+from src.stats import RunStats, enable_stats, get_stats
+from src.uid import KeyedUIDMapper, PersistentUIDMapper, RandomUIDMapper, is_process_local
+from src.utils import iter_dicom_files
 
 parser = argparse.ArgumentParser(description='Anonymize DICOM files')
-parser.add_argument('input_path', type=str, help='Path to the file or folder to anonymize')
-parser.add_argument('output_path', type=str, help='Path to the output file or folder')
+parser.add_argument('input_path', type=str,
+                    help='Path to the file, folder or ZIP/TAR archive (.zip, .tar, .tar.gz...) to anonymize')
+parser.add_argument('output_path', type=str,
+                    help='Path to the output file, folder or ZIP/TAR archive, the members of the archives are '
+                         'anonymized in memory')
 parser.add_argument('--anonymization_actions', type=str, default=None, help='Path to the anonymization actions file')
 parser.add_argument('--keepPrivateTags', type=bool, default=True, help='Define if private tags should be kept or not')
-args = parser.parse_args()
+parser.add_argument('--workers', type=int, default=None,
+                    help='Number of worker processes, defaults to the number of CPUs with --project-secret-file or '
+                         '--uid-store and to 1 otherwise: the random UIDs are not shared by the worker processes')
+uid_group = parser.add_mutually_exclusive_group()
+uid_group.add_argument('--project-secret-file', type=str, default=None,
+                       help='File containing the project secret. If set, new UIDs are derived from a keyed hash of '
+                            'the old UIDs and are consistent across workers and runs, otherwise they are random')
+uid_group.add_argument('--uid-store', type=str, default=None,
+                       help='SQLite database storing the random UIDs, to keep them consistent across workers and runs')
+parser.add_argument('--stream-pixel-data', action='store_true',
+                    help='Only load the header of the files in memory and copy their pixel data as is by chunks')
+parser.add_argument('--patch-in-place', action='store_true',
+                    help='Overwrite the anonymized values directly in a copy of the input files when their length does '
+                         'not change, the files are rewritten otherwise')
+parser.add_argument('--memory-map', action='store_true',
+                    help='Read the input files through a memory map and write their pixel data and other large binary '
+                         'values from the map without copying them in memory, for large files on local storage')
+parser.add_argument('--sniff-threads', type=int, default=0,
+                    help='Number of threads checking if the input files are DICOM files while they are anonymized')
+parser.add_argument('--manifest', type=str, default=None,
+                    help='Job manifest recording the processed files. When a run is started again with the same '
+                         'manifest and settings, the files already done are skipped')
+parser.add_argument('--manifest-hash', action='store_true',
+                    help='Compare the content hash of the input files instead of their size and modification time '
+                         'to skip the files already done')
+parser.add_argument('--uid-store-export', type=str, default=None,
+                    help='Export the UIDs of the UID store to this CSV file at the end of the run')
+parser.add_argument('--uid-cache-size', type=int, default=1000000,
+                    help='Maximum number of random UIDs remembered by each worker when no project secret is set')
+parser.add_argument('--async-io', action='store_true',
+                    help='Read and write the files asynchronously while others are anonymized, for file systems with '
+                         'a high latency such as network mounts')
+parser.add_argument('--io-concurrency', type=int, default=8,
+                    help='Maximum number of concurrent reads and of concurrent writes with --async-io')
+parser.add_argument('--queue-size', type=int, default=16,
+                    help='Maximum number of files held in memory between two stages with --async-io')
+parser.add_argument('--series', action='store_true',
+                    help='Group the files by patient and series and reuse the work done for the first file of a series '
+                         'for the following ones. At most 4 times --series-size files wait for their group')
+parser.add_argument('--series-size', type=int, default=500,
+                    help='Maximum number of files of a series anonymized together by a worker with --series')
+parser.add_argument('--stats', type=str, default=None,
+                    help='Write the time spent per stage and per action, the element counts and the bytes read and '
+                         'written to this file at the end of the run')
+parser.add_argument('--shift-dates', action='store_true',
+                    help='Shift the dates of each patient by an offset derived from its Patient ID and the project '
+                         'secret instead of replacing them with constants. Requires --project-secret-file')
+parser.add_argument('--max-date-shift-days', type=int, default=365,
+                    help='Maximum number of days of the date offsets with --shift-dates')
+parser.add_argument('--keep-times', action='store_true',
+                    help='Keep the times (TM) with --shift-dates instead of anonymizing them with their rule')
+parser.add_argument('--stats-format', choices=('json', 'prometheus'), default='json',
+                    help='Format of the --stats file')
+parser.add_argument('--compression', choices=CODECS, default=None,
+                    help='Compress the output files: deflate (deflated transfer syntax), gzip or zstd (compressed '
+                         'container, .gz or .zst is appended to the file names) or rle (RLE Lossless pixel data). The '
+                         'files are compressed by threads of each worker while the next files are anonymized')
+parser.add_argument('--compression-level', type=int, default=None,
+                    help='Compression level of --compression, the default level of the codec if not set')
+parser.add_argument('--compression-threads', type=int, default=1,
+                    help='Number of compression threads of each worker with --compression')
+parser.add_argument('--pseudonymize', action='store_true',
+                    help='Replace the patient, physician and institution names and IDs with pseudonyms derived from '
+                         'the project secret instead of constants, the same value gets the same pseudonym in every '
+                         'file. Requires --project-secret-file')
+parser.add_argument('--pseudonym-iterations', type=int, default=1,
+                    help='Number of PBKDF2 iterations of the pseudonyms with --pseudonymize, a higher number makes the '
+                         'values slower to find back from their pseudonyms if the secret leaks')
+parser.add_argument('--pseudonym-cache-mb', type=float, default=16,
+                    help='Maximum memory of the pseudonyms remembered by each worker with --pseudonymize')
+parser.add_argument('--pseudonym-shared-cache-mb', type=float, default=0,
+                    help='Maximum memory of the pseudonyms shared by the workers through a manager process with '
+                         '--pseudonymize, for costly pseudonyms. Disabled if 0')
+parser.add_argument('--archive-in-flight', type=int, default=64,
+                    help='Maximum number of archive members held in memory when reading or writing an archive')
 
+# Anonymization settings of the worker process, set once by _init_worker
+_profile: AnonymizationProfile = None
+_delete_private_tags = True
+_file_options = {}
+_hash_inputs = False
+_writer: OutputWriter = None
 
-def anonymize(input_path: str, output_path: str, anonymization_actions: dict, deletePrivateTags: bool) -> None:
+# Number of files anonymized by a worker before waiting for their compressed output files
+_COMPRESSION_BATCH_SIZE = 16
+
+
+def _init_worker(profile: AnonymizationProfile, delete_private_tags: bool, uid_mapper=None,
+                 file_options: dict = None, hash_inputs: bool = False, collect_stats: bool = False,
+                 date_shifter=None, compression_options: dict = None, pseudonymizer=None) -> None:
+    """
+    Store the compiled anonymization rules, the UID mapper, the date shifter, the pseudonymizer and the options of
+    anonymize_dicom_file in the worker process, start its compression threads and enable its statistics if requested
+    """
+    global _profile, _delete_private_tags, _file_options, _hash_inputs, _writer
+    _profile = profile
+    _delete_private_tags = delete_private_tags
+    _file_options = file_options or {}
+    _hash_inputs = hash_inputs
+    _writer = OutputWriter(**compression_options) if compression_options else None
+    if uid_mapper is not None:
+        set_uid_mapper(uid_mapper)
+    if date_shifter is not None:
+        set_date_shifter(date_shifter)
+    if pseudonymizer is not None:
+        set_pseudonymizer(pseudonymizer)
+    if collect_stats:
+        enable_stats()
+
+
+def _anonymize_file(task: tuple, series_cache: SeriesCache = None) -> dict:
+    """
+    Anonymize one file in the worker process
+    Args:
+        task: (input file path, output file path, content hash of the input file when it was last anonymized)
+        series_cache: work shared with the other files of the series of the file, see src.series
+    Returns:
+        dict: path, size, mtime_ns and hash (if computed) of the input file, error message or None, how the
+            output file has been written (SKIPPED if the content of the input file did not change) and the
+            statistics of the file if enabled
+    """
+    input_file_path, output_file_path, previous_hash = task
+    result = {'path': input_file_path, 'size': 0, 'mtime_ns': None, 'hash': None, 'error': None, 'written': None}
+    try:
+        stat = os.stat(input_file_path)
+        result['size'], result['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+        if _hash_inputs:
+            result['hash'] = hash_file(input_file_path)
+            if result['hash'] == previous_hash:
+                result['written'] = SKIPPED
+                return result
+        output_folder = os.path.dirname(output_file_path)
+        if output_folder:
+            os.makedirs(output_folder, exist_ok=True)
+        result['written'] = anonymize_dicom_file(input_file_path, output_file_path,
+                                                 delete_private_tags=_delete_private_tags, profile=_profile,
+                                                 series_cache=series_cache, writer=_writer, **_file_options)
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    stats = get_stats()
+    if stats is not None:
+        result['stats'] = stats.pop()
+    return result
+
+
+def _anonymize_series(tasks: list) -> list:
+    """
+    Anonymize the files of a series in the worker process with a shared SeriesCache
+    Args:
+        tasks: tasks of the files of the series, see _anonymize_file
+    Returns:
+        list: the results of the files, see _anonymize_file
+    """
+    series_cache = SeriesCache(_profile)
+    return _wait_writes(tasks, [_anonymize_file(task, series_cache) for task in tasks])
+
+
+def _anonymize_batch(tasks: list) -> list:
+    """
+    Anonymize a batch of files in the worker process, each file is compressed and written by the compression threads
+    while the next files are anonymized
+    Args:
+        tasks: tasks of the files, see _anonymize_file
+    Returns:
+        list: the results of the files, see _anonymize_file
+    """
+    return _wait_writes(tasks, [_anonymize_file(task) for task in tasks])
+
+
+def _wait_writes(tasks: list, results: list) -> list:
+    """
+    Wait for the output files of the tasks written by the compression threads, if any, and add their write errors
+    and the compression counters of the worker to the results
+    """
+    if _writer is None:
+        return results
+    errors = _writer.wait()
+    for (_, output_file_path, _), result in zip(tasks, results):
+        if output_file_path in errors:
+            result['error'], result['written'] = errors[output_file_path], None
+    if results:
+        results[-1]['compression'] = _writer.report.pop()
+    return results
+
+
+def _batches(tasks, size: int):
+    batch = []
+    for task in tasks:
+        batch.append(task)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _key_setting(setting) -> Optional[str]:
+    """
+    Identify the key or the store of a UID mapper, a date shifter or a pseudonymizer for the run fingerprint: the
+    identifier of its secret (see src.utils.key_id, never the secret itself) or the path of its UID store
+    """
+    if isinstance(setting, PersistentUIDMapper):
+        return os.path.abspath(setting.path)
+    return getattr(setting, 'key_id', None)
+
+
+def _run_fingerprint(profile: AnonymizationProfile, delete_private_tags: bool, uid_mapper,
+                     file_options: dict, date_shifter=None, compression_options: dict = None,
+                     pseudonymizer=None) -> str:
+    """
+    Fingerprint of the anonymization settings of a run, the files of a previous run are skipped only if it matches
     """
-    Read data from input path (folder or file) and launch the anonymization.
+    settings = [profile.fingerprint, delete_private_tags, type(uid_mapper).__name__, _key_setting(uid_mapper),
+                sorted((file_options or {}).items()), repr(date_shifter), _key_setting(date_shifter),
+                repr(pseudonymizer), _key_setting(pseudonymizer)]
+    if compression_options:
+        settings.append(sorted(compression_options.items()))
+    return hashlib.sha256(repr(settings).encode()).hexdigest()
+
+
+def _skip_done(tasks, manifest: Manifest, fingerprint: str, hash_inputs: bool, skipped: list):
+    """
+    Filter out the files already done according to the manifest, and add the previous content hash to the tasks
+    """
+    for input_file_path, output_file_path in tasks:
+        record = manifest.get_done(input_file_path, fingerprint) if manifest is not None else None
+        if record is None or not os.path.exists(output_file_path):
+            yield input_file_path, output_file_path, None
+        elif hash_inputs:
+            # The worker compares the content hash
+            yield input_file_path, output_file_path, record['hash']
+        else:
+            stat = os.stat(input_file_path)
+            if manifest.is_done(input_file_path, stat.st_size, stat.st_mtime_ns, fingerprint):
+                skipped.append(input_file_path)
+            else:
+                yield input_file_path, output_file_path, None
+
+
+def anonymize(input_path: str, output_path: str, anonymization_actions: dict, deletePrivateTags: bool,
+              workers: int = 1, uid_mapper=None, file_options: dict = None, sniff_threads: int = 0,
+              manifest_path: str = None, hash_inputs: bool = False, pipeline_options: dict = None,
+              stats: RunStats = None, date_shifter: DateShifter = None, series_size: int = None,
+              compression_options: dict = None, archive_in_flight: int = 64, pseudonymizer=None) -> list:
+    """
+    Read data from input path (file or folder, recursively) and launch the anonymization.
+    Files are spread across a pool of worker processes as they are found, the errors are collected without aborting
+    the batch.
     Args:
         input_path: Path to the file or folder to anonymize
         output_path: Path to the output file or folder
         anonymization_actions: Dictionary of anonymization actions
         deletePrivateTags: Define if private tags should be delete or not
+        workers: Number of worker processes, the files are anonymized in the current process if 1
+        uid_mapper: UID mapper used by every worker, see src.uid. Random UIDs are generated if not set, which
+            requires a single worker
+        file_options: Extra keyword arguments of anonymize_dicom_file, e.g. stream_pixel_data
+        sniff_threads: Number of threads checking if the files of the input folder are DICOM files
+        manifest_path: Path to the job manifest, the files already done by a previous run with the same settings are
+            skipped and the files processed by this run are recorded, see src.manifest
+        hash_inputs: Compare the content hash of the input files instead of their size and modification time to
+            decide if they can be skipped
+        pipeline_options: If set, the files are read and written asynchronously while others are anonymized,
+            keyword arguments of src.pipeline.run_pipeline, e.g. io_concurrency. file_options is not supported then
+        stats: If set, the statistics of every worker are collected and merged into it, see src.stats
+        date_shifter: If set, the dates are shifted with the offset of their patient instead of being replaced with
+            constants, see src.date_shift
+        series_size: If set, the files are grouped by patient and series, by groups of at most series_size files,
+            and each group is anonymized by a worker with a shared src.series.SeriesCache. Not supported with
+            pipeline_options
+        compression_options: If set, the output files are compressed by threads of each worker, keyword arguments
+            of src.compression.OutputWriter, e.g. codec. The suffix of the codec, if any, is appended to the output
+            file names and the bytes saved and the CPU time of the codec are printed. Not supported with
+            pipeline_options, or with the stream_pixel_data and patch_in_place file options
+        archive_in_flight: Maximum number of archive members held in memory, if the input or the output path is a
+            ZIP or TAR archive (see src.archive). The members are anonymized in memory, the manifest, the series mode,
+            pipeline_options, compression_options and file_options are not supported then
+        pseudonymizer: If set, the values of the pseudonymize rules are replaced with their pseudonym instead of
+            constants, see src.pseudonym
     Returns:
-        None
+        list: (input file path, error message) of the files which could not be anonymized
     Raises:
-        ValueError: If output folder is not set
+        ValueError: If output folder is not set, if an archive is combined with an option it does not support, or if
+            several workers would replace the UIDs with random UIDs of their own
     """
-    # Get input arguments
-    input_folder = ''
-    output_folder = ''
+    # Archives are read and written as streams of members, without the files of the other modes
+    archive_mode = is_archive_path(input_path) or is_archive_path(output_path)
+    if archive_mode and (manifest_path is not None or pipeline_options is not None or series_size is not None
+                         or compression_options or any((file_options or {}).values())):
+        raise ValueError('Archives cannot be combined with a manifest, the asynchronous pipeline, the series mode, '
+                         'compression or the file options')
+    if archive_mode:
+        tasks = iter(())
+        total = None
+    else:
+        # Get input arguments
+        input_folder = ''
+        output_folder = ''
+
+        if os.path.isdir(input_path):
+            input_folder = input_path
 
-    if os.path.isdir(input_path):
-        input_folder = input_path
+        if os.path.isdir(output_path):
+            output_folder = output_path
+            if input_folder == '':
+                output_path = os.path.join(output_folder, os.path.basename(input_path))
 
-    if os.path.isdir(output_path):
-        output_folder = output_path
+        if input_folder != '' and output_folder == '':
+            raise ValueError('Error, please set a correct output folder path')
+
+        # Generate the input files as they are found if a folder has been set, the output tree mirrors the input tree
         if input_folder == '':
-            output_path = os.path.join(output_folder, os.path.basename(input_path))
+            tasks = iter([(input_path, output_path)])
+            total = 1
+        else:
+            tasks = ((os.path.join(input_folder, relative_path), os.path.join(output_folder, relative_path))
+                     for relative_path in iter_dicom_files(input_folder, sniff_threads))
+            total = None
+        if compression_options:
+            codec = compression_options['codec']
+            # Checked before the workers start, their initializer would fail in a loop
+            check_codec(codec)
+            tasks = ((input_file_path, compressed_path(output_file_path, codec))
+                     for input_file_path, output_file_path in tasks)
 
-    if input_folder != '' and output_folder == '':
-        raise ValueError('Error, please set a correct output folder path')
+    profile = compile_profile(anonymization_actions)
+    workers = max(1, workers if total is None else min(workers, total))
+    if workers > 1 and is_process_local(uid_mapper):
+        # The files of a study would get different UIDs on each worker
+        raise ValueError('Random UIDs are remembered by each process, use a KeyedUIDMapper or a PersistentUIDMapper '
+                         'with more than one worker')
 
-    # Generate list of input file if a folder has been set
-    input_files_list = []
-    output_files_list = []
-    if input_folder == '':
-        input_files_list.append(input_path)
-        output_files_list.append(output_path)
-    else:
-        files = os.listdir(input_folder)
-        for fileName in files:
-            input_file_path = os.path.join(input_folder, fileName)
-            output_file_path = os.path.join(output_folder, fileName)
-            if is_dicom_file(input_file_path):
-                input_files_list.append(input_file_path)
-                output_files_list.append(output_file_path)
-
-    progress_bar = tqdm.tqdm(total=len(input_files_list))
-    for idx, input_file_path in enumerate(input_files_list):
-        anonymize_dicom_file(input_file_path, output_files_list[idx], anonymization_actions, deletePrivateTags)
+    manifest = Manifest(manifest_path) if manifest_path is not None else None
+    fingerprint = _run_fingerprint(profile, deletePrivateTags, uid_mapper, file_options, date_shifter,
+                                   compression_options, pseudonymizer)
+    skipped = []
+    tasks = _skip_done(tasks, manifest, fingerprint, hash_inputs, skipped)
+    if series_size is not None:
+        tasks = group_by_series(tasks, series_size)
+    elif compression_options:
+        tasks = _batches(tasks, _COMPRESSION_BATCH_SIZE)
+    compression_report = CompressionReport() if compression_options else None
+
+    errors = []
+    total_size = 0
+    written_counts = collections.Counter()
+    start = time.perf_counter()
+    progress_bar = tqdm.tqdm(total=total)
+    count = 0
+
+    def handle_result(result: dict) -> None:
+        nonlocal count, total_size
+        if result['written'] == SKIPPED:
+            skipped.append(result['path'])
+        else:
+            count += 1
+            total_size += result['size']
+        if result['error'] is not None:
+            errors.append((result['path'], result['error']))
+        else:
+            written_counts[result['written']] += 1
+        if manifest is not None:
+            manifest.record(result['path'], result['size'], result['mtime_ns'], fingerprint,
+                            FAILED if result['error'] is not None else DONE, result['hash'], result['error'])
+        if stats is not None and 'stats' in result:
+            stats.merge(result['stats'])
+        if compression_report is not None and 'compression' in result:
+            compression_report.merge(result['compression'])
         progress_bar.update(1)
 
-    progress_bar.close()
+    pool = None
+    ignored_members = []
+    try:
+        if archive_mode:
+            # Results are handled in input order
+            anonymize_archive(input_path, output_path, profile, deletePrivateTags, uid_mapper, handle_result, workers,
+                              archive_in_flight, stats is not None, date_shifter, sniff_threads, ignored_members,
+                              pseudonymizer)
+        elif pipeline_options is not None:
+            # Results are handled in completion order
+            asyncio.run(run_pipeline(tasks, profile, deletePrivateTags, uid_mapper, handle_result, workers,
+                                     hash_inputs=hash_inputs, collect_stats=stats is not None,
+                                     date_shifter=date_shifter, pseudonymizer=pseudonymizer, **pipeline_options))
+        else:
+            if series_size is not None:
+                anonymize_task = _anonymize_series
+            elif compression_options:
+                anonymize_task = _anonymize_batch
+            else:
+                anonymize_task = _anonymize_file
+            batched = anonymize_task is not _anonymize_file
+            if workers == 1:
+                _init_worker(profile, deletePrivateTags, uid_mapper, file_options, hash_inputs, stats is not None,
+                             date_shifter, compression_options, pseudonymizer)
+                results = map(anonymize_task, tasks)
+            else:
+                pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                            initargs=(profile, deletePrivateTags, uid_mapper, file_options,
+                                                      hash_inputs, stats is not None, date_shifter,
+                                                      compression_options, pseudonymizer))
+                # Results are yielded in input order, a series or a batch is already a large task
+                results = pool.imap(anonymize_task, tasks, chunksize=1 if batched else 4)
+            if batched:
+                results = (result for batch_results in results for result in batch_results)
+            for result in results:
+                handle_result(result)
+    finally:
+        if manifest is not None:
+            manifest.close()
+        if pool is not None:
+            # All the results have been consumed unless the batch has been interrupted
+            pool.terminate()
+            pool.join()
+        elif _writer is not None:
+            _writer.close()
+        progress_bar.close()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    processed = count - len(errors)
+    print('{} files anonymized, {} errors in {:.1f}s: {:.1f} files/s, {:.1f} MB/s'.format(
+        processed, len(errors), elapsed, processed / elapsed, total_size / elapsed / 1e6))
+    if skipped:
+        print('{} files skipped, already done by a previous run'.format(len(skipped)))
+    if ignored_members:
+        print('{} archive members skipped, not DICOM files'.format(len(ignored_members)))
+    if file_options and file_options.get('patch_in_place'):
+        print('{} files patched in place, {} files rewritten'.format(written_counts[PATCHED],
+                                                                   written_counts[REWRITTEN]))
+    if compression_report is not None:
+        for line in compression_report.summary():
+            print(line)
+    for input_file_path, error in errors:
+        print('Error, {} could not be anonymized: {}'.format(input_file_path, error))
+    return errors
 
 
 if __name__ == "__main__":
+    args = parser.parse_args()
     input_path = args.input_path
     output_path = args.output_path
     anonymization_actions = args.anonymization_actions
     keepPrivateTags = args.keepPrivateTags
 
-    if anonymization_actions is None:
-        anonymization_actions = {}
-    else:
+    if anonymization_actions is not None:
         anonymization_actions = json.loads(anonymization_actions)
 
-    anonymize(input_path, output_path, anonymization_actions, not keepPrivateTags)
+    date_shifter = None
+    pseudonymizer = None
+    if args.shift_dates and args.project_secret_file is None:
+        parser.error('--shift-dates requires --project-secret-file')
+    if args.keep_times and not args.shift_dates:
+        parser.error('--keep-times requires --shift-dates')
+    if args.pseudonymize and args.project_secret_file is None:
+        parser.error('--pseudonymize requires --project-secret-file')
+    if args.uid_store_export is not None and args.uid_store is None:
+        parser.error('--uid-store-export requires --uid-store')
+    if args.project_secret_file is not None:
+        with open(args.project_secret_file, 'rb') as secret_file:
+            project_secret = secret_file.read().strip()
+        uid_mapper = KeyedUIDMapper(project_secret)
+        if args.shift_dates:
+            date_shifter = DateShifter(project_secret, args.max_date_shift_days, args.keep_times)
+        if args.pseudonymize:
+            pseudonymizer = KeyedPseudonyms(project_secret, args.pseudonym_iterations)
+    elif args.uid_store is not None:
+        uid_mapper = PersistentUIDMapper(args.uid_store)
+    else:
+        uid_mapper = RandomUIDMapper(args.uid_cache_size)
+    if args.workers is None:
+        args.workers = 1 if is_process_local(uid_mapper) else os.cpu_count()
+    elif args.workers < 1:
+        parser.error('--workers must be at least 1')
+    elif args.workers > 1 and is_process_local(uid_mapper):
+        parser.error('--workers above 1 requires --project-secret-file or --uid-store, the random UIDs are not '
+                     'shared by the worker processes')
+
+    if args.memory_map and (args.stream_pixel_data or args.patch_in_place):
+        parser.error('--memory-map cannot be combined with --stream-pixel-data or --patch-in-place')
+    file_options = {'stream_pixel_data': args.stream_pixel_data, 'patch_in_place': args.patch_in_place,
+                    'memory_map': args.memory_map}
+    pipeline_options = None
+    if args.async_io:
+        if args.stream_pixel_data or args.patch_in_place or args.memory_map:
+            parser.error('--async-io cannot be combined with --stream-pixel-data, --patch-in-place or --memory-map')
+        if args.series:
+            parser.error('--async-io cannot be combined with --series')
+        pipeline_options = {'io_concurrency': args.io_concurrency, 'queue_size': args.queue_size}
+    compression_options = None
+    if args.compression is not None:
+        if args.stream_pixel_data or args.patch_in_place or args.async_io:
+            parser.error('--compression cannot be combined with --stream-pixel-data, --patch-in-place or --async-io')
+        try:
+            check_codec(args.compression)
+        except ImportError as error:
+            parser.error(str(error))
+        compression_options = {'codec': args.compression, 'level': args.compression_level,
+                               'threads': args.compression_threads}
+
+    if (is_archive_path(input_path) or is_archive_path(output_path)) and (
+            args.manifest is not None or args.async_io or args.series or compression_options is not None
+            or args.stream_pixel_data or args.patch_in_place or args.memory_map):
+        parser.error('ZIP/TAR archives cannot be combined with --manifest, --async-io, --series, --compression, '
+                     '--stream-pixel-data, --patch-in-place or --memory-map')
+
+    run_stats = RunStats() if args.stats is not None else None
+
+    pseudonym_manager = shared_pseudonyms = None
+    if pseudonymizer is not None:
+        # The user rules keep precedence over the pseudonymized tags
+        anonymization_actions = {**generate_actions(PSEUDONYM_TAGS, 'pseudonymize'), **(anonymization_actions or {})}
+        if args.pseudonym_shared_cache_mb > 0 and args.workers > 1:
+            pseudonym_manager, shared_pseudonyms = start_shared_cache(int(args.pseudonym_shared_cache_mb * 1024 ** 2))
+        pseudonymizer = CachedPseudonymizer(pseudonymizer, int(args.pseudonym_cache_mb * 1024 ** 2), shared_pseudonyms)
+
+    try:
+        anonymize(input_path, output_path, anonymization_actions, not keepPrivateTags, args.workers, uid_mapper,
+                  file_options, args.sniff_threads, args.manifest, args.manifest_hash, pipeline_options, run_stats,
+                  date_shifter, args.series_size if args.series else None, compression_options, args.archive_in_flight,
+                  pseudonymizer)
+        if shared_pseudonyms is not None:
+            info = shared_pseudonyms.info()
+            print('{} pseudonyms shared by the workers, {:.1f} MB, {} evicted'.format(
+                info['entries'], info['bytes'] / 1e6, info['evictions']))
+    finally:
+        if pseudonym_manager is not None:
+            pseudonym_manager.shutdown()
+
+    if run_stats is not None:
+        with open(args.stats, 'w') as stats_file:
+            stats_file.write(run_stats.to_json() if args.stats_format == 'json' else run_stats.to_prometheus())
+
+    if args.uid_store_export is not None:
+        print('{} UIDs exported to {}'.format(uid_mapper.export_csv(args.uid_store_export), args.uid_store_export))
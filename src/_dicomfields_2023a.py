@@ -0,0 +1,670 @@
+"""
+Tag tables of data/dicom_fields_2023a.json
+Generated by python -m src.compile_tags, do not edit
+"""
+SOURCE = 'dicom_fields_2023a.json'
+SOURCE_SHA256 = 'f28312fead4ff8a6868e4e40a3ead0f585ab942ace6d38cc13766315fb2f0430'
+
+D_TAGS = (
+    (0x0018, 0x11BB),
+    (0x006A, 0x0005),
+    (0x006A, 0x0003),
+    (0x0044, 0x0104),
+    (0x0400, 0x0562),
+    (0x300C, 0x0127),
+    (0x0400, 0x0115),
+    (0x0012, 0x0081),
+    (0x0012, 0x0020),
+    (0x0012, 0x0010),
+    (0x0012, 0x0040),
+    (0x0012, 0x0042),
+    (0x0040, 0x0512),
+    (0x0040, 0xA730),
+    (0x0008, 0x0107),
+    (0x0008, 0x0106),
+    (0x0040, 0xA121),
+    (0x0040, 0xA120),
+    (0x0018, 0x9701),
+    (0x2100, 0x0140),
+    (0x3010, 0x002D),
+    (0x0400, 0x0105),
+    (0x0068, 0x6226),
+    (0x0042, 0x0011),
+    (0x3010, 0x0035),
+    (0x3010, 0x0038),
+    (0x0018, 0x9804),
+    (0x0034, 0x0002),
+    (0x0034, 0x0001),
+    (0x0018, 0x9074),
+    (0x0034, 0x0007),
+    (0x0018, 0x9151),
+    (0x0018, 0x9623),
+    (0x0070, 0x0001),
+    (0x0072, 0x000A),
+    (0x003A, 0x0314),
+    (0x0068, 0x6270),
+    (0x300A, 0x0741),
+    (0x300A, 0x0742),
+    (0x300A, 0x0783),
+    (0x0400, 0x0563),
+    (0x300A, 0x0760),
+    (0x0040, 0x1101),
+    (0x0040, 0xA123),
+    (0x300A, 0x0619),
+    (0x300A, 0x0623),
+    (0x300A, 0x067C),
+    (0x0400, 0x0565),
+    (0x300A, 0x073A),
+    (0x0040, 0xA13A),
+    (0x300A, 0x0002),
+    (0x3010, 0x0054),
+    (0x300A, 0x062A),
+    (0x3008, 0x0162),
+    (0x3008, 0x0164),
+    (0x3008, 0x0166),
+    (0x3008, 0x0168),
+    (0x0072, 0x005E),
+    (0x0072, 0x005F),
+    (0x0072, 0x0061),
+    (0x0072, 0x0063),
+    (0x0072, 0x0066),
+    (0x0072, 0x0068),
+    (0x0072, 0x0065),
+    (0x0072, 0x006A),
+    (0x0072, 0x006C),
+    (0x0072, 0x006E),
+    (0x0072, 0x006B),
+    (0x0072, 0x006D),
+    (0x0072, 0x0071),
+    (0x0072, 0x0070),
+    (0x0018, 0x936A),
+    (0x0034, 0x0005),
+    (0x0018, 0x9369),
+    (0x300A, 0x022C),
+    (0x300A, 0x022E),
+    (0x0040, 0x0551),
+    (0x3006, 0x0002),
+    (0x0040, 0xA122),
+    (0x3008, 0x0024),
+    (0x3008, 0x0025),
+    (0x300A, 0x0608),
+    (0x300A, 0x0736),
+    (0x300A, 0x0734),
+    (0x3010, 0x0033),
+    (0x3010, 0x0034),
+    (0x0040, 0xA030),
+    (0x0040, 0xA075),
+    (0x0040, 0xA073),
+    (0x0040, 0xA027),
+    (0x0018, 0x9371),
+    (0x0018, 0x9367),
+)
+
+Z_TAGS = (
+    (0x0008, 0x0050),
+    (0x0018, 0x1203),
+    (0x0012, 0x0060),
+    (0x0012, 0x0021),
+    (0x0012, 0x0030),
+    (0x0012, 0x0031),
+    (0x0012, 0x0050),
+    (0x3010, 0x000F),
+    (0x3010, 0x0017),
+    (0x0008, 0x009C),
+    (0x3010, 0x001B),
+    (0x0040, 0x2017),
+    (0x3010, 0x007F),
+    (0x0040, 0x0513),
+    (0x0040, 0x0562),
+    (0x3010, 0x0043),
+    (0x0040, 0xA082),
+    (0x0010, 0x0030),
+    (0x0010, 0x0010),
+    (0x0010, 0x0040),
+    (0x0010, 0x0020),
+    (0x0040, 0x2016),
+    (0x3010, 0x007B),
+    (0x3010, 0x0081),
+    (0x300A, 0x067D),
+    (0x3010, 0x005C),
+    (0x0008, 0x0090),
+    (0x300E, 0x0004),
+    (0x300E, 0x0005),
+    (0x3006, 0x00A6),
+    (0x3006, 0x0026),
+    (0x300A, 0x0615),
+    (0x300A, 0x0611),
+    (0x3010, 0x005A),
+    (0x0400, 0x0564),
+    (0x0040, 0x0610),
+    (0x3006, 0x0008),
+    (0x3006, 0x0009),
+    (0x0008, 0x0020),
+    (0x0020, 0x0010),
+    (0x0008, 0x0030),
+    (0x3010, 0x007A),
+    (0x0040, 0xA088),
+)
+
+X_TAGS = (
+    (0x0018, 0x4000),
+    (0x0018, 0x9424),
+    (0x0040, 0x4035),
+    (0x0010, 0x21B0),
+    (0x0040, 0xA353),
+    (0x0038, 0x0010),
+    (0x0038, 0x0020),
+    (0x0008, 0x1084),
+    (0x0008, 0x1080),
+    (0x0038, 0x0021),
+    (0x0000, 0x1000),
+    (0x0010, 0x2110),
+    (0x006A, 0x0006),
+    (0x0044, 0x0004),
+    (0x4000, 0x0010),
+    (0x0044, 0x0105),
+    (0x0040, 0xA078),
+    (0x300A, 0x00C3),
+    (0x300A, 0x00DD),
+    (0x0010, 0x1081),
+    (0x0014, 0x407E),
+    (0x0014, 0x407C),
+    (0x0016, 0x004D),
+    (0x0018, 0x1007),
+    (0x0400, 0x0310),
+    (0x0012, 0x0082),
+    (0x0012, 0x0072),
+    (0x0012, 0x0071),
+    (0x0012, 0x0051),
+    (0x0040, 0x0310),
+    (0x0040, 0x0280),
+    (0x300A, 0x02EB),
+    (0x0040, 0x3001),
+    (0x0008, 0x009D),
+    (0x0050, 0x001B),
+    (0x0040, 0x051A),
+    (0x0070, 0x0086),
+    (0x0018, 0x1042),
+    (0x0018, 0x1043),
+    (0x0018, 0xA002),
+    (0x0018, 0xA003),
+    (0x0010, 0x2150),
+    (0x2100, 0x0040),
+    (0x2100, 0x0050),
+    (0x0040, 0xA307),
+    (0x0038, 0x0300),
+    (0x0008, 0x0025),
+    (0x0008, 0x0035),
+    (0x0040, 0xA07C),
+    (0xFFFC, 0xFFFC),
+    (0x0040, 0xA110),
+    (0x0018, 0x1200),
+    (0x0018, 0x1012),
+    (0x0018, 0x1202),
+    (0x0018, 0x937F),
+    (0x0008, 0x2111),
+    (0x0050, 0x0020),
+    (0x0016, 0x004B),
+    (0xFFFA, 0xFFFA),
+    (0x0038, 0x0030),
+    (0x0038, 0x0040),
+    (0x0038, 0x0032),
+    (0x300A, 0x079A),
+    (0x4008, 0x011A),
+    (0x4008, 0x0119),
+    (0x300A, 0x0016),
+    (0x3010, 0x0037),
+    (0x3010, 0x0036),
+    (0x300A, 0x0676),
+    (0x0012, 0x0087),
+    (0x0012, 0x0086),
+    (0x0010, 0x2160),
+    (0x0040, 0x4011),
+    (0x003A, 0x032B),
+    (0x0040, 0xA023),
+    (0x0040, 0xA024),
+    (0x300A, 0x0196),
+    (0x300A, 0x0072),
+    (0x0020, 0x9158),
+    (0x0018, 0x1008),
+    (0x0018, 0x1005),
+    (0x0016, 0x0076),
+    (0x0016, 0x0075),
+    (0x0016, 0x008C),
+    (0x0016, 0x008D),
+    (0x0016, 0x0088),
+    (0x0016, 0x0087),
+    (0x0016, 0x008A),
+    (0x0016, 0x0089),
+    (0x0016, 0x0084),
+    (0x0016, 0x0083),
+    (0x0016, 0x0086),
+    (0x0016, 0x0085),
+    (0x0016, 0x008E),
+    (0x0016, 0x007B),
+    (0x0016, 0x0081),
+    (0x0016, 0x0080),
+    (0x0016, 0x0072),
+    (0x0016, 0x0071),
+    (0x0016, 0x0074),
+    (0x0016, 0x0073),
+    (0x0016, 0x0082),
+    (0x0016, 0x007A),
+    (0x0016, 0x008B),
+    (0x0016, 0x0078),
+    (0x0016, 0x007D),
+    (0x0016, 0x007C),
+    (0x0016, 0x0079),
+    (0x0016, 0x0077),
+    (0x0016, 0x007F),
+    (0x0016, 0x007E),
+    (0x0016, 0x0070),
+    (0x0040, 0xE004),
+    (0x0040, 0x4037),
+    (0x0040, 0x4036),
+    (0x0088, 0x0200),
+    (0x0008, 0x4000),
+    (0x0020, 0x4000),
+    (0x0028, 0x4000),
+    (0x0040, 0x2400),
+    (0x4008, 0x0300),
+    (0x0008, 0x0015),
+    (0x0400, 0x0600),
+    (0x0008, 0x0081),
+    (0x0008, 0x1040),
+    (0x0008, 0x1041),
+    (0x0010, 0x1050),
+    (0x3010, 0x0085),
+    (0x0040, 0x1011),
+    (0x4008, 0x0112),
+    (0x4008, 0x0113),
+    (0x4008, 0x0111),
+    (0x4008, 0x010C),
+    (0x4008, 0x0115),
+    (0x4008, 0x0200),
+    (0x4008, 0x0202),
+    (0x4008, 0x0100),
+    (0x4008, 0x0101),
+    (0x4008, 0x0102),
+    (0x4008, 0x010B),
+    (0x4008, 0x010A),
+    (0x4008, 0x0108),
+    (0x4008, 0x0109),
+    (0x0018, 0x0035),
+    (0x0018, 0x0027),
+    (0x0040, 0x2004),
+    (0x0038, 0x0011),
+    (0x0038, 0x0014),
+    (0x0010, 0x0021),
+    (0x0038, 0x0061),
+    (0x0038, 0x0064),
+    (0x0040, 0x2005),
+    (0x0010, 0x21D0),
+    (0x0016, 0x004F),
+    (0x0016, 0x0050),
+    (0x0016, 0x0051),
+    (0x0016, 0x004E),
+    (0x0050, 0x0021),
+    (0x0400, 0x0404),
+    (0x0016, 0x002B),
+    (0x0010, 0x2000),
+    (0x0010, 0x1090),
+    (0x0010, 0x1080),
+    (0x0400, 0x0550),
+    (0x0020, 0x3403),
+    (0x0020, 0x3406),
+    (0x0020, 0x3405),
+    (0x0020, 0x3401),
+    (0x0018, 0x937B),
+    (0x0008, 0x1060),
+    (0x0040, 0x1010),
+    (0x0008, 0x1000),
+    (0x0400, 0x0552),
+    (0x0400, 0x0551),
+    (0x0040, 0xA192),
+    (0x0040, 0xA033),
+    (0x0040, 0xA193),
+    (0x0010, 0x2180),
+    (0x0040, 0x2010),
+    (0x0040, 0x2011),
+    (0x0040, 0x2008),
+    (0x0040, 0x2009),
+    (0x0400, 0x0561),
+    (0x2100, 0x0070),
+    (0x0010, 0x1000),
+    (0x0010, 0x1002),
+    (0x0010, 0x1001),
+    (0x0008, 0x0024),
+    (0x0008, 0x0034),
+    (0x0040, 0xA07A),
+    (0x0010, 0x1040),
+    (0x0010, 0x1010),
+    (0x0010, 0x1005),
+    (0x0010, 0x0032),
+    (0x0038, 0x0400),
+    (0x0010, 0x0050),
+    (0x0010, 0x1060),
+    (0x0010, 0x0101),
+    (0x0010, 0x0102),
+    (0x0010, 0x21F0),
+    (0x0010, 0x1020),
+    (0x0010, 0x2155),
+    (0x0010, 0x2154),
+    (0x0010, 0x1030),
+    (0x0010, 0x4000),
+    (0x300A, 0x0794),
+    (0x0038, 0x0500),
+    (0x0040, 0x1004),
+    (0x300A, 0x0792),
+    (0x300A, 0x078E),
+    (0x0040, 0x0243),
+    (0x0040, 0x0254),
+    (0x0040, 0x0250),
+    (0x0040, 0x4051),
+    (0x0040, 0x0251),
+    (0x0040, 0x0253),
+    (0x0040, 0x0244),
+    (0x0040, 0x4050),
+    (0x0040, 0x0245),
+    (0x0040, 0x0241),
+    (0x0040, 0x0241),
+    (0x0040, 0x4030),
+    (0x0040, 0x0242),
+    (0x0040, 0x4028),
+    (0x0008, 0x1050),
+    (0x0008, 0x1052),
+    (0x0040, 0x1102),
+    (0x0040, 0x1104),
+    (0x0040, 0x1103),
+    (0x0008, 0x1048),
+    (0x0008, 0x1049),
+    (0x0008, 0x1062),
+    (0x4008, 0x0114),
+    (0x0018, 0x1004),
+    (0x3002, 0x0123),
+    (0x3002, 0x0121),
+    (0x0010, 0x21C0),
+    (0x0040, 0x0012),
+    (0x300A, 0x000E),
+    (0x0070, 0x0082),
+    (0x0070, 0x0083),
+    (0x3010, 0x0061),
+    (0x0040, 0x4052),
+    (0x0044, 0x000B),
+    (0x0008, 0x1088),
+    (0x0020, 0x0027),
+    (0x0018, 0x1078),
+    (0x0018, 0x1072),
+    (0x0018, 0x1079),
+    (0x0018, 0x1073),
+    (0x300C, 0x0113),
+    (0x0040, 0x100A),
+    (0x0032, 0x1030),
+    (0x0040, 0x2001),
+    (0x0040, 0x1002),
+    (0x0032, 0x1066),
+    (0x0032, 0x1067),
+    (0x0074, 0x1234),
+    (0x0400, 0x0402),
+    (0x0038, 0x0004),
+    (0x0010, 0x1100),
+    (0x0008, 0x1120),
+    (0x0400, 0x0403),
+    (0x0008, 0x0092),
+    (0x0008, 0x0094),
+    (0x0008, 0x0096),
+    (0x0010, 0x2152),
+    (0x0040, 0x0275),
+    (0x0032, 0x1070),
+    (0x0040, 0x1400),
+    (0x0040, 0x1001),
+    (0x0040, 0x1005),
+    (0x0018, 0x9937),
+    (0x0074, 0x1236),
+    (0x0032, 0x1032),
+    (0x0032, 0x1033),
+    (0x0018, 0x9185),
+    (0x0010, 0x2299),
+    (0x0010, 0x2297),
+    (0x4008, 0x4000),
+    (0x4008, 0x0118),
+    (0x4008, 0x0040),
+    (0x4008, 0x0042),
+    (0x0008, 0x0054),
+    (0x3006, 0x0028),
+    (0x3006, 0x0038),
+    (0x3006, 0x0088),
+    (0x3006, 0x0085),
+    (0x300A, 0x0004),
+    (0x300A, 0x0003),
+    (0x0038, 0x001A),
+    (0x0038, 0x001B),
+    (0x0038, 0x001C),
+    (0x0038, 0x001D),
+    (0x0040, 0x4034),
+    (0x0038, 0x001E),
+    (0x0040, 0x0006),
+    (0x0040, 0x000B),
+    (0x0040, 0x0007),
+    (0x0040, 0x0004),
+    (0x0040, 0x0005),
+    (0x0040, 0x4008),
+    (0x0040, 0x0009),
+    (0x0040, 0x0011),
+    (0x0040, 0x4010),
+    (0x0040, 0x0002),
+    (0x0040, 0x4005),
+    (0x0040, 0x0003),
+    (0x0040, 0x0001),
+    (0x0040, 0x0001),
+    (0x0040, 0x4027),
+    (0x0040, 0x0010),
+    (0x0040, 0x4025),
+    (0x0032, 0x1020),
+    (0x0032, 0x1021),
+    (0x0032, 0x1021),
+    (0x0032, 0x1000),
+    (0x0032, 0x1001),
+    (0x0032, 0x1010),
+    (0x0032, 0x1011),
+    (0x0008, 0x103E),
+    (0x0038, 0x0062),
+    (0x0038, 0x0060),
+    (0x300A, 0x01B2),
+    (0x300A, 0x01A6),
+    (0x0040, 0x06FA),
+    (0x0010, 0x21A0),
+    (0x0100, 0x0420),
+    (0x300A, 0x0216),
+    (0x0038, 0x0050),
+    (0x0040, 0x050A),
+    (0x0040, 0x0602),
+    (0x0040, 0x0600),
+    (0x0008, 0x0055),
+    (0x3006, 0x0006),
+    (0x3006, 0x0004),
+    (0x0032, 0x1040),
+    (0x0032, 0x1041),
+    (0x0032, 0x4000),
+    (0x0032, 0x1050),
+    (0x0032, 0x1051),
+    (0x0008, 0x1030),
+    (0x0032, 0x0012),
+    (0x0032, 0x0034),
+    (0x0032, 0x0035),
+    (0x0032, 0x0032),
+    (0x0032, 0x0033),
+    (0x0044, 0x0010),
+    (0x0040, 0xA354),
+    (0x0040, 0xDB07),
+    (0x0040, 0xDB06),
+    (0x4000, 0x4000),
+    (0x2030, 0x0020),
+    (0x0040, 0xA112),
+    (0x0018, 0x1201),
+    (0x0018, 0x1014),
+    (0x0008, 0x0201),
+    (0x0088, 0x0910),
+    (0x0088, 0x0912),
+    (0x0088, 0x0906),
+    (0x0088, 0x0904),
+    (0x0018, 0x5011),
+    (0x300A, 0x000B),
+    (0x0018, 0x100A),
+    (0x0018, 0x1009),
+    (0x0040, 0xA352),
+    (0x0040, 0xA358),
+    (0x0038, 0x4000),
+    (0x003A, 0x0329),
+    (0x0018, 0x9373),
+)
+
+U_TAGS = (
+    (0x0008, 0x0017),
+    (0x0020, 0x9161),
+    (0x3010, 0x0006),
+    (0x3010, 0x0013),
+    (0x0018, 0x1002),
+    (0x0400, 0x0100),
+    (0x0020, 0x9164),
+    (0x300A, 0x0013),
+    (0x3010, 0x006E),
+    (0x0008, 0x0058),
+    (0x0070, 0x031A),
+    (0x0020, 0x0052),
+    (0x0008, 0x0014),
+    (0x0008, 0x3010),
+    (0x0028, 0x1214),
+    (0x0018, 0x100B),
+    (0x0002, 0x0003),
+    (0x003A, 0x0310),
+    (0x0040, 0xA402),
+    (0x0040, 0xA171),
+    (0x0028, 0x1199),
+    (0x300A, 0x0650),
+    (0x0070, 0x1101),
+    (0x0070, 0x1102),
+    (0x0008, 0x0019),
+    (0x3010, 0x000B),
+    (0x300A, 0x0083),
+    (0x3010, 0x006F),
+    (0x3010, 0x0031),
+    (0x3006, 0x0024),
+    (0x0040, 0x4023),
+    (0x0040, 0xA172),
+    (0x0008, 0x1155),
+    (0x0004, 0x1511),
+    (0x300A, 0x0785),
+    (0x3006, 0x00C2),
+    (0x0000, 0x1001),
+    (0x3010, 0x003B),
+    (0x0020, 0x000E),
+    (0x0008, 0x0018),
+    (0x3010, 0x0015),
+    (0x0064, 0x0003),
+    (0x0040, 0x0554),
+    (0x0088, 0x0140),
+    (0x0020, 0x000D),
+    (0x0020, 0x0200),
+    (0x0018, 0x2042),
+    (0x0040, 0xDB0D),
+    (0x0040, 0xDB0C),
+    (0x0062, 0x0021),
+    (0x0008, 0x1195),
+    (0x300A, 0x0609),
+    (0x300A, 0x0700),
+    (0x0040, 0xA124),
+)
+
+Z_D_TAGS = (
+    (0x0070, 0x0084),
+    (0x0008, 0x0023),
+    (0x0008, 0x0033),
+    (0x0018, 0x0010),
+    (0x0018, 0x9919),
+)
+
+X_Z_TAGS = (
+    (0x0040, 0x0555),
+    (0x0008, 0x0022),
+    (0x0008, 0x0032),
+    (0x2200, 0x0005),
+    (0x2200, 0x0002),
+    (0x0010, 0x2203),
+    (0x0008, 0x1110),
+    (0x0032, 0x1060),
+    (0x300E, 0x0008),
+    (0x3008, 0x0105),
+    (0x300A, 0x00B2),
+)
+
+X_D_TAGS = (
+    (0x0018, 0x1400),
+    (0x0018, 0x700C),
+    (0x0018, 0x700A),
+    (0x0018, 0x9517),
+    (0x3008, 0x0054),
+    (0x0008, 0x0012),
+    (0x3010, 0x004D),
+    (0x3010, 0x004C),
+    (0x3008, 0x0056),
+    (0x0040, 0xA032),
+    (0x0008, 0x1072),
+    (0x0018, 0x1030),
+    (0x300A, 0x0006),
+    (0x300A, 0x0007),
+    (0x3010, 0x0056),
+    (0x0008, 0x0021),
+    (0x0008, 0x0031),
+    (0x0018, 0x9516),
+    (0x0018, 0x700E),
+    (0x3008, 0x0250),
+    (0x3010, 0x0077),
+    (0x3008, 0x0251),
+)
+
+X_Z_D_TAGS = (
+    (0x0008, 0x002A),
+    (0x0018, 0x1000),
+    (0x0008, 0x0013),
+    (0x0008, 0x0082),
+    (0x0008, 0x0080),
+    (0x0008, 0x1070),
+    (0x0008, 0x1111),
+    (0x0008, 0x1010),
+)
+
+X_Z_U_STAR_TAGS = (
+    (0x0008, 0x1140),
+    (0x0008, 0x2112),
+)
+
+D_MASKED_TAGS = (
+)
+
+Z_MASKED_TAGS = (
+)
+
+X_MASKED_TAGS = (
+    (0x5000, 0x0000, 0xFF01, 0x0000),
+    (0x6000, 0x4000, 0xFF01, 0xFFFF),
+    (0x6000, 0x3000, 0xFF01, 0xFFFF),
+)
+
+U_MASKED_TAGS = (
+)
+
+Z_D_MASKED_TAGS = (
+)
+
+X_Z_MASKED_TAGS = (
+)
+
+X_D_MASKED_TAGS = (
+)
+
+X_Z_D_MASKED_TAGS = (
+)
+
+X_Z_U_STAR_MASKED_TAGS = (
+)
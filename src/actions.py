@@ -1,33 +1,106 @@
-from typing import Dict, Callable
+from typing import Dict, Callable, Optional
 
 import pydicom
 
-from src.dicomfields import *
+from src import date_shift, dicomfields
+from src.uid import RandomUIDMapper
 
-dictionary = {}
+# Strategy used to replace the UIDs, see src.uid and set_uid_mapper
+uid_mapper: Callable[[str], str] = RandomUIDMapper()
+
+# Offsets of the dates of the patients, see src.date_shift and set_date_shifter. The dates are replaced with constants
+# if not set
+date_shifter: Optional[date_shift.DateShifter] = None
+
+# Pseudonyms of the text values of the pseudonymize rules, see src.pseudonym and set_pseudonymizer. The values are
+# replaced like D if not set
+pseudonymizer: Optional[Callable[[str], str]] = None
 
 
 # Default anonymization functions
 
+def set_uid_mapper(mapper: Callable[[str], str]) -> None:
+    """
+    Set the strategy used to replace the UIDs of the current process
+    Args:
+        mapper: callable returning the new UID of an old UID, e.g. src.uid.KeyedUIDMapper
+    Returns:
+        None
+    """
+    global uid_mapper
+    uid_mapper = mapper
+
+
+def get_uid_mapper() -> Callable[[str], str]:
+    """
+    Get the strategy used to replace the UIDs of the current process
+    Returns:
+        The current UID mapper
+    """
+    return uid_mapper
+
+
+def set_date_shifter(shifter: Optional[date_shift.DateShifter]) -> None:
+    """
+    Set the date offsets of the patients of the current process, the dates are shifted instead of being replaced
+    with constants
+    Args:
+        shifter: src.date_shift.DateShifter, None to replace the dates with constants
+    Returns:
+        None
+    """
+    global date_shifter
+    date_shifter = shifter
+
+
+def get_date_shifter() -> Optional[date_shift.DateShifter]:
+    """
+    Get the date offsets of the patients of the current process
+    Returns:
+        The current date shifter, None if the dates are replaced with constants
+    """
+    return date_shifter
+
+
+def set_pseudonymizer(new_pseudonymizer: Optional[Callable[[str], str]]) -> None:
+    """
+    Set the pseudonyms of the values of the pseudonymize rules of the current process
+    Args:
+        new_pseudonymizer: callable returning the pseudonym of a value, e.g. src.pseudonym.CachedPseudonymizer, None
+            to replace the values like D
+    Returns:
+        None
+    """
+    global pseudonymizer
+    pseudonymizer = new_pseudonymizer
+
+
+def get_pseudonymizer() -> Optional[Callable[[str], str]]:
+    """
+    Get the pseudonyms of the values of the pseudonymize rules of the current process
+    Returns:
+        The current pseudonymizer, None if the values are replaced like D
+    """
+    return pseudonymizer
+
+
 def get_uid(old_uid: str) -> str:
     """
-    Lookup new UID in cached dictionary or create new one if none found
+    Get the new UID of an old UID with the current UID mapper.
+    By default, a random UID is generated and cached in a bounded LRU cache.
     Args:
         old_uid: UID to be replaced
     Returns:
         new_uid: new UID
     """
-    from pydicom.uid import generate_uid
-    if old_uid not in dictionary:
-        dictionary[old_uid] = generate_uid(None)
-    return dictionary.get(old_uid)
+    return uid_mapper(old_uid)
 
 
 def replace_element_uid(element):
     """
-    Replace UID(s) with random UID(s)
-    The replaced value is kept in a dictionary link to the initial element.value in order to automatically
-    apply the same replaced value if we have another UID with the same value
+    Replace UID(s) with new UID(s), see get_uid
+    The same UID is replaced with the same value in order to keep the consistency between the elements and the
+    instances
     Args:
         element: pydicom.dataelem.DataElement
     Returns:
@@ -57,47 +130,129 @@ def replace_date_time_element(element):
 
 def replace_element_date(element):
     """
-    Replace date element's value with '00010101'
+    Replace date element's value with '00010101', or shift it with the dates of the dataset if a date shifter is set
     Args:
         element: pydicom.dataelem.DataElement
     Returns:
         None
     """
-    element.value = '00010101'
+    batch = date_shift.current_batch()
+    if batch is not None:
+        batch.add(element)
+    else:
+        element.value = '00010101'
 
 
 def replace_element_date_time(element):
     """
-    Replace date time element's value with '00010101010101.000000+0000'
+    Replace date time element's value with '00010101010101.000000+0000', or shift it with the dates of the dataset if
+    a date shifter is set
     Args:
         element: pydicom.dataelem.DataElement
     Returns:
         None
     """
-    element.value = '00010101010101.000000+0000'
+    batch = date_shift.current_batch()
+    if batch is not None:
+        batch.add(element)
+    else:
+        element.value = '00010101010101.000000+0000'
 
 
 def replace_element_time(element):
     """
-    Replace time element's value with '000000.00'
+    Replace time element's value with '000000.00'. The time is kept if the date shifter keeps the times, see
+    date_shift.DateShifter
     Args:
         element: pydicom.dataelem.DataElement
     Returns:
         None
     """
-    element.value = '000000.00'
+    batch = date_shift.current_batch()
+    if batch is None or not batch.keep_times:
+        element.value = '000000.00'
+
+
+def _set_value(value) -> Callable:
+    """
+    Element handler setting a constant value
+    """
+    def set_value(element):
+        element.value = value
+    return set_value
+
+
+def _zero_number_string(element):
+    """
+    Replace DS and IS values with '0', keeping the number of values, e.g. for Pixel Spacing
+    """
+    element.value = ['0'] * element.VM if element.VM > 1 else '0'
+
+
+def _replace_sequence(element):
+    for sub_dataset in element.value:
+        for sub_element in sub_dataset:
+            replace_element(sub_element)
+
+
+def _empty_sequence(element):
+    for sub_dataset in element.value:
+        for sub_element in sub_dataset:
+            empty_element(sub_element)
+
+
+# Element handler of replace_element per VR
+_REPLACE_HANDLERS: Dict[str, Callable] = {
+    **{vr: _set_value('Anonymized') for vr in ('AE', 'CS', 'LO', 'LT', 'PN', 'SH', 'ST', 'UC', 'UR', 'UT')},
+    'AS': _set_value('000Y'),
+    'UI': replace_element_uid,
+    'DS': _zero_number_string,
+    'IS': _zero_number_string,
+    **{vr: _set_value(0) for vr in ('AT', 'FD', 'FL', 'SL', 'SS', 'SV', 'UL', 'US', 'UV', 'US or SS')},
+    'DA': replace_element_date,
+    'DT': replace_element_date_time,
+    'TM': replace_element_time,
+    # Zeros, as long as one value of the VR
+    **{vr: _set_value(bytes(size)) for vr, size in (('OB', 2), ('OW', 2), ('OB or OW', 2), ('OF', 4), ('OL', 4),
+                                                     ('OD', 8), ('OV', 8))},
+    'UN': _set_value(b'Anonymized'),
+    'SQ': _replace_sequence,
+}
+
+# Element handler of empty_element per VR
+_EMPTY_HANDLERS: Dict[str, Callable] = {
+    **{vr: _set_value('') for vr in ('AE', 'AS', 'CS', 'LO', 'LT', 'PN', 'SH', 'ST', 'UC', 'UI', 'UR', 'UT')},
+    'DA': replace_element_date,
+    'DT': replace_element_date_time,
+    'TM': replace_element_time,
+    **{vr: _set_value(0) for vr in ('FD', 'FL', 'SL', 'SS', 'SV', 'UL', 'US', 'UV', 'US or SS')},
+    'DS': _zero_number_string,
+    'IS': _zero_number_string,
+    'AT': _set_value(None),
+    **{vr: _set_value(b'') for vr in ('OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'OB or OW', 'UN')},
+    'SQ': _empty_sequence,
+}
+
+# Text VRs replaced with their pseudonym by pseudonymize_element, the pseudonyms of src.pseudonym fit all of them
+PSEUDONYM_VRS = frozenset(('AE', 'CS', 'LO', 'LT', 'PN', 'SH', 'ST', 'UC', 'UT'))
+
+
+def _not_implemented(element):
+    raise NotImplementedError('Not anonymized. VR {} not yet implemented.'.format(element.VR))
 
 
 def replace_element(element):
     """
     Replace element's value according to its VR:
-    - LO, LT, SH, PN, CS, ST, UT: replace with 'Anonymized'
+    - AE, CS, LO, LT, PN, SH, ST, UC, UR, UT: replace with 'Anonymized'
+    - AS: value will be replaced by '000Y'
     - UI: cf replace_element_UID
-    - DS and IS: value will be replaced by '0'
-    - FD, FL, SS, US, SL, UL: value will be replaced by 0
+    - DS and IS: each value will be replaced by '0'
+    - AT, FD, FL, SL, SS, SV, UL, US, UV: value will be replaced by 0
     - DA: value will be replaced by '00010101'
     - DT: value will be replaced by '00010101010101.000000+0000'
     - TM: value will be replaced by '000000.00'
+    - OB, OD, OF, OL, OV, OW: value will be replaced by zeros, as long as one value of the VR
     - UN: value will be replaced by b'Anonymized' (binary string)
     - SQ: call replace_element for all sub elements
     See https://laurelbridge.com/pdf/Dicom-Anonymization-Conformance-Statement.pdf
@@ -108,24 +263,7 @@ def replace_element(element):
     Raises:
         NotImplementedError: if VR is not implemented
     """
-    if element.VR in ('LO', 'LT', 'SH', 'PN', 'CS', 'ST', 'UT'):
-        element.value = 'Anonymized'
-    elif element.VR == 'UI':
-        replace_element_uid(element)
-    elif element.VR in ('DS', 'IS'):
-        element.value = '0'
-    elif element.VR in ('FD', 'FL', 'SS', 'US', 'SL', 'UL'):
-        element.value = 0
-    elif element.VR in ('DT', 'DA', 'TM'):
-        replace_date_time_element(element)
-    elif element.VR == 'UN':
-        element.value = b'Anonymized'
-    elif element.VR == 'SQ':
-        for sub_dataset in element.value:
-            for sub_element in sub_dataset.elements():
-                replace_element(sub_element)
-    else:
-        raise NotImplementedError('Not anonymized. VR {} not yet implemented.'.format(element.VR))
+    _REPLACE_HANDLERS.get(element.VR, _not_implemented)(element)
 
 
 def replace(dataset, tag):
@@ -147,13 +285,14 @@ def replace(dataset, tag):
 def empty_element(element):
     """
     Clean element according to the element's VR:
-    - SH, PN, UI, LO, LT, CS, AS, ST and UT: value will be set to ''
+    - AE, AS, CS, LO, LT, PN, SH, ST, UC, UI, UR and UT: value will be set to ''
     - DA: value will be replaced by '00010101'
     - DT: value will be replaced by '00010101010101.000000+0000'
     - TM: value will be replaced by '000000.00'
-    - UL, FL, FD, SL, SS and US: value will be replaced by 0
-    - DS and IS: value will be replaced by '0'
-    - UN: value will be replaced by: b'' (binary string)
+    - FD, FL, SL, SS, SV, UL, US and UV: value will be replaced by 0
+    - DS and IS: each value will be replaced by '0'
+    - AT: value will be emptied
+    - OB, OD, OF, OL, OV, OW and UN: value will be replaced by: b'' (binary string)
     - SQ: all subelement will be called with "empty_element"
     Date and time related VRs are not emptied by replacing their values with a empty string to keep
     the consistency with some software who expect a non null value for those VRs.
@@ -165,22 +304,7 @@ def empty_element(element):
     Raises:
         NotImplementedError: if VR is not implemented
     """
-    if element.VR in ('SH', 'PN', 'UI', 'LO', 'LT', 'CS', 'AS', 'ST', 'UT'):
-        element.value = ''
-    elif element.VR in ('DT', 'DA', 'TM'):
-        replace_date_time_element(element)
-    elif element.VR in ('UL', 'FL', 'FD', 'SL', 'SS', 'US'):
-        element.value = 0
-    elif element.VR in ('DS', 'IS'):
-        element.value == '0'
-    elif element.VR == 'UN':
-        element.value = b''
-    elif element.VR == 'SQ':
-        for sub_dataset in element.value:
-            for sub_element in sub_dataset.elements():
-                empty_element(sub_element)
-    else:
-        raise NotImplementedError('Not anonymized. VR {} not yet implemented.'.format(element.VR))
+    _EMPTY_HANDLERS.get(element.VR, _not_implemented)(element)
 
 
 def empty(dataset, tag):
@@ -212,7 +336,7 @@ def delete_element(dataset, element):
         replace_element_date(element)
     elif element.VR == 'SQ' and isinstance(element.value, pydicom.Sequence):
         for sub_dataset in element.value:
-            for sub_element in sub_dataset.elements():
+            for sub_element in list(sub_dataset):
                 delete_element(sub_dataset, sub_element)
     else:
         del dataset[element.tag]
@@ -274,6 +398,19 @@ def replace_UID(dataset, tag):
         replace_element_uid(element)
 
 
+def shift_date(dataset, tag):
+    """
+    Shift a date or date time with the dates of the dataset if a date shifter is set, see set_date_shifter, e.g. for
+    private dates. Replaced like D otherwise
+    Args:
+        dataset: pydicom.dataset.FileDataset
+        tag: pydicom.tag.BaseTag
+    Returns:
+        None
+    """
+    replace(dataset, tag)
+
+
 def empty_or_replace(dataset, tag):
     """Z/D - Z unless D is required to maintain IOD conformance (Type 2 versus Type 1)
     Args:
@@ -336,6 +473,43 @@ def delete_or_empty_or_replace_UID(dataset, tag):
             empty_element(element)
 
 
+def pseudonymize_element(element):
+    """
+    Replace the value(s) of a text element (AE, CS, LO, LT, PN, SH, ST, UC, UT) with their pseudonym, see
+    set_pseudonymizer. Empty values are kept empty. The other VRs, and every VR if no pseudonymizer is set, are
+    replaced like replace_element
+    Args:
+        element: pydicom.dataelem.DataElement
+    Returns:
+        None
+    """
+    if pseudonymizer is None or element.VR not in PSEUDONYM_VRS:
+        replace_element(element)
+        return
+    from pydicom.multival import MultiValue
+    if isinstance(element.value, MultiValue):
+        for k, v in enumerate(element.value):
+            if v:
+                element.value[k] = pseudonymizer(str(v))
+    elif element.value:
+        element.value = pseudonymizer(str(element.value))
+
+
+def pseudonymize(dataset, tag):
+    """
+    Replace a text value with its pseudonym if a pseudonymizer is set, see set_pseudonymizer, e.g. for the Patient
+    ID or the Institution Name. Replaced like D otherwise
+    Args:
+        dataset: pydicom.dataset.FileDataset
+        tag: pydicom.tag.BaseTag
+    Returns:
+        None
+    """
+    element = dataset.get(tag)
+    if element is not None:
+        pseudonymize_element(element)
+
+
 def generate_actions(tag_list: list, action: str or Callable, options: dict = None) -> Dict[str, Callable]:
     """
     Generate a dictionary using list values as tag and assign the same value to all
@@ -355,22 +529,35 @@ def generate_actions(tag_list: list, action: str or Callable, options: dict = No
     return {tag: final_action for tag in tag_list}
 
 
+# Action of each table of the DICOM standard, see dicomfields.py
+_STANDARD_TABLE_ACTIONS = (
+    ("D_TAGS", "replace"),
+    ("Z_TAGS", "empty"),
+    ("X_TAGS", "delete"),
+    ("U_TAGS", "replace_UID"),
+    ("Z_D_TAGS", "empty_or_replace"),
+    ("X_Z_TAGS", "delete_or_empty"),
+    ("X_D_TAGS", "delete_or_replace"),
+    ("X_Z_D_TAGS", "delete_or_empty_or_replace"),
+    ("X_Z_U_STAR_TAGS", "delete_or_empty_or_replace_UID"),
+)
+
+
 def initialize_actions() -> dict:
     """
-    Initialize anonymization actions with DICOM standard values
+    Initialize anonymization actions with DICOM standard values, including the repeating groups such as
+    (60xx,3000) Overlay Data with (group, element, group_mask, element_mask) keys
     Returns:
         dict: dictionary of anonymization actions
     """
-    anonymization_actions = generate_actions(D_TAGS, actions_map_name_functions["replace"])
-    anonymization_actions.update(generate_actions(Z_TAGS, actions_map_name_functions["empty"]))
-    anonymization_actions.update(generate_actions(X_TAGS, actions_map_name_functions["delete"]))
-    anonymization_actions.update(generate_actions(U_TAGS, actions_map_name_functions["replace_UID"]))
-    anonymization_actions.update(generate_actions(Z_D_TAGS, actions_map_name_functions["empty_or_replace"]))
-    anonymization_actions.update(generate_actions(X_Z_TAGS, actions_map_name_functions["delete_or_empty"]))
-    anonymization_actions.update(generate_actions(X_D_TAGS, actions_map_name_functions["delete_or_replace"]))
-    anonymization_actions.update(generate_actions(X_Z_D_TAGS, actions_map_name_functions["delete_or_empty_or_replace"]))
-    anonymization_actions.update(
-        generate_actions(X_Z_U_STAR_TAGS, actions_map_name_functions["delete_or_empty_or_replace_UID"]))
+    anonymization_actions = {}
+    for table_name, action_name in _STANDARD_TABLE_ACTIONS:
+        anonymization_actions.update(
+            generate_actions(getattr(dicomfields, table_name), actions_map_name_functions[action_name]))
+    for table_name, action_name in _STANDARD_TABLE_ACTIONS:
+        masked_table_name = table_name.replace("_TAGS", "_MASKED_TAGS")
+        anonymization_actions.update(
+            generate_actions(getattr(dicomfields, masked_table_name), actions_map_name_functions[action_name]))
     return anonymization_actions
 
 
@@ -384,5 +571,76 @@ actions_map_name_functions = {
     "delete_or_replace": delete_or_replace,
     "delete_or_empty_or_replace": delete_or_empty_or_replace,
     "delete_or_empty_or_replace_UID": delete_or_empty_or_replace_UID,
+    "shift_date": shift_date,
+    "pseudonymize": pseudonymize,
     "keep": keep
 }
+
+
+def _remove_element(element):
+    """
+    Handler of the elements removed from their dataset, see apply_action: the element is deleted without being
+    converted by pydicom
+    """
+    raise RuntimeError('Removed elements are handled by apply_action')
+
+
+def _delete_sequence(element):
+    for sub_dataset in element.value:
+        for sub_tag in list(sub_dataset.keys()):
+            apply_action(delete, sub_dataset, sub_tag)
+
+
+# Element handler of delete per VR, as delete_element
+_DELETE_HANDLERS: Dict[str, Callable] = {
+    **{vr: _remove_element for vr in tuple(_REPLACE_HANDLERS) + tuple(_EMPTY_HANDLERS)},
+    'DA': replace_element_date,
+    'SQ': _delete_sequence,
+}
+
+# Element handler of each standard action per VR, resolved once per element by apply_action. The actions without
+# a table, and the VRs without a handler, are called with the dataset and the tag
+ELEMENT_HANDLERS: Dict[Callable, Dict[str, Callable]] = {
+    replace: _REPLACE_HANDLERS,
+    empty_or_replace: _REPLACE_HANDLERS,
+    delete_or_replace: _REPLACE_HANDLERS,
+    delete_or_empty_or_replace: _REPLACE_HANDLERS,
+    shift_date: _REPLACE_HANDLERS,
+    pseudonymize: {**_REPLACE_HANDLERS, **{vr: pseudonymize_element for vr in PSEUDONYM_VRS}},
+    empty: _EMPTY_HANDLERS,
+    delete_or_empty: _EMPTY_HANDLERS,
+    delete: _DELETE_HANDLERS,
+    replace_UID: {'UI': replace_element_uid},
+    delete_or_empty_or_replace_UID: {**_EMPTY_HANDLERS, 'UI': replace_element_uid},
+}
+
+
+def apply_action(action: Callable, dataset, tag) -> None:
+    """
+    Apply the action of an element of a dataset. The standard actions go straight to the handler of the VR of the
+    element, see ELEMENT_HANDLERS: the element is looked up once, and is not converted by pydicom when it is deleted
+    Args:
+        action: action of the element, called with the dataset and the tag if it has no handler for the VR
+        dataset: pydicom.dataset.Dataset
+        tag: pydicom.tag.BaseTag of an element of the dataset
+    Returns:
+        None
+    """
+    handlers = ELEMENT_HANDLERS.get(action)
+    if handlers is not None:
+        element = dataset.get_item(tag)
+        if element is None:
+            return
+        vr = element.VR
+        if vr is None or vr == 'UN':
+            # Implicit VR or unknown VR, let pydicom resolve it
+            element = dataset[tag]
+            vr = element.VR
+        handler = handlers.get(vr)
+        if handler is _remove_element:
+            del dataset[tag]
+            return
+        if handler is not None:
+            handler(dataset[tag])
+            return
+    action(dataset, (tag.group, tag.element))
@@ -1,78 +1,171 @@
+import io
+import os
+import threading
+from typing import BinaryIO, Optional, Union
+
 import pydicom
+from pydicom.multival import MultiValue
+
+from src import date_shift, patching, private_tags, streaming
+from src.actions import apply_action, get_date_shifter, get_uid_mapper, keep
+from src.memory_map import read_mapped, write_mapped
+from src.profile import AnonymizationProfile, compile_profile
+from src.stats import DATES, PATCH, PRIVATE_TAGS, READ, RULES, UIDS, WRITE, get_stats, stage
+from src.utils import is_sequence
+
+# How anonymize_dicom_file wrote the output file
+PATCHED = 'patched'
+REWRITTEN = 'rewritten'
+
+# The file meta information is always explicit VR little endian
+_FILE_META_ENCODING = (False, True)
+
+# Output buffer of anonymize_bytes, reused by the following calls of the same thread
+_buffers = threading.local()
+
+
+def _anonymize_elements(dataset: pydicom.Dataset, profile: AnonymizationProfile, kept: dict = None) -> None:
+    """
+    Walk the elements of the dataset once, including nested sequences, and apply the matching action of the profile.
+    The content of a sequence is not walked if an action other than keep has been applied on the sequence since
+    the action already handled its items.
+    Args:
+        dataset: pydicom Dataset to anonymize
+        profile: compiled anonymization profile
+        kept: if set, the private tags kept by the rules are added to this dict, by id of their dataset
+    Returns:
+        None
+    """
+    get_action = profile.get_action
+    private_actions = profile.private_actions
+    creators = None
+    stats = get_stats()
+    tags = list(dataset.keys())
+    if stats is not None:
+        stats.elements += len(tags)
+    for tag in tags:
+        action = get_action(tag)
+        if action is None and private_actions and tag.group & 1 and tag.element > 0x00FF:
+            # Rules on (private creator, offset), the private creators are indexed once per dataset
+            if creators is None:
+                creators = private_tags.index_private_creators(dataset)
+            action = private_actions.get((private_tags.private_creator_of(creators, tag), tag.element & 0x00FF))
+        if action is not None:
+            if action is not keep:
+                if stats is None:
+                    apply_action(action, dataset, tag)
+                else:
+                    stats.time_action(action, dataset, tag, apply_action)
+            # Private tags left by the rules are kept in place when the private tags are deleted
+            if kept is not None and tag.group & 1 and tag in dataset:
+                kept.setdefault(id(dataset), set()).add(tag)
+        if (action is None or action is keep) and is_sequence(dataset, tag):
+            for sub_dataset in dataset[tag].value:
+                _anonymize_elements(sub_dataset, profile, kept)
+
 
-from src import format_tag
-from src.actions import initialize_actions
-from src.utils import get_private_tag
+def _collect_uids(dataset: pydicom.Dataset, profile: AnonymizationProfile, uids: list) -> None:
+    """
+    Collect the values of the UI elements of the dataset which have a rule, including nested sequences
+    """
+    get_action = profile.get_action
+    for element in dataset:
+        if element.VR == 'UI':
+            action = get_action(element.tag)
+            if action is not None and action is not keep and element.value:
+                if isinstance(element.value, MultiValue):
+                    uids.extend(element.value)
+                else:
+                    uids.append(element.value)
+        elif element.VR == 'SQ':
+            for sub_dataset in element.value:
+                _collect_uids(sub_dataset, profile, uids)
 
 
 def anonymize_dataset(dataset: pydicom.Dataset,
                       extra_anonymization_rules: dict = None,
-                      delete_private_tags: bool = True) -> None:
+                      delete_private_tags: bool = True,
+                      profile: AnonymizationProfile = None,
+                      series_cache=None) -> None:
     """
     Anonymize a pydicom Dataset by using anonymization rules which links an action to a tag
     Args:
         dataset: pydicom Dataset to anonymize
         extra_anonymization_rules: Rules to be applied on the dataset
         delete_private_tags: If True, private tags will be deleted
+        profile: Compiled anonymization profile, see src.profile.compile_profile. Built from the standard
+            actions and extra_anonymization_rules if not set
+        series_cache: src.series.SeriesCache shared by the files of a series, built with the same profile
     Reutrn:
         None
+    Raises:
+        ValueError: If both profile and extra_anonymization_rules are set
     """
-    actions: dict = initialize_actions()
-    if extra_anonymization_rules is not None:
-        actions.update(extra_anonymization_rules)
-
-    private_tags = []
+    if profile is None:
+        profile = compile_profile(extra_anonymization_rules)
+    elif extra_anonymization_rules is not None:
+        raise ValueError('Extra anonymization rules must be compiled in the profile')
 
-    for tag, action in actions.items():
+    file_meta = getattr(dataset, 'file_meta', None)
+    anonymize_elements = _anonymize_elements
+    if series_cache is not None:
+        anonymize_elements = series_cache.anonymize_elements
+        series_cache.start()
 
-        element = None
+    # Let the UID mapper look up all the UIDs of the dataset at once if it can, e.g. in a database
+    prepare_uids = getattr(get_uid_mapper(), 'prepare', None)
+    if prepare_uids is not None:
+        with stage(UIDS):
+            uids = []
+            if file_meta is not None:
+                _collect_uids(file_meta, profile, uids)
+            _collect_uids(dataset, profile, uids)
+            prepare_uids(uids)
 
-        def _range_callback(dataset, data_element):
-            """
-            Callback function for walk function
-            """
-            if data_element.tag.group & tag[2] == tag[0] and data_element.tag.element & tag[3] == tag[1]:
-                action(dataset, (data_element.tag.group, data_element.tag.element))
+    # Collect the dates while the rules are applied, to shift them all at once with the offset of the patient
+    date_shifter = get_date_shifter()
+    dates = None
+    if date_shifter is not None:
+        dates = date_shift.start_batch(date_shifter.offset_days(str(dataset.get('PatientID') or '')),
+                                       date_shifter.keep_times)
 
-        # We are in a repeating group
-        if len(tag) > 2:
-            dataset.walk(_range_callback)
-        # Individual Tags
-        else:
+    try:
+        with stage(RULES):
             # From : https://github.com/KitwareMedical/dicom-anonymizer/pull/18
             # The meta header information is located in the `file_meta` dataset
-            # For tags with tag group `0x0002` we thus apply the action to the `file_meta` dataset
-            if tag[0] == 0x0002:
-                # Apply rule to meta information header
-                action(dataset.file_meta, tag)
-            else:
-                action(dataset, tag)
-            print(tag)
-            try:
-                element = dataset.get(tag)
-            except:
-                print("Cannot get element from tag: ", format_tag.tag_to_hex_strings(tag))
+            # The rules of the tags with tag group `0x0002` are thus applied on the `file_meta` dataset
+            if file_meta is not None:
+                anonymize_elements(file_meta, profile)
 
-            # Get private tag to restore it later
-            if element and element.tag.is_private:
-                private_tags.append(get_private_tag(dataset, tag))
+            # Collect the private tags kept by the rules
+            kept = {} if delete_private_tags else None
+            anonymize_elements(dataset, profile, kept)
+    finally:
+        if dates is not None:
+            date_shift.end_batch()
+
+    if dates is not None:
+        with stage(DATES):
+            dates.apply()
 
     # X - Private tags = (0xgggg, 0xeeee) where 0xgggg is odd
     if delete_private_tags:
-        dataset.remove_private_tags()
+        with stage(PRIVATE_TAGS):
+            private_tags.delete_private_tags(dataset, kept)
 
-        # Adding back private tags if specified in dictionary
-        for privateTag in private_tags:
-            creator = privateTag["creator"]
-            element = privateTag["element"]
-            block = dataset.private_block(creator["tagGroup"], creator["creatorName"], create=True)
-            if element is not None:
-                block.add_new(element["offset"], element["element"].VR, element["element"].value)
+    if series_cache is not None:
+        series_cache.finish()
 
 
 def anonymize_dicom_file(in_file: str, out_file: str,
                          extra_anonymization_rules: dict = None,
-                         delete_private_tags: bool = True) -> None:
+                         delete_private_tags: bool = True,
+                         profile: AnonymizationProfile = None,
+                         stream_pixel_data: bool = False,
+                         patch_in_place: bool = False,
+                         series_cache=None,
+                         writer=None,
+                         memory_map: bool = False) -> str:
     """
     Anonymize a DICOM file by modifying personal tags
     Conforms to DICOM standard except for customer specificities.
@@ -81,21 +174,207 @@ def anonymize_dicom_file(in_file: str, out_file: str,
         out_file: output DICOM file
         extra_anonymization_rules: extra anonymization rules to be applied
         delete_private_tags: define if private tags should be delete or not
+        profile: compiled anonymization profile, to be shared between files instead of extra_anonymization_rules
+        stream_pixel_data: if True, only the header is loaded in memory and the pixel data element is copied as is
+            from the input file to the output file by chunks. Deflated files are always loaded in memory.
+        patch_in_place: if True, the anonymized values are overwritten directly in a copy of the input file (or in
+            the input file itself if out_file is the same file) when no element has been added or deleted and every
+            value kept its encoded length. Otherwise, the file is rewritten as with stream_pixel_data.
+        series_cache: src.series.SeriesCache shared by the files of a series, built with the same profile
+        writer: src.compression.OutputWriter encoding, compressing and writing the output file in its threads. The
+            call returns once the dataset is handed to the writer, the write errors are returned by writer.wait().
+            Not supported with stream_pixel_data or patch_in_place
+        memory_map: if True, the input file is read through a memory map and its large binary values, e.g. the pixel
+            data, are written to the output file from the map without being copied in memory, see src.memory_map.
+            Not supported with stream_pixel_data or patch_in_place
     Returns:
-        None
+        str: how the output file has been written, PATCHED or REWRITTEN
     Raises:
         IOError: If input file does not exist or output file cannot be written.
+        ValueError: If writer or memory_map is combined with stream_pixel_data or patch_in_place
     """
+    if writer is not None and (stream_pixel_data or patch_in_place):
+        raise ValueError('The output writer cannot be combined with stream_pixel_data or patch_in_place')
+    if memory_map and (stream_pixel_data or patch_in_place):
+        raise ValueError('The memory map cannot be combined with stream_pixel_data or patch_in_place')
+    if stream_pixel_data or patch_in_place:
+        return _anonymize_dicom_file_streamed(in_file, out_file, extra_anonymization_rules, delete_private_tags,
+                                              profile, patch_in_place, series_cache)
+
+    # The mapped input file must not be truncated while its values are in use: the output file is written to a
+    # temporary file if they are the same, or the input file is not mapped if the writer threads write it
+    same_file = memory_map and os.path.exists(out_file) and os.path.samefile(in_file, out_file)
+    if same_file and writer is not None:
+        memory_map = same_file = False
+
     try:
-        dataset = pydicom.dcmread(in_file)
+        with stage(READ):
+            dataset = read_mapped(in_file) if memory_map else pydicom.dcmread(in_file)
     except IOError:
         raise IOError("Input file does not exist.")
 
     # Apply extra anonymization rules
-    anonymize_dataset(dataset, extra_anonymization_rules, delete_private_tags)
+    anonymize_dataset(dataset, extra_anonymization_rules, delete_private_tags, profile, series_cache)
+
+    if writer is not None:
+        with stage(WRITE):
+            writer.submit(dataset, out_file)
+        # The size of the output file is counted by the report of the writer
+        _count_file(in_file, None)
+        return REWRITTEN
+
+    write_file = out_file + '.tmp' if same_file else out_file
 
     # Store modified image
     try:
-        dataset.save_as(out_file)
+        with stage(WRITE):
+            if memory_map:
+                write_mapped(dataset, write_file)
+            else:
+                dataset.save_as(write_file)
     except IOError:
         raise IOError("Output file cannot be written.")
+    if same_file:
+        os.replace(write_file, out_file)
+    _count_file(in_file, out_file)
+    return REWRITTEN
+
+
+def _count_file(in_file: str, out_file: Optional[str]) -> None:
+    """
+    Add a processed file and its size to the statistics, if enabled. The output file is not counted if None
+    """
+    stats = get_stats()
+    if stats is not None:
+        stats.files += 1
+        stats.bytes_read += os.path.getsize(in_file)
+        if out_file is not None:
+            stats.bytes_written += os.path.getsize(out_file)
+
+
+def anonymize_stream(in_fp: BinaryIO, out_fp: BinaryIO,
+                     extra_anonymization_rules: dict = None,
+                     delete_private_tags: bool = True,
+                     profile: AnonymizationProfile = None) -> None:
+    """
+    Anonymize a DICOM file read from a file-like object and write it to another one, e.g. a socket or a buffer
+    Args:
+        in_fp: input DICOM file opened in binary mode, read from its current position
+        out_fp: output DICOM file opened in binary mode, written from its current position
+        extra_anonymization_rules: extra anonymization rules to be applied
+        delete_private_tags: define if private tags should be delete or not
+        profile: compiled anonymization profile, to be shared between files instead of extra_anonymization_rules
+    Returns:
+        None
+    """
+    stats = get_stats()
+    if stats is not None:
+        in_start, out_start = in_fp.tell(), out_fp.tell()
+    with stage(READ):
+        dataset = pydicom.dcmread(in_fp)
+    anonymize_dataset(dataset, extra_anonymization_rules, delete_private_tags, profile)
+    with stage(WRITE):
+        dataset.save_as(out_fp)
+    if stats is not None:
+        stats.files += 1
+        stats.bytes_read += in_fp.tell() - in_start
+        stats.bytes_written += out_fp.tell() - out_start
+
+
+def anonymize_bytes(data: Union[bytes, bytearray, memoryview, BinaryIO],
+                    extra_anonymization_rules: dict = None,
+                    delete_private_tags: bool = True,
+                    profile: AnonymizationProfile = None) -> bytes:
+    """
+    Anonymize a DICOM file held in memory, without touching the disk
+    Args:
+        data: content of the input DICOM file, or a file-like object such as a BytesIO
+        extra_anonymization_rules: extra anonymization rules to be applied
+        delete_private_tags: define if private tags should be delete or not
+        profile: compiled anonymization profile, to be shared between files instead of extra_anonymization_rules
+    Returns:
+        bytes: content of the anonymized DICOM file
+    """
+    # A BytesIO shares the memory of a bytes object instead of copying it
+    in_fp = data if hasattr(data, 'read') else io.BytesIO(data)
+
+    # The buffer of the thread is overwritten instead of being allocated again for every file, its size is the
+    # size of the largest file written so far
+    out_fp = getattr(_buffers, 'out', None)
+    if out_fp is None:
+        out_fp = _buffers.out = io.BytesIO()
+    out_fp.seek(0)
+    anonymize_stream(in_fp, out_fp, extra_anonymization_rules, delete_private_tags, profile)
+    with out_fp.getbuffer() as buffer:
+        return bytes(buffer[:out_fp.tell()])
+
+
+def _anonymize_dicom_file_streamed(in_file: str, out_file: str,
+                                   extra_anonymization_rules: dict = None,
+                                   delete_private_tags: bool = True,
+                                   profile: AnonymizationProfile = None,
+                                   patch_in_place: bool = False,
+                                   series_cache=None) -> str:
+    """
+    Anonymize the header of a DICOM file and patch it in place or copy its pixel data element as is,
+    see anonymize_dicom_file
+    """
+    try:
+        in_fp = open(in_file, 'rb')
+    except IOError:
+        raise IOError("Input file does not exist.")
+
+    with in_fp:
+        with stage(READ):
+            dataset, pixel_data_start = streaming.read_header(in_fp)
+            if pixel_data_start is None:
+                # Deflated file, read it again as a whole
+                in_fp.seek(0)
+                dataset = pydicom.dcmread(in_fp)
+                pixel_data_end = None
+                patch_in_place = False
+            else:
+                encoding = dataset.original_encoding
+                pixel_data_end = streaming.pixel_data_end(in_fp, pixel_data_start, *encoding)
+                # The trailing elements, if any, are anonymized as well
+                streaming.read_trailing_elements(in_fp, pixel_data_end, dataset)
+
+        if patch_in_place:
+            with stage(PATCH):
+                character_set = dataset.original_character_set
+                original = patching.snapshot(dataset, encoding, character_set, in_fp)
+                original_file_meta = patching.snapshot(dataset.file_meta, _FILE_META_ENCODING, None, in_fp)
+
+        anonymize_dataset(dataset, extra_anonymization_rules, delete_private_tags, profile, series_cache)
+
+        if patch_in_place:
+            with stage(PATCH):
+                patches = patching.plan_patches(original, dataset, encoding, character_set)
+                file_meta_patches = patching.plan_patches(original_file_meta, dataset.file_meta, _FILE_META_ENCODING,
+                                                          None)
+                try:
+                    patched = (patches is not None and file_meta_patches is not None
+                               and patching.apply_patches(in_file, out_file, patches + file_meta_patches))
+                except IOError:
+                    raise IOError("Output file cannot be written.")
+            if patched:
+                _count_file(in_file, out_file)
+                return PATCHED
+
+        # The input file is still read while writing, write a temporary file if they are the same
+        same_file = os.path.exists(out_file) and os.path.samefile(in_file, out_file)
+        write_file = out_file + '.tmp' if same_file else out_file
+        try:
+            out_fp = open(write_file, 'wb')
+        except IOError:
+            raise IOError("Output file cannot be written.")
+        with out_fp, stage(WRITE):
+            if pixel_data_end is None:
+                dataset.save_as(out_fp)
+            else:
+                streaming.write_streamed(dataset, in_fp, out_fp, pixel_data_start, pixel_data_end)
+
+    if same_file:
+        os.replace(write_file, out_file)
+    _count_file(in_file, out_file)
+    return REWRITTEN
@@ -0,0 +1,258 @@
+"""
+Archive input and output: the DICOM members of a ZIP or TAR archive are anonymized in memory and written to an output
+archive or folder, without being extracted to disk. The files of a folder can be written to an output archive too.
+
+The members are read in order by the main process, anonymized by a pool of worker processes (see
+pipeline.anonymize_buffer) and written in input order while the next members are anonymized. At most max_in_flight
+members are held in memory between the reader and the writer, whatever the size of the archive. TAR archives are
+read and written as streams, compressed TAR archives included.
+"""
+import io
+import multiprocessing
+import os
+import posixpath
+import tarfile
+import threading
+import time
+import zipfile
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src import pipeline
+from src.anonymizer import REWRITTEN
+from src.profile import AnonymizationProfile
+from src.stats import get_stats
+from src.utils import has_dicom_preamble, iter_dicom_files
+
+# Stream mode of tarfile of each TAR suffix, for the output archives
+_TAR_WRITE_MODES = (('.tar', 'w|'), ('.tar.gz', 'w|gz'), ('.tgz', 'w|gz'), ('.tar.bz2', 'w|bz2'),
+                    ('.tbz2', 'w|bz2'), ('.tar.xz', 'w|xz'), ('.txz', 'w|xz'))
+
+# Member of an archive: (name, content, modification time)
+Member = Tuple[str, bytes, float]
+
+
+def is_archive_path(path: str) -> bool:
+    """
+    Check if a path names a ZIP or TAR archive, from its suffix
+    """
+    lower_path = path.lower()
+    return lower_path.endswith('.zip') or any(lower_path.endswith(suffix) for suffix, _ in _TAR_WRITE_MODES)
+
+
+def _member_name(name: str) -> Optional[str]:
+    """
+    Normalized relative name of a member, None if it would be written outside the output folder
+    """
+    name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+    if name in ('', '.') or name == '..' or name.startswith('../'):
+        return None
+    return name
+
+
+def iter_archive_members(path: str, skipped: List[str] = None) -> Iterator[Member]:
+    """
+    Yield the DICOM members of a ZIP or TAR archive in archive order, checking the DICOM preamble of each member
+    Args:
+        path: path of the archive
+        skipped: if set, the names of the members which are not DICOM files or whose name is unsafe are added to it
+    Returns:
+        Iterator of the members, read one at a time
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                data = archive.read(info)
+                name = _member_name(info.filename)
+                if name is None or not has_dicom_preamble(data):
+                    if skipped is not None:
+                        skipped.append(info.filename)
+                    continue
+                yield name, data, time.mktime(info.date_time + (0, 0, -1))
+        return
+
+    # Stream mode, the archive is read once from the beginning to the end
+    with tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            data = archive.extractfile(info).read()
+            name = _member_name(info.name)
+            if name is None or not has_dicom_preamble(data):
+                if skipped is not None:
+                    skipped.append(info.name)
+                continue
+            yield name, data, info.mtime
+
+
+def _file_member(path: str, name: str) -> Member:
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    return name, data, os.path.getmtime(path)
+
+
+def iter_folder_members(folder: str, sniff_threads: int = 0) -> Iterator[Member]:
+    """
+    Yield the DICOM files of a folder as members, see iter_dicom_files
+    """
+    for relative_path in iter_dicom_files(folder, sniff_threads):
+        yield _file_member(os.path.join(folder, relative_path), relative_path.replace(os.sep, '/'))
+
+
+class _ZipOutput:
+    def __init__(self, path: str):
+        # The DICOM files are stored, the pixel data is usually compressed already or compressed by the storage
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, name: str, data: bytes, mtime: float) -> None:
+        # ZIP dates start in 1980
+        info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315532800))[:6])
+        info.external_attr = 0o644 << 16
+        self.archive.writestr(info, data)
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class _TarOutput:
+    def __init__(self, path: str, mode: str):
+        self.archive = tarfile.open(path, mode)
+
+    def write(self, name: str, data: bytes, mtime: float) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        # A BytesIO shares the memory of a bytes object instead of copying it
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class _FolderOutput:
+    def __init__(self, path: str):
+        self.folder = path
+
+    def write(self, name: str, data: bytes, mtime: float) -> None:
+        pipeline.write_file(os.path.join(self.folder, *name.split('/')), data)
+
+    def close(self) -> None:
+        pass
+
+
+def open_output(path: str):
+    """
+    Open the output of the members: a ZIP or TAR archive according to the suffix of the path, a folder otherwise
+    Returns:
+        object: output with write(name, data, mtime) and close()
+    """
+    lower_path = path.lower()
+    if lower_path.endswith('.zip'):
+        return _ZipOutput(path)
+    # Longest suffix first, e.g. .tar.gz before .tar
+    for suffix, mode in sorted(_TAR_WRITE_MODES, key=lambda item: -len(item[0])):
+        if lower_path.endswith(suffix):
+            return _TarOutput(path, mode)
+    return _FolderOutput(path)
+
+
+def _anonymize_member(member: Member) -> dict:
+    """
+    Anonymize a member in the worker process
+    Returns:
+        dict: name and size of the input member, error message or None, content and modification time of the output
+            member and the statistics of the worker since the previous member if enabled
+    """
+    name, data, mtime = member
+    result = {'path': name, 'size': len(data), 'mtime_ns': None, 'hash': None, 'error': None, 'written': None,
+              'data': None, 'mtime': mtime}
+    try:
+        result['data'] = pipeline.anonymize_buffer(data)
+    except Exception as error:
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    stats = get_stats()
+    if stats is not None:
+        result['stats'] = stats.pop()
+    return result
+
+
+def anonymize_archive(input_path: str, output_path: str, profile: AnonymizationProfile,
+                      delete_private_tags: bool = True, uid_mapper=None, on_result: Callable[[dict], None] = None,
+                      workers: int = 1, max_in_flight: int = 64, collect_stats: bool = False, date_shifter=None,
+                      sniff_threads: int = 0, skipped: List[str] = None, pseudonymizer=None) -> None:
+    """
+    Anonymize the DICOM members of an archive, or the DICOM files of a folder, into an archive or a folder
+    Args:
+        input_path: ZIP or TAR archive according to its suffix, folder or DICOM file
+        output_path: ZIP or TAR archive according to its suffix (see is_archive_path), folder otherwise
+        profile: compiled anonymization profile
+        delete_private_tags: if True, private tags will be deleted
+        uid_mapper: UID mapper used by the workers, see src.uid
+        on_result: called with the result of each member in input order: name and size of the input member, error
+            message or None and how the output member has been written
+        workers: number of processes anonymizing the members, the members are anonymized in the current process if 1
+        max_in_flight: maximum number of members read and not written yet
+        collect_stats: if True, the results have the statistics of their member, see src.stats
+        date_shifter: if set, the dates are shifted with the offset of their patient, see src.date_shift
+        sniff_threads: number of threads checking if the files of an input folder are DICOM files
+        skipped: if set, the names of the input members which are not DICOM files are added to it
+        pseudonymizer: if set, the values of the pseudonymize rules are replaced with their pseudonym, see
+            src.pseudonym
+    Returns:
+        None
+    """
+    if os.path.isdir(input_path):
+        members = iter_folder_members(input_path, sniff_threads)
+    elif is_archive_path(input_path):
+        members = iter_archive_members(input_path, skipped)
+    else:
+        members = iter([_file_member(input_path, os.path.basename(input_path))])
+
+    # The reader waits for a slot before reading a member, a slot is released once its member is written
+    chunk_size = 4
+    slot_count = max(max_in_flight, chunk_size * workers)
+    slots = threading.Semaphore(slot_count)
+    stop = threading.Event()
+
+    def _bounded(member_iterator):
+        # The slot is taken before the member is read
+        while True:
+            slots.acquire()
+            member = None if stop.is_set() else next(member_iterator, None)
+            if member is None:
+                return
+            yield member
+
+    output = open_output(output_path)
+    pool = None
+    try:
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=pipeline.init_worker,
+                                        initargs=(profile, delete_private_tags, uid_mapper, collect_stats,
+                                                  date_shifter, pseudonymizer))
+            results = pool.imap(_anonymize_member, _bounded(members), chunksize=chunk_size)
+        else:
+            pipeline.init_worker(profile, delete_private_tags, uid_mapper, collect_stats, date_shifter, pseudonymizer)
+            results = map(_anonymize_member, _bounded(members))
+        for result in results:
+            data = result.pop('data')
+            mtime = result.pop('mtime')
+            if result['error'] is None:
+                try:
+                    output.write(result['path'], data, mtime)
+                    result['written'] = REWRITTEN
+                except Exception as error:
+                    result['error'] = '{}: {}'.format(type(error).__name__, error)
+            slots.release()
+            if on_result is not None:
+                on_result(result)
+    finally:
+        # Unblock the reader if the loop has been interrupted, the pool waits for it when terminated
+        stop.set()
+        slots.release(slot_count)
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        output.close()
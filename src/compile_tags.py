@@ -0,0 +1,104 @@
+"""
+Compile the tag tables of the DICOM standard JSON files (see data/) into Python modules of integer tuples, which
+are loaded by dicomfields.py without parsing the JSON files.
+
+Usage:
+    python -m src.compile_tags            generate the modules again after a change of the JSON files
+    python -m src.compile_tags --check    check that the modules exactly match the JSON files
+"""
+import argparse
+import hashlib
+import importlib
+import os
+import sys
+
+from src.dicomfields import (DATA_FOLDER, MASKED_TABLE_NAMES, TABLE_NAMES, TAG_TABLE_VERSIONS, convert_masked_tags,
+                             convert_tags, load_json_tags, table_module_name)
+
+_SOURCE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_path(version: str) -> str:
+    return os.path.join(DATA_FOLDER, 'dicom_fields_{}.json'.format(version))
+
+
+def module_path(version: str) -> str:
+    return os.path.join(_SOURCE_FOLDER, table_module_name(version).rsplit('.', 1)[1] + '.py')
+
+
+def source_sha256(version: str) -> str:
+    with open(source_path(version), 'rb') as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+def compile_tables(version: str) -> dict:
+    """
+    Convert the tag tables of a JSON file
+    Args:
+        version: version of the JSON file, e.g. 'latest'
+    Returns:
+        dict: name of the table to tuple of (group, element), or of (group, element, group mask, element mask) for
+            the masked tables
+    """
+    tags = load_json_tags(version)
+    tables = {name: tuple(convert_tags(tags[name])) for name in TABLE_NAMES}
+    tables.update((masked_name, tuple(convert_masked_tags(tags[name])))
+                  for name, masked_name in zip(TABLE_NAMES, MASKED_TABLE_NAMES))
+    return tables
+
+
+def render_module(version: str) -> str:
+    """
+    Render the Python module of the tag tables of a JSON file
+    """
+    lines = ['"""',
+             'Tag tables of data/dicom_fields_{}.json'.format(version),
+             'Generated by python -m src.compile_tags, do not edit',
+             '"""',
+             "SOURCE = 'dicom_fields_{}.json'".format(version),
+             "SOURCE_SHA256 = '{}'".format(source_sha256(version))]
+    for name, table in compile_tables(version).items():
+        lines.append('')
+        lines.append('{} = ('.format(name))
+        lines.extend('    ({}),'.format(', '.join('0x{:04X}'.format(value) for value in tag)) for tag in table)
+        lines.append(')')
+    return '\n'.join(lines) + '\n'
+
+
+def check(version: str) -> list:
+    """
+    Compare the generated module of a version with its JSON file
+    Returns:
+        list: description of the differences, empty if the module is up to date
+    """
+    try:
+        module = importlib.import_module(table_module_name(version))
+    except ImportError:
+        return ['{}: module {} is missing'.format(version, table_module_name(version))]
+
+    problems = []
+    if module.SOURCE_SHA256 != source_sha256(version):
+        problems.append('{}: {} changed since the module was generated'.format(version, module.SOURCE))
+    for name, table in compile_tables(version).items():
+        if getattr(module, name, None) != table:
+            problems.append('{}: table {} does not match the JSON file'.format(version, name))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compile the tag tables of the JSON files')
+    parser.add_argument('--check', action='store_true', help='Only check that the modules are up to date')
+    args = parser.parse_args()
+
+    if args.check:
+        problems = [problem for version in TAG_TABLE_VERSIONS for problem in check(version)]
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print('Tag tables up to date: {}'.format(', '.join(TAG_TABLE_VERSIONS)))
+    else:
+        for version in TAG_TABLE_VERSIONS:
+            with open(module_path(version), 'w') as module_file:
+                module_file.write(render_module(version))
+            print('{} written'.format(module_path(version)))
@@ -0,0 +1,323 @@
+"""
+Compressed output of the anonymized files.
+
+Codecs:
+    deflate  Deflated Explicit VR Little Endian transfer syntax, still a DICOM file for any conformant reader. Only for
+             uncompressed pixel data, the files with encapsulated pixel data are written unchanged
+    gzip     the DICOM file wrapped in a gzip container, see compressed_path for the file name
+    zstd     the DICOM file wrapped in a Zstandard frame, requires the zstandard package
+    rle      the uncompressed pixel data encapsulated with RLE Lossless, unless it does not get smaller
+
+The files are encoded, compressed and written by the threads of an OutputWriter, so that the compression of a file
+overlaps the anonymization of the next one: zlib and zstandard release the GIL while compressing. The size and the
+CPU time of every codec are counted in a CompressionReport, to weigh the bytes saved against the CPU spent.
+"""
+import collections
+import concurrent.futures
+import gzip
+import io
+import json
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import pydicom
+from pydicom.encaps import encapsulate
+from pydicom.filebase import DicomBytesIO
+from pydicom.filewriter import write_dataset, write_file_meta_info
+from pydicom.uid import DeflatedExplicitVRLittleEndian, RLELossless
+
+DEFLATE = 'deflate'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+RLE = 'rle'
+CODECS = (DEFLATE, GZIP, ZSTD, RLE)
+
+# Suffix of the output files of the container codecs
+_SUFFIXES = {GZIP: '.gz', ZSTD: '.zst'}
+
+# Compression level used if not set, the zlib levels trade well between size and speed around 6
+_DEFAULT_LEVELS = {DEFLATE: 6, GZIP: 6, ZSTD: 3, RLE: None}
+
+_PREAMBLE = b'\0' * 128 + b'DICM'
+
+
+def check_codec(codec: str) -> None:
+    """
+    Check that a codec is known and that its dependencies are installed
+    Raises:
+        ValueError: If the codec is unknown
+        ImportError: If the codec needs a package which is not installed
+    """
+    if codec not in CODECS:
+        raise ValueError('Unknown compression codec {}, expected one of {}'.format(codec, ', '.join(CODECS)))
+    if codec == ZSTD:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ImportError('The zstd codec requires the zstandard package: pip install zstandard')
+
+
+def compressed_path(out_file: str, codec: Optional[str]) -> str:
+    """
+    Path of the output file written with a codec, e.g. with .gz appended for gzip
+    """
+    return out_file + _SUFFIXES.get(codec, '')
+
+
+def _save(dataset: pydicom.Dataset) -> bytes:
+    buffer = io.BytesIO()
+    dataset.save_as(buffer)
+    return buffer.getvalue()
+
+
+def _is_native(dataset: pydicom.Dataset) -> bool:
+    """
+    True if the pixel data of the dataset, if any, is not compressed
+    """
+    file_meta = getattr(dataset, 'file_meta', None)
+    transfer_syntax = file_meta.get('TransferSyntaxUID') if file_meta is not None else None
+    return transfer_syntax is not None and not transfer_syntax.is_compressed and not transfer_syntax.is_deflated
+
+
+def _encode_deflated(dataset: pydicom.Dataset, level: int) -> Tuple[bytes, int]:
+    """
+    Encode a dataset with uncompressed pixel data in the deflated transfer syntax, see PS3.5 A.5
+    Returns:
+        tuple: (content of the file, size of the file written in explicit VR little endian)
+    """
+    # The dataset is encoded in explicit VR little endian, then deflated
+    encoded = DicomBytesIO()
+    encoded.is_little_endian = True
+    encoded.is_implicit_VR = False
+    write_dataset(encoded, dataset)
+    raw = encoded.getvalue()
+
+    dataset.file_meta.TransferSyntaxUID = DeflatedExplicitVRLittleEndian
+    header = DicomBytesIO()
+    header.is_little_endian = True
+    header.is_implicit_VR = False
+    header.write(_PREAMBLE)
+    write_file_meta_info(header, dataset.file_meta, enforce_standard=True)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(raw) + compressor.flush()
+    # Deflated data of odd length is padded, see PS3.5 A.5
+    if len(deflated) % 2:
+        deflated += b'\0'
+    header_bytes = header.getvalue()
+    return header_bytes + deflated, len(header_bytes) + len(raw)
+
+
+def _encode_rle(dataset: pydicom.Dataset) -> Tuple[bytes, int]:
+    """
+    Encode a dataset with uncompressed pixel data with its pixel data encapsulated in RLE Lossless, the pixel data
+    is left uncompressed if RLE does not make it smaller
+    Returns:
+        tuple: (content of the file, size of the file with uncompressed pixel data)
+    """
+    from pydicom.pixels.encoders import RLELosslessEncoder
+
+    native_size = len(dataset.PixelData)
+    encapsulated = encapsulate(list(RLELosslessEncoder.iter_encode(dataset, encoding_plugin='pydicom')))
+    if len(encapsulated) >= native_size:
+        data = _save(dataset)
+        return data, len(data)
+    dataset.PixelData = encapsulated
+    element = dataset['PixelData']
+    element.VR = 'OB'
+    element.is_undefined_length = True
+    dataset.file_meta.TransferSyntaxUID = RLELossless
+    data = _save(dataset)
+    return data, len(data) - len(encapsulated) + native_size
+
+
+def encode(dataset: pydicom.Dataset, codec: str, level: int = None) -> Tuple[bytes, int, bool]:
+    """
+    Encode an anonymized dataset with a codec. The dataset may be modified, e.g. its transfer syntax
+    Args:
+        dataset: pydicom Dataset with file meta information
+        codec: one of CODECS
+        level: compression level of the codec, its default level if None
+    Returns:
+        tuple: (content of the output file, size of the file without compression, True if the codec has been
+            applied, False if the file has been written unchanged, e.g. RLE on compressed pixel data)
+    """
+    if level is None:
+        level = _DEFAULT_LEVELS[codec]
+    if codec == DEFLATE and _is_native(dataset):
+        data, size = _encode_deflated(dataset, level)
+        return data, size, True
+    if codec == RLE and _is_native(dataset) and 'PixelData' in dataset:
+        try:
+            data, size = _encode_rle(dataset)
+            return data, size, size != len(data)
+        except (ValueError, NotImplementedError):
+            # Pixel data not supported by the RLE encoder, e.g. float pixel data, written unchanged
+            pass
+    data = _save(dataset)
+    if codec == GZIP:
+        # No timestamp, the same file is always compressed to the same bytes
+        return gzip.compress(data, compresslevel=level, mtime=0), len(data), True
+    if codec == ZSTD:
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress(data), len(data), True
+    return data, len(data), False
+
+
+def write_compressed(dataset: pydicom.Dataset, out_file: str, codec: str, level: int = None) -> Tuple[int, int, bool]:
+    """
+    Encode an anonymized dataset with a codec and write it
+    Args:
+        dataset: pydicom Dataset with file meta information
+        out_file: path of the output file, see compressed_path
+        codec: one of CODECS
+        level: compression level of the codec, its default level if None
+    Returns:
+        tuple: (size of the file without compression, size written, True if the codec has been applied)
+    """
+    data, size, applied = encode(dataset, codec, level)
+    with open(out_file, 'wb') as fp:
+        fp.write(data)
+    return size, len(data), applied
+
+
+class CompressionReport:
+    """
+    Sizes and CPU time of the compressed files per codec, mergeable across processes
+    """
+
+    def __init__(self):
+        self.files = collections.Counter()
+        # Files written unchanged since the codec does not apply, e.g. deflate on compressed pixel data
+        self.unchanged_files = collections.Counter()
+        self.input_bytes = collections.Counter()
+        self.output_bytes = collections.Counter()
+        self.cpu_seconds = collections.Counter()
+
+    def add(self, codec: str, input_bytes: int, output_bytes: int, applied: bool, cpu_seconds: float) -> None:
+        self.files[codec] += 1
+        if not applied:
+            self.unchanged_files[codec] += 1
+        self.input_bytes[codec] += input_bytes
+        self.output_bytes[codec] += output_bytes
+        self.cpu_seconds[codec] += cpu_seconds
+
+    def to_dict(self) -> dict:
+        return {'files': dict(self.files), 'unchanged_files': dict(self.unchanged_files),
+                'input_bytes': dict(self.input_bytes), 'output_bytes': dict(self.output_bytes),
+                'cpu_seconds': dict(self.cpu_seconds)}
+
+    def merge(self, other: dict) -> None:
+        """
+        Add the counters of another process
+        Args:
+            other: counters of the other process, see to_dict
+        """
+        self.files.update(other['files'])
+        self.unchanged_files.update(other['unchanged_files'])
+        self.input_bytes.update(other['input_bytes'])
+        self.output_bytes.update(other['output_bytes'])
+        self.cpu_seconds.update(other['cpu_seconds'])
+
+    def pop(self) -> dict:
+        """
+        Get the counters and reset them, used by the workers to send the counters of their files
+        """
+        counters = self.to_dict()
+        self.__init__()
+        return counters
+
+    def summary(self) -> List[str]:
+        """
+        One line per codec: bytes saved and CPU time spent
+        """
+        lines = []
+        for codec in sorted(self.files):
+            input_bytes, output_bytes = self.input_bytes[codec], self.output_bytes[codec]
+            saved = input_bytes - output_bytes
+            cpu_seconds = self.cpu_seconds[codec]
+            lines.append('{}: {} files ({} unchanged), {:.1f} MB -> {:.1f} MB, {:.1f}% saved, {:.2f} CPU s, '
+                         '{:.1f} MB saved per CPU second'.format(
+                             codec, self.files[codec], self.unchanged_files[codec], input_bytes / 1e6,
+                             output_bytes / 1e6, 100 * saved / input_bytes if input_bytes else 0, cpu_seconds,
+                             saved / cpu_seconds / 1e6 if cpu_seconds else 0))
+        return lines
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+
+class OutputWriter:
+    """
+    Threads encoding, compressing and writing the anonymized datasets while the next files are anonymized
+    """
+
+    def __init__(self, codec: str, level: int = None, threads: int = 1, max_pending: int = None):
+        """
+        Args:
+            codec: one of CODECS
+            level: compression level of the codec, its default level if None
+            threads: number of writer threads
+            max_pending: maximum number of datasets handed to the writer and not written yet, submit blocks beyond.
+                Twice the number of threads if not set
+        Raises:
+            ValueError: If the codec is unknown
+            ImportError: If the codec needs a package which is not installed
+        """
+        check_codec(codec)
+        self.codec = codec
+        self.level = level
+        self.report = CompressionReport()
+        self._executor = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='dicom-writer')
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * threads)
+        self._lock = threading.Lock()
+        self._futures: Dict[str, concurrent.futures.Future] = {}
+
+    def submit(self, dataset: pydicom.Dataset, out_file: str) -> None:
+        """
+        Hand an anonymized dataset to the writer threads, the dataset must not be used by the caller anymore
+        Args:
+            dataset: pydicom Dataset with file meta information
+            out_file: path of the output file, see compressed_path
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, dataset, out_file)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures[out_file] = future
+
+    def _write(self, dataset: pydicom.Dataset, out_file: str) -> None:
+        start = time.thread_time()
+        size, written, applied = write_compressed(dataset, out_file, self.codec, self.level)
+        cpu_seconds = time.thread_time() - start
+        with self._lock:
+            self.report.add(self.codec, size, written, applied, cpu_seconds)
+
+    def wait(self) -> Dict[str, str]:
+        """
+        Wait for the files submitted so far
+        Returns:
+            dict: output file path to error message, for the files which could not be written
+        """
+        errors = {}
+        futures, self._futures = self._futures, {}
+        for out_file, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                errors[out_file] = '{}: {}'.format(type(error).__name__, error)
+        return errors
+
+    def close(self) -> Dict[str, str]:
+        """
+        Wait for the pending files and stop the threads
+        Returns:
+            dict: output file path to error message, see wait
+        """
+        errors = self.wait()
+        self._executor.shutdown()
+        return errors
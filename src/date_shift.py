@@ -0,0 +1,199 @@
+"""
+Date shifting: the dates of a patient are moved by the same number of days instead of being replaced with constants,
+which keeps the intervals between the studies of a patient for longitudinal research.
+
+The offset of a patient is derived from a keyed hash (HMAC-SHA256) of its Patient ID under the project secret, so
+that every worker and every run using the same secret shifts the dates of a patient the same way.
+
+The date elements of a dataset are collected while the rules are applied (see start_batch and current_batch) and
+shifted together at the end with NumPy, instead of parsing the values one element at a time. Only the date part of
+DT values is shifted. TM values still get the action of their rule, e.g. replaced with a constant, unless the date
+shifter keeps the times (keep_times): whole days are added, so the times of day stay consistent with the dates.
+"""
+import hashlib
+import hmac
+import threading
+from typing import List, Optional, Sequence
+
+from pydicom.multival import MultiValue
+
+from src.utils import key_id
+
+# Values of the elements which cannot be parsed as a date, as replace_element_date and replace_element_date_time
+_INVALID_VALUES = {'DA': '00010101', 'DT': '00010101010101.000000+0000'}
+
+# Padding of the partial dates of DT values (YYYY or YYYYMM), removed after the shift
+_DATE_PADDING = {4: '0101', 6: '01', 8: ''}
+
+# Date shift batch of the dataset being anonymized by the current thread
+_batches = threading.local()
+
+
+class DateShifter:
+    """
+    Derive the date offset of a patient from a keyed hash of its Patient ID under a project secret.
+    Offsets are whole days between -max_days and max_days, never 0.
+    """
+
+    def __init__(self, secret: bytes, max_days: int = 365, keep_times: bool = False):
+        """
+        Args:
+            secret: project secret, the offsets cannot be found back without it
+            max_days: maximum number of days of the offsets
+            keep_times: if True, the TM values are kept instead of being anonymized by the action of their rule
+        Raises:
+            ValueError: If the secret is empty or max_days is not positive
+        """
+        if not secret:
+            raise ValueError('The secret of the date shifter cannot be empty')
+        if max_days < 1:
+            raise ValueError('The maximum date offset must be at least one day')
+        self._secret = secret.encode('utf-8') if isinstance(secret, str) else bytes(secret)
+        self.key_id = key_id(self._secret)
+        self.max_days = max_days
+        self.keep_times = keep_times
+
+    def offset_days(self, patient_id: str) -> int:
+        """
+        Get the date offset of a patient
+        Args:
+            patient_id: original Patient ID, the patients without Patient ID share the offset of ''
+        Returns:
+            int: number of days added to the dates of the patient
+        """
+        digest = hmac.new(self._secret, patient_id.encode('utf-8', 'replace'), hashlib.sha256).digest()
+        offset = int.from_bytes(digest[:8], 'big') % (2 * self.max_days) - self.max_days
+        return offset if offset < 0 else offset + 1
+
+    def __repr__(self):
+        return 'DateShifter(max_days={}, keep_times={})'.format(self.max_days, self.keep_times)
+
+
+def shift_dates(dates: Sequence[str], days: int) -> List[Optional[str]]:
+    """
+    Shift dates in the YYYYMMDD format by a number of days, all at once
+    Args:
+        dates: dates to shift
+        days: number of days to add
+    Returns:
+        list: shifted dates, None for the values which are not valid dates or whose shifted date is out of range
+    """
+    import numpy as np
+
+    if not dates:
+        return []
+    # Other lengths and non ASCII values are left empty, hence invalid, rather than truncated
+    raw = np.array([date if len(date) == 8 and date.isascii() else '' for date in dates], dtype='S8')
+    digits = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 8).astype(np.int64) - ord('0')
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1) & (np.char.str_len(raw) == 8)
+    digits[~valid] = [1, 9, 7, 0, 0, 1, 0, 1]
+    years = digits[:, :4] @ [1000, 100, 10, 1]
+    months = digits[:, 4:6] @ [10, 1]
+    month_days = digits[:, 6:] @ [10, 1]
+    valid &= (months >= 1) & (months <= 12) & (month_days >= 1)
+    first_days = ((years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1))
+    values = first_days.astype('datetime64[D]') + (month_days - 1)
+    # Day numbers past the end of the month, e.g. 20230231, roll over to the next month
+    valid &= values.astype('datetime64[M]') == first_days
+    shifted = values + np.timedelta64(days, 'D')
+    valid &= (shifted >= np.datetime64('0001-01-01')) & (shifted <= np.datetime64('9999-12-31'))
+    # YYYY-MM-DD to YYYYMMDD
+    text = np.datetime_as_string(shifted, unit='D').astype('S10')
+    packed = np.frombuffer(text.tobytes(), dtype=np.uint8).reshape(-1, 10)[:, [0, 1, 2, 3, 5, 6, 8, 9]].tobytes()
+    return [packed[8 * index:8 * index + 8].decode('ascii') if is_valid else None
+            for index, is_valid in enumerate(valid.tolist())]
+
+
+def _date_length(value: str, vr: str) -> int:
+    """
+    Length of the date part of a DA or DT value, 0 if the value does not start with a date
+    """
+    if vr == 'DA':
+        return 8 if len(value) == 8 else 0
+    for length in (8, 6, 4):
+        # A partial date is followed by nothing or by the UTC offset
+        if len(value) < length or not value[:length].isdigit():
+            continue
+        if length == 8 or len(value) == length or value[length] in '+-':
+            return length
+    return 0
+
+
+class DateShiftBatch:
+    """
+    Date and date time elements of a dataset, shifted together by the same number of days
+    """
+
+    def __init__(self, days: int, keep_times: bool = False):
+        self.days = days
+        self.keep_times = keep_times
+        # Elements by id, an element added twice is shifted once
+        self.elements = {}
+
+    def add(self, element) -> None:
+        """
+        Add a DA or DT element, shifted by apply
+        """
+        self.elements[id(element)] = element
+
+    def apply(self) -> int:
+        """
+        Shift the values of the elements added to the batch, including multi-valued elements. The values which cannot
+        be parsed are replaced with the constants of replace_element_date and replace_element_date_time
+        Returns:
+            int: number of values shifted
+        """
+        slots = []
+        dates = []
+        for element in self.elements.values():
+            value = element.value
+            values = enumerate(value) if isinstance(value, MultiValue) else ((None, value),)
+            for index, item in values:
+                item = str(item) if item else ''
+                if not item:
+                    continue
+                length = _date_length(item, element.VR)
+                slots.append((element, index, item, length))
+                dates.append(item[:length] + _DATE_PADDING[length] if length else '')
+
+        count = 0
+        for (element, index, item, length), date in zip(slots, shift_dates(dates, self.days)):
+            if date is None:
+                new_value = _INVALID_VALUES[element.VR]
+            else:
+                new_value = date[:length] + item[length:]
+                count += 1
+            if index is None:
+                element.value = new_value
+            else:
+                element.value[index] = new_value
+        self.elements = {}
+        return count
+
+
+def start_batch(days: int, keep_times: bool = False) -> DateShiftBatch:
+    """
+    Start collecting the date elements of a dataset in the current thread
+    Args:
+        days: date offset of the patient of the dataset
+        keep_times: if True, the TM values of the dataset are kept, see replace_element_time
+    Returns:
+        DateShiftBatch: the batch of the current thread
+    """
+    batch = DateShiftBatch(days, keep_times)
+    _batches.current = batch
+    return batch
+
+
+def end_batch() -> None:
+    """
+    Stop collecting the date elements in the current thread, the batch must still be applied
+    """
+    _batches.current = None
+
+
+def current_batch() -> Optional[DateShiftBatch]:
+    """
+    Get the batch collecting the date elements in the current thread, None if the dates are not shifted
+    """
+    return getattr(_batches, 'current', None)
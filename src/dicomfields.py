@@ -1,8 +1,30 @@
-import json
+"""
+Tag tables of the DICOM standard (PS3.15 E.1-1), one table per action code.
+
+The tables are compiled from the JSON files of data/ into Python modules (see compile_tags.py) and are only loaded
+on first access, e.g. dicomfields.D_TAGS, so that importing the anonymizer does not parse the JSON files.
+"""
+import functools
+import importlib
+import os
 
 from src.format_tag import string_to_hex
 
-tags = json.load(open("./data/dicom_fields_latest.json"))
+# Folder of the JSON files, independent of the working directory
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# Versions of the JSON files, the first one is used by default
+TAG_TABLE_VERSIONS = ('latest', '2023a')
+
+TABLE_NAMES = ('D_TAGS', 'Z_TAGS', 'X_TAGS', 'U_TAGS', 'Z_D_TAGS', 'X_Z_TAGS', 'X_D_TAGS', 'X_Z_D_TAGS',
+               'X_Z_U_STAR_TAGS')
+
+# Repeating group rules of each table, e.g. X_MASKED_TAGS for X_TAGS, see convert_masked_tags
+MASKED_TABLE_NAMES = tuple(name.replace('_TAGS', '_MASKED_TAGS') for name in TABLE_NAMES)
+
+# The repeating groups (50xx, 60xx) are even groups, bit 0 of the group is always compared so that private groups
+# never match, see PS3.5 7.6
+_EVEN_GROUP_MASK = 0x0001
 
 
 def convert_tags(dtags: list) -> list:
@@ -16,27 +38,90 @@ def convert_tags(dtags: list) -> list:
     return [
         (string_to_hex(elem["tag"][0]), string_to_hex(elem["tag"][1]))
         for elem in dtags
-        if elem["tag"][0].find("xx") == -1 and elem["tag"][1].find("xx") == -1
+        if _is_plain_tag(elem["tag"][0]) and _is_plain_tag(elem["tag"][1])
     ]
 
 
-D_TAGS: list = convert_tags(tags["D_TAGS"])
-Z_TAGS: list = convert_tags(tags["Z_TAGS"])
-X_TAGS: list = convert_tags(tags["X_TAGS"])
-U_TAGS: list = convert_tags(tags["U_TAGS"])
-Z_D_TAGS: list = convert_tags(tags["Z_D_TAGS"])
-X_Z_TAGS: list = convert_tags(tags["X_Z_TAGS"])
-X_D_TAGS: list = convert_tags(tags["X_D_TAGS"])
-X_Z_D_TAGS: list = convert_tags(tags["X_Z_D_TAGS"])
-X_Z_U_STAR_TAGS: list = convert_tags(tags["X_Z_U_STAR_TAGS"])
-
-ALL_TAGS = []
-ALL_TAGS.extend(D_TAGS)
-ALL_TAGS.extend(Z_TAGS)
-ALL_TAGS.extend(X_TAGS)
-ALL_TAGS.extend(U_TAGS)
-ALL_TAGS.extend(Z_D_TAGS)
-ALL_TAGS.extend(X_Z_TAGS)
-ALL_TAGS.extend(X_D_TAGS)
-ALL_TAGS.extend(X_Z_D_TAGS)
-ALL_TAGS.extend(X_Z_U_STAR_TAGS)
+def _is_plain_tag(s: str) -> bool:
+    """
+    Check if a group or element of the json file is a plain hex number, and not a repeating group such as 0x60xx or
+    a description such as the private attributes row (0xgggg, 0xeeee where gggg is odd) of the 2023a file
+    """
+    return s.startswith("0x") and len(s) == 6 and all(c in "0123456789abcdefABCDEF" for c in s[2:])
+
+
+def convert_masked_tags(dtags: list) -> list:
+    """Converts the repeating group tags (e.g. 0x60xx, 0x3000) from the json file to a list of masked tags
+    Args:
+        dtags (list): list of tags from the json file
+    Returns:
+        list: list of tuples (group, element, group mask, element mask), a tag matches if its group and element
+            masked with the masks are equal to group and element
+    """
+    masked_tags = []
+    for elem in dtags:
+        group, element = elem["tag"]
+        if (_is_plain_tag(group) and _is_plain_tag(element)) or not (_is_masked_tag(group) and _is_masked_tag(element)):
+            continue
+        group_value, group_mask = _mask_of(group)
+        element_value, element_mask = _mask_of(element)
+        if group_mask != 0xFFFF:
+            group_mask |= _EVEN_GROUP_MASK
+        masked_tags.append((group_value, element_value, group_mask, element_mask))
+    return masked_tags
+
+
+def _is_masked_tag(s: str) -> bool:
+    return s.startswith("0x") and len(s) == 6 and all(c in "0123456789abcdefABCDEFx" for c in s[2:])
+
+
+def _mask_of(s: str) -> tuple:
+    """
+    Convert a group or element with x digits, e.g. 0x60xx, to its value 0x6000 and its mask 0xFF00
+    """
+    digits = s[2:]
+    return (string_to_hex(digits.replace("x", "0")),
+            string_to_hex("".join("0" if c == "x" else "F" for c in digits)))
+
+
+def table_module_name(version: str) -> str:
+    return 'src._dicomfields_{}'.format(version)
+
+
+@functools.lru_cache(maxsize=None)
+def get_tag_tables(version: str = TAG_TABLE_VERSIONS[0]):
+    """
+    Load the compiled tag tables of a version of the JSON files, once
+    Args:
+        version: one of TAG_TABLE_VERSIONS
+    Returns:
+        module: the tables as attributes, e.g. D_TAGS
+    Raises:
+        ValueError: If the version is unknown
+    """
+    if version not in TAG_TABLE_VERSIONS:
+        raise ValueError('Unknown tag table version {}'.format(version))
+    return importlib.import_module(table_module_name(version))
+
+
+@functools.lru_cache(maxsize=None)
+def load_json_tags(version: str = TAG_TABLE_VERSIONS[0]) -> dict:
+    """
+    Parse a JSON file of data/, only needed to compile the tables
+    """
+    import json
+
+    with open(os.path.join(DATA_FOLDER, 'dicom_fields_{}.json'.format(version)), 'r') as json_file:
+        return json.load(json_file)
+
+
+def __getattr__(name: str):
+    # Lazy module attributes (PEP 562)
+    if name in TABLE_NAMES or name in MASKED_TABLE_NAMES:
+        return list(getattr(get_tag_tables(), name))
+    if name == 'ALL_TAGS':
+        tables = get_tag_tables()
+        return [tag for table_name in TABLE_NAMES for tag in getattr(tables, table_name)]
+    if name == 'tags':
+        return load_json_tags()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,149 @@
+"""
+Job manifest of a batch run, used to resume an interrupted run without processing again the files already done.
+The manifest is an append-only JSON lines file, one record per processed file, the last record of a file wins.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+DONE = 'done'
+FAILED = 'failed'
+
+# Written status of the files whose content did not change since the previous run
+SKIPPED = 'skipped'
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the content hash of a file
+    Args:
+        path: path to the file
+        chunk_size: size of the chunks read
+    Returns:
+        str: hexadecimal BLAKE2b digest of the file
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """
+    Compute the content hash of a file read in memory, identical to hash_file
+    """
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class Manifest:
+    """
+    Records of the files processed by a batch run: input path, size, modification time, content hash (optional),
+    fingerprint of the anonymization settings and output status.
+    New records are buffered and written to the file at most every checkpoint_interval seconds, so that a killed run
+    loses at most the last seconds of records.
+    """
+
+    def __init__(self, path: str, checkpoint_interval: float = 2.0):
+        """
+        Args:
+            path: path to the manifest file, the records of the previous runs are loaded if it exists
+            checkpoint_interval: maximum time in seconds between two writes of the new records
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.records = {}
+        self._pending = []
+        self._last_checkpoint = time.monotonic()
+
+        line = ''
+        if os.path.exists(path):
+            with open(path, 'r') as manifest_file:
+                for line in manifest_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Last line partially written by a killed run
+                        continue
+                    self.records[record['path']] = record
+        self._file = open(path, 'a')
+        # line is the last line of the previous runs, if any
+        if line and not line.endswith('\n'):
+            # Terminate the last line partially written by a killed run
+            self._file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_done(self, path: str, fingerprint: str) -> Optional[dict]:
+        """
+        Get the record of a file successfully processed with the same anonymization settings
+        Args:
+            path: input file path
+            fingerprint: fingerprint of the anonymization settings
+        Returns:
+            dict: the record, or None if the file must be processed
+        """
+        record = self.records.get(path)
+        if record is None or record['status'] != DONE or record['fingerprint'] != fingerprint:
+            return None
+        return record
+
+    def is_done(self, path: str, size: int, mtime_ns: int, fingerprint: str) -> bool:
+        """
+        Check if a file has already been processed with the same anonymization settings and has not changed since
+        Args:
+            path: input file path
+            size: size of the input file
+            mtime_ns: modification time of the input file in nanoseconds
+            fingerprint: fingerprint of the anonymization settings
+        Returns:
+            bool: True if the file can be skipped
+        """
+        record = self.get_done(path, fingerprint)
+        return record is not None and record['size'] == size and record['mtime_ns'] == mtime_ns
+
+    def record(self, path: str, size: int, mtime_ns: int, fingerprint: str, status: str,
+               content_hash: str = None, error: str = None) -> None:
+        """
+        Add the record of a processed file, written at the next checkpoint
+        Args:
+            path: input file path
+            size: size of the input file
+            mtime_ns: modification time of the input file in nanoseconds
+            fingerprint: fingerprint of the anonymization settings
+            status: DONE or FAILED
+            content_hash: content hash of the input file, see hash_file
+            error: error message if the file failed
+        Returns:
+            None
+        """
+        record = {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'hash': content_hash,
+                  'fingerprint': fingerprint, 'status': status}
+        if error is not None:
+            record['error'] = error
+        self.records[path] = record
+        self._pending.append(json.dumps(record))
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """
+        Write the new records to the manifest file and sync it to the disk
+        """
+        if self._pending:
+            self._file.write('\n'.join(self._pending) + '\n')
+            self._pending = []
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_checkpoint = time.monotonic()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.checkpoint()
+            self._file.close()
@@ -0,0 +1,208 @@
+"""
+Read DICOM files through a memory map instead of Python file reads. The large binary values, e.g. the pixel data or
+private OB/OW/UN blobs, are kept as memoryview slices of the mapped file: they are not copied into Python bytes when
+the file is read, and the slices the anonymization did not replace are written to the output file straight from the
+map, see write_mapped.
+
+The mapped file must not be truncated while its dataset is in use, reading a page past the end of the file raises a
+SIGBUS. Used by anonymize_dicom_file with memory_map.
+"""
+import contextlib
+import io
+import mmap
+import os
+import threading
+from typing import Optional
+
+import pydicom
+from pydicom.datadict import dictionary_VR
+from pydicom.dataelem import RawDataElement
+from pydicom.sequence import Sequence
+
+# Values from this size on are read as memoryview slices of the mapped file, smaller values are copied
+VIEW_MIN_SIZE = 64 * 1024
+
+# Size of the chunks of the buffered values written by pydicom, its default of 8 KiB costs a write call per chunk
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+# VRs whose values are raw bytes for pydicom, the other values are decoded and must be bytes
+_BINARY_VRS = frozenset(('OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'UN'))
+
+# VRs whose values can be buffered, see _buffer_views. UN values are written through an intermediate buffer
+_BUFFERED_VRS = frozenset(('OB', 'OD', 'OF', 'OL', 'OV', 'OW'))
+
+# Number of write_mapped calls in progress and chunk size set before the first one, see _write_chunks
+_write_lock = threading.Lock()
+_writers = 0
+_saved_read_size = None
+
+
+class MappedFile:
+    """
+    Read-only file-like object over a memory map, for pydicom.dcmread
+    """
+
+    def __init__(self, mapped: mmap.mmap, name: str = None):
+        self._mapped = mapped
+        self._view = memoryview(mapped)
+        self._size = len(mapped)
+        self._position = 0
+        self.name = name
+
+    def read(self, size: Optional[int] = -1):
+        start = self._position
+        end = self._size if size is None or size < 0 else min(start + size, self._size)
+        self._position = end
+        if end - start >= VIEW_MIN_SIZE:
+            return self._view[start:end]
+        return self._mapped[start:end]
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _value_vr(element) -> str:
+    if element.VR is not None:
+        return element.VR
+    # Implicit VR: the VR of the dictionary, e.g. 'OB or OW' for the pixel data
+    try:
+        return dictionary_VR(element.tag)
+    except KeyError:
+        return 'UN'
+
+
+def _copy_decoded_values(dataset: pydicom.Dataset) -> None:
+    """
+    Copy into bytes the large values which pydicom decodes, e.g. a long UT text, including nested sequences. The
+    values of the binary VRs are left as memoryview slices
+    """
+    for tag in dataset.keys():
+        element = dataset.get_item(tag)
+        value = element.value
+        if isinstance(value, memoryview):
+            if not all(vr in _BINARY_VRS for vr in _value_vr(element).split(' or ')):
+                if isinstance(element, RawDataElement):
+                    dataset[tag] = element._replace(value=bytes(value))
+                else:
+                    element.value = bytes(value)
+        elif isinstance(value, Sequence):
+            for item in value:
+                _copy_decoded_values(item)
+
+
+def read_mapped(path: str) -> pydicom.Dataset:
+    """
+    Read a DICOM file through a memory map. The map is released once the dataset and its memoryview values are freed
+    Args:
+        path: path of the DICOM file
+    Returns:
+        pydicom Dataset whose large binary values are memoryview slices of the mapped file
+    """
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            # An empty file cannot be mapped, let pydicom report it
+            return pydicom.dcmread(fp)
+        # The map keeps its own handle of the file
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    dataset = pydicom.dcmread(MappedFile(mapped, path))
+    _copy_decoded_values(dataset)
+    return dataset
+
+
+class _ViewBuffer(io.BufferedIOBase):
+    """
+    Buffered value of pydicom over a memoryview: pydicom writes a buffered value by chunks read from the buffer
+    after the header of its element, instead of encoding it in an intermediate buffer. The chunks are slices of the
+    view, written without being copied
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1):
+        start = self._position
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._position = end
+        # Small reads are bytes, e.g. pydicom checks the first item tag of encapsulated pixel data with startswith
+        return self._view[start:end] if end - start >= VIEW_MIN_SIZE else self._view[start:end].tobytes()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _buffer_views(dataset: pydicom.Dataset) -> None:
+    """
+    Turn the memoryview values left by the anonymization into buffered values, including nested sequences. The
+    values are not bytes anymore for pydicom afterwards, e.g. for the pixel data handlers
+    """
+    for tag in dataset.keys():
+        element = dataset.get_item(tag)
+        value = element.value
+        if isinstance(value, memoryview):
+            if isinstance(element, RawDataElement):
+                element = dataset[tag]
+            if element.VR in _BUFFERED_VRS:
+                element.value = _ViewBuffer(value)
+        elif isinstance(value, Sequence):
+            for item in value:
+                _buffer_views(item)
+
+
+@contextlib.contextmanager
+def _write_chunks():
+    """
+    Raise the size of the chunks of the buffered values written by pydicom while a write is in progress. The setting
+    is global: it is raised by the first of the concurrent writes and restored by the last one, under a lock, so
+    that a write never restores it while another one is in progress. Only the size of the write calls changes
+    """
+    global _writers, _saved_read_size
+    settings = pydicom.config.settings
+    with _write_lock:
+        if _writers == 0:
+            _saved_read_size = settings.buffered_read_size
+            settings.buffered_read_size = max(_saved_read_size, WRITE_CHUNK_SIZE)
+        _writers += 1
+    try:
+        yield
+    finally:
+        with _write_lock:
+            _writers -= 1
+            if _writers == 0:
+                settings.buffered_read_size = _saved_read_size
+
+
+def write_mapped(dataset: pydicom.Dataset, path: str) -> None:
+    """
+    Write an anonymized dataset read by read_mapped, its memoryview values are written from the mapped file by large
+    chunks. The dataset must not be used afterwards
+    Args:
+        dataset: dataset read by read_mapped
+        path: path of the output file, not the mapped input file: truncating it would break the map
+    """
+    _buffer_views(dataset)
+    with _write_chunks():
+        dataset.save_as(path)
@@ -0,0 +1,162 @@
+"""
+Patch the anonymized values directly in a copy of the input file, when the anonymization only changed values
+without changing their encoded length. Used by anonymize_dicom_file with patch_in_place.
+"""
+import os
+import shutil
+import struct
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import pydicom
+from pydicom.dataelem import RawDataElement
+from pydicom.filebase import DicomBytesIO
+from pydicom.filewriter import write_data_element
+
+# Explicit VRs with a 4 bytes length, see PS3.5 7.1.2
+_LONG_LENGTH_VRS = ('OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'SQ', 'SV', 'UC', 'UN', 'UR', 'UT', 'UV')
+
+# VRs whose trailing spaces are not significant, a shorter value can be padded with spaces, see PS3.5 6.2
+_SPACE_PADDED_VRS = ('AE', 'CS', 'DA', 'DS', 'DT', 'IS', 'LO', 'LT', 'PN', 'SH', 'ST', 'TM', 'UC', 'UT')
+
+# (offset of the value in the file, original encoded value)
+Snapshot = Dict[int, Tuple[Optional[int], Optional[bytes]]]
+
+
+def _header_length(vr: str, encoding: tuple) -> int:
+    """
+    Length of the tag, VR and length fields of an element, see PS3.5 7.1
+    """
+    is_implicit_VR, _ = encoding
+    return 12 if not is_implicit_VR and vr in _LONG_LENGTH_VRS else 8
+
+
+def _value_offset(fp: BinaryIO, element, encoding: tuple) -> Optional[int]:
+    """
+    Find the offset of the value of an element converted while reading from the position recorded by pydicom in
+    file_tell, which is the position of the value or of the tag of the element depending on how it has been read:
+    the tag of the element is checked in the file before its value and at the position itself
+    Returns:
+        int: offset of the value, None if the tag of the element is not found at either position
+    """
+    if element.file_tell is None or element.VR is None:
+        return None
+    _, is_little_endian = encoding
+    tag = struct.pack('<HH' if is_little_endian else '>HH', element.tag.group, element.tag.element)
+    header_length = _header_length(element.VR, encoding)
+    for value_offset in (element.file_tell, element.file_tell + header_length):
+        if value_offset - header_length < 0:
+            continue
+        fp.seek(value_offset - header_length)
+        if fp.read(4) == tag:
+            return value_offset
+    return None
+
+
+def snapshot(dataset: pydicom.Dataset, encoding: tuple, character_set, fp: BinaryIO) -> Snapshot:
+    """
+    Record the position and the encoded value of the top level elements of a dataset read from a file, before it
+    is anonymized
+    Args:
+        dataset: dataset read from a file
+        encoding: (is_implicit_VR, is_little_endian) of the dataset
+        character_set: character set of the dataset
+        fp: file the dataset has been read from, opened in binary mode, to locate the values of the elements
+            converted while reading. Its position is not restored
+    Returns:
+        dict: tag to (offset of the value, encoded value), None if unknown
+    """
+    elements = {}
+    for tag in dataset.keys():
+        element = dataset.get_item(tag)
+        if isinstance(element, RawDataElement):
+            value = element.value if element.length != 0xFFFFFFFF else None
+            elements[tag] = (element.value_tell, value)
+        else:
+            # Already converted while reading, e.g. sequences of undefined length or the file meta information
+            elements[tag] = (_value_offset(fp, element, encoding), encode_value(element, encoding, character_set))
+    return elements
+
+
+def encode_value(element, encoding: tuple, character_set) -> Optional[bytes]:
+    """
+    Encode the value of an element as it would be written in a file, including the sequence delimiter if the
+    element has an undefined length
+    Args:
+        element: pydicom DataElement
+        encoding: (is_implicit_VR, is_little_endian)
+        character_set: character set of the dataset
+    Returns:
+        bytes: the encoded value, or None if the VR is ambiguous
+    """
+    is_implicit_VR, is_little_endian = encoding
+    if element.VR is None or len(element.VR) != 2:
+        return None
+    buffer = DicomBytesIO()
+    buffer.is_implicit_VR = is_implicit_VR
+    buffer.is_little_endian = is_little_endian
+    write_data_element(buffer, element, character_set)
+    if is_implicit_VR or element.VR not in _LONG_LENGTH_VRS:
+        return buffer.getvalue()[8:]
+    return buffer.getvalue()[12:]
+
+
+def plan_patches(original: Snapshot, dataset: pydicom.Dataset, encoding: tuple,
+                 character_set) -> Optional[List[Tuple[int, bytes, bytes]]]:
+    """
+    Compare the anonymized dataset with its snapshot and list the values to overwrite in the file
+    Args:
+        original: snapshot of the dataset before anonymization
+        dataset: anonymized dataset
+        encoding: (is_implicit_VR, is_little_endian) of the dataset
+        character_set: character set of the dataset
+    Returns:
+        list: (offset, original encoded value, new encoded value) to write, or None if the file must be rewritten
+            because elements have been added or deleted or because a value changed its length
+    """
+    if len(original) != len(dataset) or any(tag not in original for tag in dataset.keys()):
+        return None
+
+    patches = []
+    for tag, (offset, value) in original.items():
+        element = dataset.get_item(tag)
+        if isinstance(element, RawDataElement):
+            # Never accessed, hence unchanged
+            continue
+        new_value = encode_value(element, encoding, character_set)
+        if new_value is not None and new_value == value:
+            continue
+        if new_value is None or value is None or offset is None:
+            return None
+        if len(new_value) < len(value) and element.VR in _SPACE_PADDED_VRS:
+            new_value += b' ' * (len(value) - len(new_value))
+        if len(new_value) != len(value):
+            return None
+        patches.append((offset, value, new_value))
+    return patches
+
+
+def apply_patches(in_file: str, out_file: str, patches: List[Tuple[int, bytes, bytes]]) -> bool:
+    """
+    Check that the original values are at the expected positions in the input file, then copy it if needed and
+    overwrite the patched values
+    Args:
+        in_file: input DICOM file
+        out_file: output DICOM file, the input file is patched directly if it is the same file
+        patches: (offset, original encoded value, new encoded value), see plan_patches
+    Returns:
+        bool: False if the input file does not match the patches, nothing has been written then
+    """
+    patches = sorted(patches)
+    with open(in_file, 'rb') as in_fp:
+        for offset, value, _ in patches:
+            in_fp.seek(offset)
+            if in_fp.read(len(value)) != value:
+                return False
+
+    if not os.path.exists(out_file) or not os.path.samefile(in_file, out_file):
+        shutil.copyfile(in_file, out_file)
+    with open(out_file, 'r+b') as out_fp:
+        for offset, _, new_value in patches:
+            out_fp.seek(offset)
+            out_fp.write(new_value)
+    return True
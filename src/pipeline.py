@@ -0,0 +1,217 @@
+"""
+Asynchronous anonymization pipeline overlapping the reads, the anonymization and the writes of the files, for
+file systems with a high latency such as NFS or SMB mounts.
+
+The files are read in memory by a bounded number of concurrent readers, anonymized in an executor and written by a
+bounded number of concurrent writers. The queues between the stages are bounded, so that the number of buffers in
+memory stays limited whatever the speed of each stage.
+"""
+import asyncio
+import concurrent.futures
+import os
+from typing import Callable, Iterable, Optional
+
+from src.actions import set_date_shifter, set_pseudonymizer, set_uid_mapper
+from src.anonymizer import REWRITTEN, anonymize_bytes
+from src.manifest import SKIPPED, hash_bytes
+from src.profile import AnonymizationProfile
+from src.stats import enable_stats, get_stats
+
+# Anonymization settings of the executor process, set once by init_worker
+_profile: AnonymizationProfile = None
+_delete_private_tags = True
+
+
+def init_worker(profile: AnonymizationProfile, delete_private_tags: bool, uid_mapper=None,
+                collect_stats: bool = False, date_shifter=None, pseudonymizer=None) -> None:
+    """
+    Store the compiled anonymization rules, the UID mapper, the date shifter and the pseudonymizer in the executor
+    process, and enable its statistics if requested
+    """
+    global _profile, _delete_private_tags
+    _profile = profile
+    _delete_private_tags = delete_private_tags
+    if uid_mapper is not None:
+        set_uid_mapper(uid_mapper)
+    if date_shifter is not None:
+        set_date_shifter(date_shifter)
+    if pseudonymizer is not None:
+        set_pseudonymizer(pseudonymizer)
+    if collect_stats:
+        enable_stats()
+
+
+def anonymize_buffer(data: bytes) -> bytes:
+    """
+    Anonymize a DICOM file read in memory
+    Args:
+        data: content of the DICOM file
+    Returns:
+        bytes: content of the anonymized DICOM file
+    """
+    return anonymize_bytes(data, delete_private_tags=_delete_private_tags, profile=_profile)
+
+
+def _anonymize_task(data: bytes) -> tuple:
+    """
+    Anonymize a DICOM file read in memory and get the statistics of the executor since the previous file
+    Returns:
+        tuple: (content of the anonymized DICOM file, statistics or None if disabled)
+    """
+    data = anonymize_buffer(data)
+    stats = get_stats()
+    return data, stats.pop() if stats is not None else None
+
+
+def read_file(path: str) -> bytes:
+    """
+    Read a whole file, default reader of run_pipeline
+    """
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def write_file(path: str, data: bytes) -> None:
+    """
+    Write a whole file and create its folder if needed, default writer of run_pipeline
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+async def run_pipeline(tasks: Iterable[tuple],
+                       profile: AnonymizationProfile,
+                       delete_private_tags: bool = True,
+                       uid_mapper=None,
+                       on_result: Callable[[dict], None] = None,
+                       workers: int = 1,
+                       io_concurrency: int = 8,
+                       queue_size: int = 16,
+                       hash_inputs: bool = False,
+                       collect_stats: bool = False,
+                       read: Callable[[str], bytes] = read_file,
+                       write: Callable[[str, bytes], None] = write_file,
+                       executor: Optional[concurrent.futures.Executor] = None,
+                       date_shifter=None,
+                       pseudonymizer=None) -> None:
+    """
+    Anonymize files with overlapping reads, anonymization and writes
+    Args:
+        tasks: (input file path, output file path, content hash of the input file when it was last anonymized)
+        profile: compiled anonymization profile
+        delete_private_tags: if True, private tags will be deleted
+        uid_mapper: UID mapper used by the executor, see src.uid
+        on_result: called with the result of each file: path, size, mtime_ns and hash (if computed) of the input
+            file, error message or None and how the output file has been written, in completion order
+        workers: number of processes anonymizing the files, the anonymization runs in a thread if 1
+        io_concurrency: maximum number of concurrent reads and of concurrent writes
+        queue_size: maximum number of files read and waiting for the anonymization, and of files anonymized and
+            waiting to be written
+        hash_inputs: if True, the content hash of the input files is computed and the files whose hash did not
+            change are skipped
+        collect_stats: if True, the results have the statistics of their file, see src.stats
+        read: blocking function reading a file, run in a thread
+        write: blocking function writing a file, run in a thread
+        executor: executor running the anonymization, with workers workers. It must have been initialized with
+            init_worker if it is a process pool
+        date_shifter: if set, the dates are shifted with the offset of their patient, see src.date_shift
+        pseudonymizer: if set, the values of the pseudonymize rules are replaced with their pseudonym, see
+            src.pseudonym
+    Returns:
+        None
+    """
+    loop = asyncio.get_running_loop()
+    read_queue = asyncio.Queue(queue_size)
+    write_queue = asyncio.Queue(queue_size)
+    io_executor = concurrent.futures.ThreadPoolExecutor(2 * io_concurrency)
+    # The tasks are produced by a single thread, off the event loop: their iterator may list folders, sniff files or
+    # check the manifest, and a generator cannot run in several threads at once
+    task_executor = concurrent.futures.ThreadPoolExecutor(1)
+    own_executor = executor is None
+    if own_executor:
+        if workers > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=init_worker, initargs=(profile, delete_private_tags, uid_mapper, collect_stats,
+                                                                        date_shifter, pseudonymizer))
+        else:
+            init_worker(profile, delete_private_tags, uid_mapper, collect_stats, date_shifter, pseudonymizer)
+            executor = concurrent.futures.ThreadPoolExecutor(1)
+    task_iterator = iter(tasks)
+
+    def _done(result):
+        if on_result is not None:
+            on_result(result)
+
+    async def _reader():
+        while True:
+            task = await loop.run_in_executor(task_executor, next, task_iterator, None)
+            if task is None:
+                return
+            input_file_path, output_file_path, previous_hash = task
+            result = {'path': input_file_path, 'size': 0, 'mtime_ns': None, 'hash': None, 'error': None,
+                      'written': None}
+            try:
+                stat = await loop.run_in_executor(io_executor, os.stat, input_file_path)
+                result['size'], result['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                data = await loop.run_in_executor(io_executor, read, input_file_path)
+            except Exception as error:
+                result['error'] = '{}: {}'.format(type(error).__name__, error)
+                _done(result)
+                continue
+            if hash_inputs:
+                result['hash'] = await loop.run_in_executor(io_executor, hash_bytes, data)
+                if result['hash'] == previous_hash:
+                    result['written'] = SKIPPED
+                    _done(result)
+                    continue
+            await read_queue.put((result, output_file_path, data))
+
+    async def _anonymizer():
+        while True:
+            item = await read_queue.get()
+            if item is None:
+                return
+            result, output_file_path, data = item
+            try:
+                data, stats = await loop.run_in_executor(executor, _anonymize_task, data)
+            except Exception as error:
+                result['error'] = '{}: {}'.format(type(error).__name__, error)
+                _done(result)
+                continue
+            if stats is not None:
+                result['stats'] = stats
+            await write_queue.put((result, output_file_path, data))
+
+    async def _writer():
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            result, output_file_path, data = item
+            try:
+                await loop.run_in_executor(io_executor, write, output_file_path, data)
+                result['written'] = REWRITTEN
+            except Exception as error:
+                result['error'] = '{}: {}'.format(type(error).__name__, error)
+            _done(result)
+
+    try:
+        readers = [asyncio.create_task(_reader()) for _ in range(io_concurrency)]
+        anonymizers = [asyncio.create_task(_anonymizer()) for _ in range(max(1, workers))]
+        writers = [asyncio.create_task(_writer()) for _ in range(io_concurrency)]
+
+        await asyncio.gather(*readers)
+        for _ in anonymizers:
+            await read_queue.put(None)
+        await asyncio.gather(*anonymizers)
+        for _ in writers:
+            await write_queue.put(None)
+        await asyncio.gather(*writers)
+    finally:
+        io_executor.shutdown(wait=False, cancel_futures=True)
+        task_executor.shutdown(wait=False, cancel_futures=True)
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,77 @@
+"""
+Private tags of a dataset: index of the private creators and deletion of the private elements which are not kept by
+the rules.
+
+A private element (gggg,xxee) of an odd group belongs to the block xx reserved by the private creator element
+(gggg,00xx), see PS3.5 7.8.1. Rules can designate a private element by its absolute tag or, as in the safe private
+attributes of PS3.15 E.3.10, by the name of its private creator and its offset ee in the block, which does not
+depend on the block reserved by the file.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+import pydicom
+from pydicom.tag import BaseTag
+
+from src.utils import is_sequence
+
+# (group, block) to private creator name
+CreatorIndex = Dict[Tuple[int, int], str]
+
+
+def is_private_creator(tag: BaseTag) -> bool:
+    return tag.group & 1 == 1 and 0x0010 <= tag.element <= 0x00FF
+
+
+def index_private_creators(dataset: pydicom.Dataset) -> CreatorIndex:
+    """
+    Index the private creators of the dataset in one pass, nested sequences excluded
+    Args:
+        dataset: pydicom Dataset
+    Returns:
+        dict: (group, block) to private creator name, e.g. (0x0029, 0x10) to 'SIEMENS CSA HEADER'
+    """
+    creators = {}
+    for tag in dataset.keys():
+        if is_private_creator(tag):
+            creators[(tag.group, tag.element)] = dataset[tag].value
+    return creators
+
+
+def private_creator_of(creators: CreatorIndex, tag: BaseTag) -> Optional[str]:
+    """
+    Get the private creator of a private element
+    Args:
+        creators: index of the private creators of the dataset of the element, see index_private_creators
+        tag: tag of the private element
+    Returns:
+        str: name of the private creator, None if the element has no private creator
+    """
+    return creators.get((tag.group, tag.element >> 8))
+
+
+def delete_private_tags(dataset: pydicom.Dataset, kept: Dict[int, Iterable[BaseTag]] = None) -> int:
+    """
+    Delete the private elements of the dataset and of its nested sequences, except the kept ones which are left in
+    place with the private creators of their block
+    Args:
+        dataset: pydicom Dataset
+        kept: id of a dataset or a sequence item to the private tags kept in it
+    Returns:
+        int: number of deleted elements
+    """
+    kept_tags = set(kept.get(id(dataset), ())) if kept else set()
+    used_blocks = {(tag.group, tag.element >> 8) for tag in kept_tags if tag.element > 0x00FF}
+
+    deleted = []
+    nested_count = 0
+    for tag in dataset.keys():
+        is_kept = tag in kept_tags or is_private_creator(tag) and (tag.group, tag.element) in used_blocks
+        if tag.group & 1 and not is_kept:
+            deleted.append(tag)
+        elif is_sequence(dataset, tag):
+            # Sequences of even groups and kept private sequences, whose items are filtered as well
+            for sub_dataset in dataset[tag].value:
+                nested_count += delete_private_tags(sub_dataset, kept)
+    for tag in deleted:
+        del dataset[tag]
+    return len(deleted) + nested_count
@@ -0,0 +1,150 @@
+"""
+Compiled anonymization profile.
+
+A profile is built once from the DICOM standard tables (see dicomfields.py) and the user rules, and can then be
+shared across files, threads and processes instead of rebuilding the rule table for every dataset.
+"""
+import hashlib
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, Optional, Tuple
+
+from src.actions import initialize_actions
+
+
+class AnonymizationProfile:
+    """
+    Immutable set of resolved anonymization rules.
+    Attributes:
+        actions: read-only mapping of individual tags (group, element) to their action
+        masked_actions: tuple of ((group, element, group_mask, element_mask), action) for repeating groups
+        private_tags: individual private tags (odd group) of the rules, which are kept when private tags are deleted
+        private_actions: read-only mapping of (private creator, offset in the block) to the action of the private
+            elements, whatever the block reserved by their creator. The matched elements are kept as well
+        tag_index: read-only mapping of the 32 bits tag value (group << 16 | element) to the action
+        masked_index: tuple of (mask, {masked tag value: action}), one entry per distinct 32 bits mask of the
+            repeating group rules, in rule order
+        masked_groups: set of the groups which can match a repeating group rule, None if any group can match. Most
+            tags are not in a repeating group and skip the masked lookups
+        fingerprint: hash of the rules, identical for profiles with the same rules in any process
+    """
+    __slots__ = ("actions", "masked_actions", "private_tags", "private_actions", "tag_index", "masked_index",
+                 "masked_groups", "fingerprint")
+
+    def __init__(self, actions: Dict[tuple, Callable], masked_actions: tuple = (), private_tags: tuple = (),
+                 private_actions: Dict[Tuple[str, int], Callable] = None):
+        object.__setattr__(self, "actions", MappingProxyType(dict(actions)))
+        object.__setattr__(self, "masked_actions", tuple(masked_actions))
+        object.__setattr__(self, "private_tags", tuple(private_tags))
+        object.__setattr__(self, "private_actions", MappingProxyType(dict(private_actions or {})))
+
+        # pydicom tags are int subclasses, so the dataset tags can be looked up directly in the index
+        tag_index = {tag[0] << 16 | tag[1]: action for tag, action in self.actions.items()}
+        masked_index: Dict[int, dict] = {}
+        for tag, action in self.masked_actions:
+            mask = tag[2] << 16 | tag[3]
+            masked_index.setdefault(mask, {})[(tag[0] << 16 | tag[1]) & mask] = action
+        object.__setattr__(self, "tag_index", MappingProxyType(tag_index))
+        object.__setattr__(self, "masked_index", tuple(masked_index.items()))
+        object.__setattr__(self, "masked_groups", _masked_groups(self.masked_actions))
+
+        digest = hashlib.sha256()
+        for tag, action in sorted(self.actions.items()) + sorted(self.masked_actions) + \
+                sorted(self.private_actions.items()):
+            digest.update('{} {}.{}\n'.format(tag, getattr(action, '__module__', ''),
+                                              getattr(action, '__qualname__', repr(action))).encode())
+        object.__setattr__(self, "fingerprint", digest.hexdigest())
+
+    def get_action(self, tag: int) -> Optional[Callable]:
+        """
+        Resolve the action of a tag, individual tags first then repeating groups
+        Args:
+            tag: 32 bits tag value, e.g. a pydicom.tag.BaseTag
+        Returns:
+            The action to apply or None if no rule matches the tag
+        """
+        action = self.tag_index.get(tag)
+        if action is None and self.masked_index and (self.masked_groups is None or tag >> 16 in self.masked_groups):
+            for mask, masked_actions in self.masked_index:
+                action = masked_actions.get(tag & mask)
+                if action is not None:
+                    break
+        return action
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AnonymizationProfile is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("AnonymizationProfile is immutable")
+
+    def __reduce__(self):
+        # MappingProxyType cannot be pickled, rebuild the profile from a plain dict in the other process
+        return self.__class__, (dict(self.actions), self.masked_actions, self.private_tags, dict(self.private_actions))
+
+    def __repr__(self):
+        return "AnonymizationProfile({} tags, {} masked rules, {} private tags, {} private creator rules)".format(
+            len(self.actions), len(self.masked_actions), len(self.private_tags), len(self.private_actions))
+
+
+def _masked_groups(masked_actions: tuple) -> Optional[frozenset]:
+    """
+    List the groups which can match the repeating group rules, e.g. the 128 even groups 0x6000 to 0x60FE for 60xx
+    Returns:
+        frozenset: the groups, or None if a rule has too many wildcard bits in its group to list them
+    """
+    groups = set()
+    for (group, _, group_mask, _), _ in masked_actions:
+        free_bits = ~group_mask & 0xFFFF
+        if bin(free_bits).count('1') > 12:
+            return None
+        # Enumerate the subsets of the free bits
+        subset = free_bits
+        while True:
+            groups.add(group & group_mask | subset)
+            if subset == 0:
+                break
+            subset = (subset - 1) & free_bits
+    return frozenset(groups)
+
+
+def compile_profile(extra_anonymization_rules: dict = None) -> AnonymizationProfile:
+    """
+    Build an anonymization profile from the DICOM standard actions and the extra rules
+    Args:
+        extra_anonymization_rules: rules overriding or completing the standard ones. Keys are (group, element) tags,
+            (group, element, group_mask, element_mask) for repeating groups or (private creator, offset) for the
+            private elements of a private creator, e.g. ('SIEMENS CT VA0  COAD', 0x12)
+    Returns:
+        AnonymizationProfile: the compiled profile
+    """
+    if extra_anonymization_rules is None:
+        return default_profile()
+
+    rules: dict = initialize_actions()
+    rules.update(extra_anonymization_rules)
+    return _build_profile(rules)
+
+
+@lru_cache(maxsize=1)
+def default_profile() -> AnonymizationProfile:
+    """
+    Profile of the DICOM standard actions, compiled on first use and cached
+    Returns:
+        AnonymizationProfile: the standard profile
+    """
+    return _build_profile(initialize_actions())
+
+
+def _build_profile(rules: dict) -> AnonymizationProfile:
+    actions: Dict[Tuple[int, int], Callable] = {}
+    masked_actions = []
+    private_actions: Dict[Tuple[str, int], Callable] = {}
+    for tag, action in rules.items():
+        if isinstance(tag[0], str):
+            private_actions[(tag[0], tag[1])] = action
+        elif len(tag) > 2:
+            masked_actions.append((tuple(tag), action))
+        else:
+            actions[tuple(tag)] = action
+    private_tags = tuple(tag for tag in actions if tag[0] & 1)
+    return AnonymizationProfile(actions, masked_actions, private_tags, private_actions)
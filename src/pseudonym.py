@@ -0,0 +1,211 @@
+"""
+Pseudonymization of identifying text values, e.g. Patient Name, Patient ID or Institution Name: a value is replaced
+with a pseudonym which is the same for every occurrence of the value, instead of the constant of replace_element, so
+that the instances of a patient or of an institution can still be linked together. See actions.pseudonymize.
+
+The pseudonyms are derived from a keyed hash of the value under the project secret (KeyedPseudonyms), so that every
+worker and every run using the same secret replaces a value the same way. The same values repeat across thousands of
+files of a batch, CachedPseudonymizer remembers the pseudonyms of the values seen by the process in a front cache
+bounded in bytes and, optionally, in a cache shared by the workers of the batch and served by a manager process (see
+start_shared_cache). Since the pseudonyms are deterministic, the caches only save computations: an evicted or a
+concurrently computed value gets the same pseudonym again.
+"""
+import base64
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from typing import Callable, Optional, Tuple
+
+from src.stats import get_stats
+from src.utils import key_id
+
+# Identifying text elements pseudonymized by main.py with --pseudonymize, the other rules are unchanged
+PSEUDONYM_TAGS = [
+    (0x0008, 0x0050),  # Accession Number
+    (0x0008, 0x0080),  # Institution Name
+    (0x0008, 0x0081),  # Institution Address
+    (0x0008, 0x0090),  # Referring Physician's Name
+    (0x0008, 0x1010),  # Station Name
+    (0x0008, 0x1040),  # Institutional Department Name
+    (0x0008, 0x1050),  # Performing Physician's Name
+    (0x0008, 0x1070),  # Operators' Name
+    (0x0010, 0x0010),  # Patient's Name
+    (0x0010, 0x0020),  # Patient ID
+    (0x0010, 0x1000),  # Other Patient IDs
+    (0x0010, 0x1001),  # Other Patient Names
+    (0x0020, 0x0010),  # Study ID
+]
+
+# Approximate memory of a cache entry besides its key and value: node of the OrderedDict and slot of its hash table
+_ENTRY_OVERHEAD = 112
+
+
+class KeyedPseudonyms:
+    """
+    Derive the pseudonym of a value from a keyed hash (PBKDF2-HMAC-SHA256) of the value under a project secret.
+    The pseudonyms are 16 characters of base32 (A-Z and 2-7, 80 bits of the hash), valid for every text VR including
+    CS and AE. With iterations above 1, a value is slower to find back by brute force from its pseudonym, e.g. a
+    numeric Patient ID, if the secret leaks; the caches of CachedPseudonymizer make the cost paid once per value.
+    """
+
+    def __init__(self, secret: bytes, iterations: int = 1):
+        """
+        Args:
+            secret: project secret, the values cannot be linked to their pseudonyms without it
+            iterations: number of iterations of PBKDF2, 1 for a plain HMAC-SHA256
+        Raises:
+            ValueError: If the secret is empty or iterations is not positive
+        """
+        if not secret:
+            raise ValueError('The secret of the pseudonyms cannot be empty')
+        if iterations < 1:
+            raise ValueError('The number of iterations of the pseudonyms must be at least 1')
+        self._secret = secret.encode('utf-8') if isinstance(secret, str) else bytes(secret)
+        self.key_id = key_id(self._secret)
+        self.iterations = iterations
+
+    def __call__(self, value: str) -> str:
+        digest = hashlib.pbkdf2_hmac('sha256', self._secret, value.encode('utf-8', 'replace'), self.iterations)
+        return base64.b32encode(digest[:10]).decode('ascii')
+
+    def __repr__(self):
+        return 'KeyedPseudonyms(iterations={})'.format(self.iterations)
+
+
+class PseudonymLRU:
+    """
+    LRU cache of the pseudonyms of the values, bounded by the approximate memory of its entries. Used as the front
+    cache of each process and as the shared cache of the manager process, whose threads serve the workers
+    concurrently.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: maximum memory of the entries, the least recently used ones are evicted first. The values
+                larger than it are not cached
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, value: str) -> Optional[str]:
+        with self._lock:
+            pseudonym = self._entries.get(value)
+            if pseudonym is not None:
+                self._entries.move_to_end(value)
+            return pseudonym
+
+    def put(self, value: str, pseudonym: str) -> None:
+        size = sys.getsizeof(value) + sys.getsizeof(pseudonym) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(value, None)
+            if previous is not None:
+                self.bytes -= sys.getsizeof(value) + sys.getsizeof(previous) + _ENTRY_OVERHEAD
+            self._entries[value] = pseudonym
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_value, old_pseudonym = self._entries.popitem(last=False)
+                self.bytes -= sys.getsizeof(old_value) + sys.getsizeof(old_pseudonym) + _ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def info(self) -> dict:
+        """
+        Get the size of the cache
+        Returns:
+            dict: number of entries, approximate memory of the entries in bytes and number of evicted entries
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes, 'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _PseudonymManager(BaseManager):
+    pass
+
+
+_PseudonymManager.register('PseudonymLRU', PseudonymLRU)
+
+
+def start_shared_cache(max_bytes: int) -> Tuple[BaseManager, PseudonymLRU]:
+    """
+    Start a manager process serving a pseudonym cache shared by the worker processes, see CachedPseudonymizer
+    Args:
+        max_bytes: maximum memory of the entries of the shared cache
+    Returns:
+        tuple: the started manager, to shut down at the end of the batch, and the proxy of the shared cache, which
+            can be sent to the workers
+    """
+    manager = _PseudonymManager()
+    manager.start()
+    return manager, manager.PseudonymLRU(max_bytes)
+
+
+class CachedPseudonymizer:
+    """
+    Replace a value with its pseudonym, remembered in a front cache of the process and optionally in a cache shared
+    by the processes of the batch. The lookups are counted in the statistics of the process if they are enabled, see
+    src.stats: hits of the front cache, hits of the shared cache and misses, computed with the pseudonym function.
+    The front cache is not sent to other processes, each worker starts with an empty one.
+    """
+
+    def __init__(self, pseudonyms: Callable[[str], str], max_bytes: int = 16 * 1024 * 1024,
+                 shared: PseudonymLRU = None):
+        """
+        Args:
+            pseudonyms: deterministic callable returning the pseudonym of a value, e.g. KeyedPseudonyms. Its
+                pseudonyms must fit the text VRs of the pseudonymized elements, at most 16 characters for SH, CS
+                and AE
+            max_bytes: maximum memory of the front cache of each process
+            shared: cache shared by the processes, see start_shared_cache. Only the front caches are used if not
+                set
+        """
+        self.pseudonyms = pseudonyms
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.cache = PseudonymLRU(max_bytes)
+
+    def __getstate__(self):
+        # The front cache is rebuilt empty by each process, the proxy of the shared cache connects again
+        return {'pseudonyms': self.pseudonyms, 'max_bytes': self.max_bytes, 'shared': self.shared}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __call__(self, value: str) -> str:
+        pseudonym = self.cache.get(value)
+        if pseudonym is not None:
+            lookup = 'hits'
+        else:
+            pseudonym = self.shared.get(value) if self.shared is not None else None
+            if pseudonym is not None:
+                lookup = 'shared_hits'
+            else:
+                lookup = 'misses'
+                pseudonym = self.pseudonyms(value)
+                if self.shared is not None:
+                    self.shared.put(value, pseudonym)
+            self.cache.put(value, pseudonym)
+        stats = get_stats()
+        if stats is not None:
+            stats.pseudonym_lookups[lookup] += 1
+        return pseudonym
+
+    @property
+    def key_id(self) -> Optional[str]:
+        """
+        Identifier of the secret of the pseudonym function, see utils.key_id. None if it has no secret
+        """
+        return getattr(self.pseudonyms, 'key_id', None)
+
+    def __repr__(self):
+        # The caches do not change the pseudonyms
+        return 'CachedPseudonymizer({!r})'.format(self.pseudonyms)
@@ -0,0 +1,531 @@
+"""
+Read-only scan of a corpus: which rules of the profile would fire on which tags and how often, which private creators
+occur, and which elements would hit the NotImplementedError branches of replace_element and empty_element, without
+anonymizing or writing anything.
+
+Only the headers are read, up to the pixel data. They are walked directly in the encoded bytes instead of being
+decoded by pydicom, which is used only for the files the walker does not handle (no DICM prefix, deflated transfer
+syntax or malformed header).
+
+Usage: python -m src.scan INPUT_PATH [--output report.json] [--workers N] [--anonymization_actions JSON]
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import struct
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pydicom
+from pydicom.datadict import DicomDictionary, dictionary_VR, keyword_for_tag
+from pydicom.dataelem import RawDataElement
+from pydicom.uid import DeflatedExplicitVRLittleEndian, ExplicitVRBigEndian, ImplicitVRLittleEndian
+
+from src import actions
+from src.profile import AnonymizationProfile, compile_profile
+from src.utils import iter_dicom_files
+
+# Bytes read first, enough for most headers. The whole file is read if the header is longer
+HEADER_READ_SIZE = 64 * 1024
+
+# Element of a scanned header: (tag, VR, value of the private creators, items of the sequences)
+Element = Tuple[int, str, Optional[str], Optional[list]]
+
+# Actions whose element handlers cover every VR they support, see actions.ELEMENT_HANDLERS: the other VRs fall back
+# to the action, which raises NotImplementedError. delete and replace_UID fall back to functions handling every VR
+_ACTION_VRS: Dict[Callable, frozenset] = {
+    **{action: frozenset(handlers) for action, handlers in actions.ELEMENT_HANDLERS.items()
+       if action is not actions.delete and action is not actions.replace_UID},
+    actions.clean: frozenset(),
+}
+
+# Explicit VRs with a 4 bytes length, see PS3.5 7.1.2
+_LONG_LENGTH_VRS = frozenset(('OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'SQ', 'SV', 'UC', 'UN', 'UR', 'UT', 'UV'))
+_VRS = {vr.encode(): vr for vr in _LONG_LENGTH_VRS | {'AE', 'AS', 'AT', 'CS', 'DA', 'DS', 'DT', 'FD', 'FL', 'IS', 'LO',
+                                                       'LT', 'PN', 'SH', 'SL', 'SS', 'ST', 'TM', 'UI', 'UL', 'US'}}
+
+_DICM_OFFSET = 128
+_FIRST_PIXEL_DATA_TAG = 0x7FE00008
+_PIXEL_DATA_TAG = 0x7FE00010
+_TRANSFER_SYNTAX_TAG = 0x00020010
+_ITEM_TAG = 0xFFFEE000
+_ITEM_DELIMITER_TAG = 0xFFFEE00D
+_SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+_UNDEFINED_LENGTH = 0xFFFFFFFF
+
+# VR of the tags of implicit VR files, from the data dictionary
+_implicit_vrs: Dict[int, str] = {}
+
+# Compiled profile of the scan worker process, set once by _init_worker
+_profile: AnonymizationProfile = None
+
+
+class _Truncated(Exception):
+    """
+    The header goes past the bytes read
+    """
+
+
+class _Codec:
+    __slots__ = ('implicit', 'tag', 'short', 'long')
+
+    def __init__(self, implicit: bool, little_endian: bool):
+        endian = '<' if little_endian else '>'
+        self.implicit = implicit
+        self.tag = struct.Struct(endian + 'HH')
+        self.short = struct.Struct(endian + 'H')
+        self.long = struct.Struct(endian + 'L')
+
+
+_EXPLICIT_LITTLE = _Codec(False, True)
+
+
+def _implicit_vr(tag: int) -> str:
+    vr = _implicit_vrs.get(tag)
+    if vr is None:
+        entry = DicomDictionary.get(tag)
+        if _is_private_creator(tag):
+            # See PS3.5 7.8.1
+            vr = 'LO'
+        elif entry is not None:
+            vr = entry[0]
+        else:
+            try:
+                # Repeating groups such as (60xx,3000)
+                vr = dictionary_VR(tag)
+            except KeyError:
+                vr = 'UN'
+        _implicit_vrs[tag] = vr
+    return vr
+
+
+def _is_private_creator(tag: int) -> bool:
+    return tag >> 16 & 1 == 1 and 0x0010 <= tag & 0xFFFF <= 0x00FF
+
+
+def _parse_dataset(data: bytes, pos: int, end: Optional[int], codec: _Codec,
+                   stop_tag: int = None) -> Tuple[List[Element], int]:
+    """
+    Walk the encoded elements of a dataset. The values of the private creators and of the transfer syntax are kept
+    Args:
+        data: bytes read from the file
+        pos: offset of the first element
+        end: offset following the dataset, None if it ends with an item delimiter or at stop_tag
+        codec: encoding of the dataset
+        stop_tag: if set, the walk stops at the first tag greater or equal, e.g. the pixel data
+    Returns:
+        tuple: (elements, offset following the dataset)
+    Raises:
+        _Truncated: If the dataset goes past the bytes read
+        ValueError: If the dataset is malformed
+    """
+    elements = []
+    size = len(data)
+    limit = size if end is None else end
+    unpack_tag = codec.tag.unpack_from
+    unpack_short = codec.short.unpack_from
+    unpack_long = codec.long.unpack_from
+    implicit = codec.implicit
+    while pos < limit:
+        if pos + 8 > size:
+            raise _Truncated()
+        group, element = unpack_tag(data, pos)
+        tag = group << 16 | element
+        if tag == _ITEM_DELIMITER_TAG:
+            return elements, pos + 8
+        if stop_tag is not None and tag >= stop_tag:
+            return elements, pos
+        if implicit:
+            vr = _implicit_vr(tag)
+            length, = unpack_long(data, pos + 4)
+            pos += 8
+        else:
+            vr = _VRS.get(data[pos + 4:pos + 6])
+            if vr is None:
+                raise ValueError('Unknown VR {!r} at offset {}'.format(data[pos + 4:pos + 6], pos))
+            if vr in _LONG_LENGTH_VRS:
+                if pos + 12 > size:
+                    raise _Truncated()
+                length, = unpack_long(data, pos + 8)
+                pos += 12
+            else:
+                length, = unpack_short(data, pos + 6)
+                pos += 8
+
+        items = None
+        value = None
+        if length == _UNDEFINED_LENGTH:
+            if vr == 'SQ' or vr == 'UN' or (implicit and tag != _PIXEL_DATA_TAG):
+                # Sequences of unknown VR are encoded in implicit VR little endian, see PS3.5 6.2.2
+                items, pos = _parse_items(data, pos, None, codec if vr == 'SQ' else _Codec(True, True))
+            else:
+                pos = _skip_fragments(data, pos, codec)
+        elif vr == 'SQ':
+            items, pos = _parse_items(data, pos, pos + length, codec)
+        else:
+            if pos + length > size:
+                raise _Truncated()
+            if group & 1 and 0x0010 <= element <= 0x00FF or tag == _TRANSFER_SYNTAX_TAG:
+                value = data[pos:pos + length].decode('latin-1').strip(' \0')
+            pos += length
+        elements.append((tag, vr, value, items))
+    if end is None:
+        # The bytes read end before the item delimiter or stop_tag
+        raise _Truncated()
+    return elements, pos
+
+
+def _parse_items(data: bytes, pos: int, end: Optional[int], codec: _Codec) -> Tuple[List[List[Element]], int]:
+    """
+    Walk the items of a sequence, up to end or to the sequence delimiter if end is None
+    """
+    items = []
+    unpack_tag = codec.tag.unpack_from
+    unpack_long = codec.long.unpack_from
+    while end is None or pos < end:
+        if pos + 8 > len(data):
+            raise _Truncated()
+        group, element = unpack_tag(data, pos)
+        length, = unpack_long(data, pos + 4)
+        tag = group << 16 | element
+        pos += 8
+        if tag == _SEQUENCE_DELIMITER_TAG:
+            break
+        if tag != _ITEM_TAG:
+            raise ValueError('Unexpected tag ({:04X},{:04X}) in a sequence'.format(group, element))
+        if length == _UNDEFINED_LENGTH:
+            item, pos = _parse_dataset(data, pos, None, codec)
+        else:
+            item, _ = _parse_dataset(data, pos, pos + length, codec)
+            pos += length
+        items.append(item)
+    return items, pos
+
+
+def _skip_fragments(data: bytes, pos: int, codec: _Codec) -> int:
+    """
+    Skip the fragments of an encapsulated pixel data element, e.g. of an icon image
+    """
+    while True:
+        if pos + 8 > len(data):
+            raise _Truncated()
+        group, element = codec.tag.unpack_from(data, pos)
+        length, = codec.long.unpack_from(data, pos + 4)
+        pos += 8
+        if group << 16 | element == _SEQUENCE_DELIMITER_TAG:
+            return pos
+        pos += length
+
+
+def _parse_file(data: bytes, complete: bool) -> Tuple[List[Element], List[Element], Optional[str]]:
+    """
+    Walk the file meta information and the dataset of a file read in memory
+    Args:
+        data: bytes read from the beginning of the file
+        complete: True if data is the whole file, the dataset may then end without pixel data
+    Returns:
+        tuple: (file meta elements, dataset elements, transfer syntax UID)
+    Raises:
+        _Truncated: If the header goes past the bytes read
+        ValueError: If the file cannot be walked, e.g. deflated
+    """
+    if data[_DICM_OFFSET:_DICM_OFFSET + 4] != b'DICM':
+        raise ValueError('No DICM prefix')
+    # The file meta information is explicit VR little endian, see PS3.10 7.1
+    file_meta, pos = _parse_dataset(data, _DICM_OFFSET + 4, None, _EXPLICIT_LITTLE, stop_tag=0x00030000)
+    transfer_syntax = next((value for tag, _, value, _ in file_meta if tag == _TRANSFER_SYNTAX_TAG), None)
+    if transfer_syntax == DeflatedExplicitVRLittleEndian:
+        raise ValueError('Deflated transfer syntax')
+    codec = _Codec(transfer_syntax == ImplicitVRLittleEndian, transfer_syntax != ExplicitVRBigEndian)
+    dataset, _ = _parse_dataset(data, pos, len(data) if complete else None, codec, stop_tag=_FIRST_PIXEL_DATA_TAG)
+    return file_meta, dataset, transfer_syntax
+
+
+def _dataset_elements(dataset: pydicom.Dataset) -> List[Element]:
+    """
+    Elements of a dataset read by pydicom, as walked by _parse_dataset
+    """
+    elements = []
+    for tag in dataset.keys():
+        raw = dataset.get_item(tag)
+        vr = raw.VR if isinstance(raw, RawDataElement) else dataset[tag].VR
+        if vr is None or vr == 'UN':
+            vr = dataset[tag].VR
+        value = None
+        items = None
+        if vr == 'SQ':
+            items = [_dataset_elements(item) for item in dataset[tag].value]
+        elif _is_private_creator(tag):
+            value = str(dataset[tag].value).strip(' \0')
+        elements.append((int(tag), vr, value, items))
+    return elements
+
+
+def read_header_elements(path: str) -> Tuple[List[Element], List[Element], Optional[str], bool]:
+    """
+    Read the elements of the header of a DICOM file, up to the pixel data
+    Args:
+        path: path of the DICOM file
+    Returns:
+        tuple: (file meta elements, dataset elements, transfer syntax UID, True if the file has been read by pydicom)
+    Raises:
+        IOError: If the file cannot be read
+        pydicom.errors.InvalidDicomError: If the file is not a DICOM file
+    """
+    with open(path, 'rb') as fp:
+        data = fp.read(HEADER_READ_SIZE)
+        try:
+            try:
+                return _parse_file(data, len(data) < HEADER_READ_SIZE) + (False,)
+            except _Truncated:
+                if len(data) < HEADER_READ_SIZE:
+                    raise
+                data += fp.read()
+                return _parse_file(data, True) + (False,)
+        except (_Truncated, ValueError, struct.error):
+            fp.seek(0)
+            dataset = pydicom.dcmread(fp, stop_before_pixels=True)
+    file_meta = getattr(dataset, 'file_meta', None)
+    transfer_syntax = file_meta.get('TransferSyntaxUID') if file_meta is not None else None
+    return (_dataset_elements(file_meta) if file_meta is not None else [], _dataset_elements(dataset),
+            transfer_syntax, True)
+
+
+def _tag_label(tag: int) -> str:
+    keyword = keyword_for_tag(tag)
+    label = '({:04X},{:04X})'.format(tag >> 16, tag & 0xFFFF)
+    return label + ' ' + keyword if keyword else label
+
+
+def _rule_label(key) -> str:
+    if isinstance(key, tuple):
+        # (private creator, offset in the block)
+        return '"{}" {:02X}'.format(*key)
+    return _tag_label(key)
+
+
+def _action_name(action: Callable) -> str:
+    return getattr(action, '__name__', type(action).__name__)
+
+
+class ScanReport:
+    """
+    Inventory of a scanned corpus, mergeable across processes
+    """
+    # Maximum number of (path, error) pairs kept in the report
+    max_error_samples = 100
+
+    def __init__(self):
+        self.files = 0
+        self.errors = 0
+        self.error_samples: List[Tuple[str, str]] = []
+        self.elements = 0
+        self.pydicom_files = 0
+        self.transfer_syntaxes = collections.Counter()
+        # (tag or (private creator, offset), action name) to number of elements
+        self.rules = collections.Counter()
+        self.private_elements = 0
+        self.orphan_private_elements = 0
+        self.private_creators = collections.Counter()
+        self.unknown_private_creators = collections.Counter()
+        # (tag, action name, VR) to number of elements which would raise NotImplementedError
+        self.unsupported_vrs = collections.Counter()
+
+    def add_error(self, path: str, error: Exception) -> None:
+        self.errors += 1
+        if len(self.error_samples) < self.max_error_samples:
+            self.error_samples.append((path, '{}: {}'.format(type(error).__name__, error)))
+
+    def merge(self, other: 'ScanReport') -> None:
+        """
+        Add the counters of another report, e.g. of a worker process
+        """
+        self.files += other.files
+        self.errors += other.errors
+        self.error_samples.extend(other.error_samples[:self.max_error_samples - len(self.error_samples)])
+        self.elements += other.elements
+        self.pydicom_files += other.pydicom_files
+        self.transfer_syntaxes.update(other.transfer_syntaxes)
+        self.rules.update(other.rules)
+        self.private_elements += other.private_elements
+        self.orphan_private_elements += other.orphan_private_elements
+        self.private_creators.update(other.private_creators)
+        self.unknown_private_creators.update(other.unknown_private_creators)
+        self.unsupported_vrs.update(other.unsupported_vrs)
+
+    def to_dict(self) -> dict:
+        rules = {}
+        for action, label, count in sorted((action, _rule_label(key), count) for (key, action), count in
+                                           self.rules.items()):
+            rules.setdefault(action, {})[label] = count
+        return {'files': self.files, 'errors': self.errors,
+                'error_samples': [list(pair) for pair in self.error_samples], 'elements': self.elements,
+                'pydicom_files': self.pydicom_files,
+                'transfer_syntaxes': dict(self.transfer_syntaxes.most_common()), 'rules': rules,
+                'private_elements': self.private_elements, 'orphan_private_elements': self.orphan_private_elements,
+                'private_creators': dict(self.private_creators.most_common()),
+                'unknown_private_creators': dict(self.unknown_private_creators.most_common()),
+                'unsupported_vrs': [{'tag': _rule_label(key), 'action': action, 'vr': vr, 'elements': count}
+                                    for (key, action, vr), count in self.unsupported_vrs.most_common()]}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+
+def _unsupported_vr(vr: str, supported: frozenset, items: Optional[list]) -> Optional[str]:
+    """
+    First VR of the element, or of the elements of its items if it is a sequence, which is not supported
+    """
+    # Ambiguous VRs of implicit VR files, e.g. 'US or SS', fail if one of them is not supported
+    for alternative in vr.split(' or '):
+        if alternative not in supported:
+            return alternative
+    if items:
+        for item in items:
+            for _, sub_vr, _, sub_items in item:
+                unsupported = _unsupported_vr(sub_vr, supported, sub_items)
+                if unsupported is not None:
+                    return unsupported
+    return None
+
+
+def _scan_elements(elements: List[Element], profile: AnonymizationProfile, rule_creators: frozenset,
+                   report: ScanReport) -> None:
+    """
+    Resolve the actions of the elements as anonymizer._anonymize_elements, including nested sequences, and count them.
+    The private creators which are not in rule_creators are reported as unknown
+    """
+    get_action = profile.get_action
+    private_actions = profile.private_actions
+    report.elements += len(elements)
+    creators = None
+    for tag, vr, value, items in elements:
+        key = tag
+        action = get_action(tag)
+        if tag >> 16 & 1:
+            if creators is None:
+                # Block of the private creators (gggg,00bb) and of the private elements (gggg,bbxx)
+                creators = {element_tag & 0xFFFF00FF: creator
+                            for element_tag, _, creator, _ in elements if creator is not None and element_tag >> 16 & 1}
+            if tag & 0xFF00:
+                report.private_elements += 1
+                creator = creators.get(tag & 0xFFFF0000 | tag >> 8 & 0xFF)
+                if creator is None:
+                    report.orphan_private_elements += 1
+                elif action is None and private_actions:
+                    key = (creator, tag & 0xFF)
+                    action = private_actions.get(key)
+            elif value is not None and _is_private_creator(tag):
+                report.private_creators[value] += 1
+                if value not in rule_creators:
+                    report.unknown_private_creators[value] += 1
+        if action is not None:
+            name = _action_name(action)
+            report.rules[key, name] += 1
+            supported = _ACTION_VRS.get(action)
+            if supported is not None:
+                unsupported = _unsupported_vr(vr, supported, items)
+                if unsupported is not None:
+                    report.unsupported_vrs[key, name, unsupported] += 1
+        if (action is None or action is actions.keep) and items:
+            for item in items:
+                _scan_elements(item, profile, rule_creators, report)
+
+
+def scan_file(path: str, profile: AnonymizationProfile, report: ScanReport) -> None:
+    """
+    Scan the header of a DICOM file and add it to the report, the errors are counted in the report
+    Args:
+        path: path of the DICOM file
+        profile: compiled anonymization profile whose rules are resolved
+        report: report of the scan
+    Returns:
+        None
+    """
+    try:
+        file_meta, dataset, transfer_syntax, used_pydicom = read_header_elements(path)
+    except Exception as error:
+        report.add_error(path, error)
+        return
+    report.files += 1
+    report.pydicom_files += used_pydicom
+    report.transfer_syntaxes[str(transfer_syntax)] += 1
+    rule_creators = frozenset(creator for creator, _ in profile.private_actions)
+    # The rules of the group 0x0002 tags are applied on the file meta information, as anonymizer.anonymize_dataset
+    _scan_elements(file_meta, profile, rule_creators, report)
+    _scan_elements(dataset, profile, rule_creators, report)
+
+
+def _init_worker(profile: AnonymizationProfile) -> None:
+    global _profile
+    _profile = profile
+
+
+def _scan_files(paths: List[str]) -> ScanReport:
+    report = ScanReport()
+    for path in paths:
+        scan_file(path, _profile, report)
+    return report
+
+
+def _chunks(paths: Iterable[str], chunk_size: int) -> Iterable[List[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan(paths: Iterable[str], profile: AnonymizationProfile, workers: int = 1, chunk_size: int = 256) -> ScanReport:
+    """
+    Scan the headers of DICOM files in parallel, nothing is anonymized nor written
+    Args:
+        paths: paths of the DICOM files
+        profile: compiled anonymization profile whose rules are resolved
+        workers: number of worker processes, the files are scanned in the current process if 1
+        chunk_size: number of files sent at once to a worker
+    Returns:
+        ScanReport: merged report of the files
+    """
+    report = ScanReport()
+    if workers <= 1:
+        for path in paths:
+            scan_file(path, profile, report)
+        return report
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(profile,)) as pool:
+        for chunk_report in pool.imap_unordered(_scan_files, _chunks(paths, chunk_size)):
+            report.merge(chunk_report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scan DICOM files and report the rules which would be applied')
+    parser.add_argument('input_path', type=str, help='Path to the file or folder to scan')
+    parser.add_argument('--output', type=str, default=None, help='Path of the JSON report, printed if not set')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--anonymization_actions', type=str, default=None,
+                        help='Anonymization actions, as the same option of main.py')
+    args = parser.parse_args()
+
+    anonymization_actions = json.loads(args.anonymization_actions) if args.anonymization_actions else None
+    scan_profile = compile_profile(anonymization_actions)
+    if os.path.isdir(args.input_path):
+        input_paths = (os.path.join(args.input_path, path) for path in iter_dicom_files(args.input_path))
+    else:
+        input_paths = [args.input_path]
+
+    start = time.perf_counter()
+    scan_report = scan(input_paths, scan_profile, args.workers)
+    elapsed = time.perf_counter() - start
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            output_file.write(scan_report.to_json())
+    else:
+        print(scan_report.to_json())
+    print('{} files scanned in {:.2f} s ({:.0f} files/s), {} errors'.format(
+        scan_report.files, elapsed, scan_report.files / elapsed if elapsed else 0, scan_report.errors))
@@ -0,0 +1,249 @@
+"""
+Series-level batching: the files of a series share almost the same header, so the work done for the first file is
+reused for the following ones.
+
+- The actions of the profile are resolved once per header layout (set of tags) instead of once per element.
+- The elements of the first file with a given layout remember their anonymized value, keyed by their raw encoded
+  value. The same element of the following files, e.g. the study, series and patient elements, is replaced with it
+  without being decoded or going through its action again.
+
+Only the elements read with an explicit VR and not converted yet are reused, the others go through their action.
+The anonymized values depend on the patient (see src.date_shift), so the files are grouped by patient and series.
+"""
+import copy
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import pydicom
+from pydicom.dataelem import RawDataElement
+from pydicom.tag import BaseTag
+
+from src import private_tags
+from src.actions import apply_action, keep
+from src.anonymizer import anonymize_dicom_file
+from src.profile import AnonymizationProfile
+from src.stats import get_stats
+from src.utils import is_sequence
+
+# Specific Character Set, the raw values of a layout are decoded with it
+_SPECIFIC_CHARACTER_SET = 0x00080005
+
+# Anonymized value of an element deleted by its action
+_DELETED = object()
+
+
+class _LayoutPlan:
+    """
+    Actions of the elements of a header layout, and the anonymized values of its first dataset
+    """
+    __slots__ = ('actions', 'unmatched', 'values', 'recorded')
+
+    def __init__(self, actions: List[Tuple[BaseTag, Callable]], unmatched: List[BaseTag]):
+        # Tags with an action, and tags without action or kept whose sequence items are walked
+        self.actions = actions
+        self.unmatched = unmatched
+        # (tag, raw value key) to anonymized element, or _DELETED
+        self.values: Dict[tuple, object] = {}
+        self.recorded = False
+
+
+def _raw_value_key(dataset: pydicom.Dataset, tag: BaseTag) -> Optional[tuple]:
+    """
+    Key of the encoded value of an element which has not been converted yet, None if it cannot be reused
+    """
+    element = dataset.get_item(tag)
+    if type(element) is not RawDataElement or element.VR is None or element.VR in ('SQ', 'UN'):
+        return None
+    return tag, element.VR, element.is_little_endian, element.value
+
+
+class SeriesCache:
+    """
+    Work shared by the files of a series anonymized with the same profile, see anonymize_series
+    """
+
+    def __init__(self, profile: AnonymizationProfile):
+        """
+        Args:
+            profile: compiled anonymization profile of the files of the series
+        """
+        self.profile = profile
+        self._plans: Dict[Hashable, _LayoutPlan] = {}
+        # (plan, key, dataset, tag) of the elements of the first dataset of a layout, see finish
+        self._pending = []
+        self.reused_values = 0
+
+    @property
+    def layouts(self) -> int:
+        return len(self._plans)
+
+    def _layout(self, dataset: pydicom.Dataset, character_set) -> Hashable:
+        tags = tuple(dataset.keys())
+        if self.profile.private_actions:
+            # The rules on (private creator, offset) depend on the private creators
+            return tags, character_set, tuple(private_tags.index_private_creators(dataset).items())
+        return tags, character_set
+
+    def _plan(self, dataset: pydicom.Dataset, tags: tuple) -> _LayoutPlan:
+        profile = self.profile
+        get_action = profile.get_action
+        private_actions = profile.private_actions
+        creators = None
+        actions = []
+        unmatched = []
+        for tag in tags:
+            action = get_action(tag)
+            if action is None and private_actions and tag.group & 1 and tag.element > 0x00FF:
+                if creators is None:
+                    creators = private_tags.index_private_creators(dataset)
+                action = private_actions.get((private_tags.private_creator_of(creators, tag), tag.element & 0x00FF))
+            if action is not None:
+                actions.append((tag, action))
+            if action is None or action is keep:
+                unmatched.append(tag)
+        return _LayoutPlan(actions, unmatched)
+
+    def anonymize_elements(self, dataset: pydicom.Dataset, profile: AnonymizationProfile, kept: dict = None,
+                           character_set=None) -> None:
+        """
+        Apply the actions of the profile on the elements of the dataset, including nested sequences, as
+        anonymizer._anonymize_elements but with the actions resolved per layout and the values of the first dataset
+        of the layout reused
+        Args:
+            dataset: pydicom Dataset to anonymize
+            profile: compiled anonymization profile, the profile of the cache
+            kept: if set, the private tags kept by the rules are added to this dict, by id of their dataset
+            character_set: raw Specific Character Set of the parent dataset, for the nested sequences
+        Returns:
+            None
+        Raises:
+            ValueError: If the profile is not the profile of the cache
+        """
+        if profile is not self.profile:
+            raise ValueError('The series cache has been created for another profile')
+        own_character_set = dataset.get_item(_SPECIFIC_CHARACTER_SET)
+        if own_character_set is not None:
+            value = own_character_set.value
+            character_set = tuple(value) if isinstance(value, list) else value
+        layout = self._layout(dataset, character_set)
+        plan = self._plans.get(layout)
+        if plan is None:
+            plan = self._plans[layout] = self._plan(dataset, layout[0])
+        record = not plan.recorded
+        values = plan.values
+
+        stats = get_stats()
+        if stats is not None:
+            stats.elements += len(layout[0])
+        for tag, action in plan.actions:
+            if action is not keep:
+                key = None if tag.group & 1 else _raw_value_key(dataset, tag)
+                value = values.get(key) if key is not None else None
+                if value is _DELETED:
+                    del dataset[tag]
+                    self.reused_values += 1
+                elif value is not None:
+                    dataset[tag] = copy.copy(value)
+                    self.reused_values += 1
+                else:
+                    if stats is None:
+                        apply_action(action, dataset, tag)
+                    else:
+                        stats.time_action(action, dataset, tag, apply_action)
+                    if record and key is not None:
+                        self._pending.append((plan, key, dataset, tag))
+            # Private tags left by the rules are kept in place when the private tags are deleted
+            if kept is not None and tag.group & 1 and tag in dataset:
+                kept.setdefault(id(dataset), set()).add(tag)
+        for tag in plan.unmatched:
+            if is_sequence(dataset, tag):
+                for sub_dataset in dataset[tag].value:
+                    self.anonymize_elements(sub_dataset, profile, kept, character_set)
+
+    def start(self) -> None:
+        """
+        Forget the values of a dataset whose anonymization failed. Called by anonymize_dataset
+        """
+        self._pending = []
+
+    def finish(self) -> None:
+        """
+        Remember the anonymized values of the first dataset of the new layouts, once the dataset has been completely
+        anonymized, dates included. Called by anonymize_dataset
+        """
+        for plan, key, dataset, tag in self._pending:
+            element = dataset.get(tag)
+            plan.values[key] = _DELETED if element is None else copy.copy(element)
+            plan.recorded = True
+        self._pending = []
+
+
+def series_key(path: str) -> Optional[tuple]:
+    """
+    Get the patient and series of a DICOM file, reading only the beginning of its header
+    Args:
+        path: path of the DICOM file
+    Returns:
+        tuple: (Patient ID, Series Instance UID), None if the file cannot be read or has no series
+    """
+    try:
+        dataset = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=['PatientID', 'SeriesInstanceUID'])
+    except Exception:
+        return None
+    series_uid = dataset.get('SeriesInstanceUID')
+    if not series_uid:
+        return None
+    return str(dataset.get('PatientID') or ''), str(series_uid)
+
+
+def group_by_series(tasks: Iterable[tuple], max_files: int = 500, max_pending: int = None) -> Iterator[List[tuple]]:
+    """
+    Group the files by patient and series as their headers are read. A group is yielded once it is full, or when
+    the files waiting for their group reach max_pending, so that the anonymization starts before all the headers are
+    read and the memory of the groups stays bounded whatever the number of files
+    Args:
+        tasks: tuples starting with the path of the input file, e.g. (input file path, output file path)
+        max_files: maximum number of files per group, the larger series are split to spread them across the workers
+        max_pending: maximum number of files read and waiting for their group, the largest group is yielded first
+            when it is reached. 4 * max_files if not set
+    Returns:
+        Iterator: lists of tasks of the same series, each file which cannot be read or has no series is alone
+    """
+    if max_pending is None:
+        max_pending = 4 * max_files
+    groups: Dict[tuple, List[tuple]] = {}
+    pending = 0
+    for task in tasks:
+        key = series_key(task[0])
+        if key is None:
+            yield [task]
+            continue
+        group = groups.setdefault(key, [])
+        group.append(task)
+        pending += 1
+        if len(group) >= max_files:
+            pending -= len(group)
+            yield groups.pop(key)
+        elif pending >= max_pending:
+            # Files of many series interleaved, the series split in the largest groups lose the least
+            largest = max(groups, key=lambda group_key: len(groups[group_key]))
+            pending -= len(groups[largest])
+            yield groups.pop(largest)
+    yield from groups.values()
+
+
+def anonymize_series(files: Iterable[Tuple[str, str]], profile: AnonymizationProfile,
+                     delete_private_tags: bool = True, **file_options) -> List[str]:
+    """
+    Anonymize the files of a series with a shared SeriesCache
+    Args:
+        files: (input file path, output file path) of the files of the series
+        profile: compiled anonymization profile
+        delete_private_tags: define if private tags should be delete or not
+        file_options: extra keyword arguments of anonymize_dicom_file, e.g. stream_pixel_data
+    Returns:
+        list: how each output file has been written, see anonymize_dicom_file
+    """
+    cache = SeriesCache(profile)
+    return [anonymize_dicom_file(in_file, out_file, delete_private_tags=delete_private_tags, profile=profile,
+                                 series_cache=cache, **file_options)
+            for in_file, out_file in files]
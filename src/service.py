@@ -0,0 +1,390 @@
+"""
+Local anonymization service keeping a pool of warm worker processes with the compiled profile loaded, so that the
+start-up of the interpreter, the import of pydicom and the compilation of the rules are paid once.
+
+The service speaks HTTP on a local TCP port or on a Unix socket:
+    POST /anonymize        body: one DICOM instance (application/dicom), answers the anonymized instance
+    POST /anonymize        body: a batch of instances (multipart/related; type="application/dicom"), answers a
+                           multipart/related batch in the same order, a failed instance is a text/plain error part
+    GET  /metrics          queue depth, counters and latency quantiles in the Prometheus text format
+    GET  /health           answers ok
+
+Usage: python -m src.service [--port N | --unix-socket PATH] [--workers N]
+"""
+import argparse
+import collections
+import email.message
+import http.server
+import json
+import multiprocessing
+import os
+import socketserver
+import stat
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from src.actions import generate_actions
+from src.date_shift import DateShifter
+from src.pipeline import anonymize_buffer, init_worker
+from src.profile import AnonymizationProfile, compile_profile
+from src.pseudonym import PSEUDONYM_TAGS, CachedPseudonymizer, KeyedPseudonyms
+from src.uid import KeyedUIDMapper, PersistentUIDMapper, RandomUIDMapper, is_process_local
+
+DICOM_CONTENT_TYPE = 'application/dicom'
+MULTIPART_CONTENT_TYPE = 'multipart/related'
+
+
+def _anonymize_instance(data: bytes) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Anonymize one instance in the worker process without failing the whole batch
+    Returns:
+        tuple: (anonymized instance, None) or (None, error message)
+    """
+    try:
+        return anonymize_buffer(data), None
+    except Exception as error:
+        return None, '{}: {}'.format(type(error).__name__, error)
+
+
+class AnonymizationService:
+    """
+    Pool of warm worker processes anonymizing DICOM instances held in memory, with its metrics
+    """
+
+    def __init__(self, profile: AnonymizationProfile, delete_private_tags: bool = True, uid_mapper=None,
+                 workers: int = 1, latency_window: int = 1000, date_shifter=None, pseudonymizer=None):
+        """
+        Args:
+            profile: compiled anonymization profile, loaded once in every worker
+            delete_private_tags: if True, private tags will be deleted
+            uid_mapper: UID mapper of the workers, see src.uid. A KeyedUIDMapper or a PersistentUIDMapper is
+                required with more than one worker, to get the same UIDs from every worker
+            workers: number of worker processes
+            latency_window: number of the last instances used to compute the latency quantiles
+            date_shifter: if set, the dates are shifted with the offset of their patient, see src.date_shift
+            pseudonymizer: if set, the values of the pseudonymize rules are replaced with their pseudonym instead of
+                constants, see src.pseudonym. A CachedPseudonymizer keeps the pseudonyms of each worker across the
+                requests
+        Raises:
+            ValueError: If several workers would replace the UIDs with random UIDs of their own
+        """
+        if workers > 1 and is_process_local(uid_mapper):
+            raise ValueError('Random UIDs are remembered by each process, use a KeyedUIDMapper or a '
+                             'PersistentUIDMapper with more than one worker')
+        self._pool = multiprocessing.Pool(workers, initializer=init_worker,
+                                          initargs=(profile, delete_private_tags, uid_mapper, False, date_shifter,
+                                                    pseudonymizer))
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=latency_window)
+        self.workers = workers
+        self.queue_depth = 0
+        self.requests = 0
+        self.instances = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def anonymize(self, instances: List[bytes]) -> List[Tuple[Optional[bytes], Optional[str]]]:
+        """
+        Anonymize a batch of instances, spread across the workers
+        Args:
+            instances: content of the DICOM instances
+        Returns:
+            list: (anonymized instance, None) or (None, error message) for each instance, in the same order
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            self.queue_depth += len(instances)
+            self.bytes_in += sum(len(data) for data in instances)
+        pending = [self._pool.apply_async(_anonymize_instance, (data,)) for data in instances]
+
+        results = []
+        for result in pending:
+            try:
+                data, error = result.get()
+            except Exception as error:
+                data, error = None, '{}: {}'.format(type(error).__name__, error)
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.queue_depth -= 1
+                self.instances += 1
+                self._latencies.append(latency)
+                if error is not None:
+                    self.errors += 1
+                else:
+                    self.bytes_out += len(data)
+            results.append((data, error))
+        return results
+
+    def latency_quantile(self, quantile: float) -> float:
+        """
+        Latency in seconds of the last instances at the given quantile, from their submission to their result
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * quantile))]
+
+    def metrics(self) -> str:
+        """
+        Export the metrics of the service in the Prometheus text format
+        """
+        quantiles = [(quantile, self.latency_quantile(quantile)) for quantile in (0.5, 0.9, 0.99)]
+        with self._lock:
+            lines = [
+                '# TYPE dicom_anonymizer_queue_depth gauge',
+                'dicom_anonymizer_queue_depth {}'.format(self.queue_depth),
+                '# TYPE dicom_anonymizer_workers gauge',
+                'dicom_anonymizer_workers {}'.format(self.workers),
+                '# TYPE dicom_anonymizer_requests_total counter',
+                'dicom_anonymizer_requests_total {}'.format(self.requests),
+                '# TYPE dicom_anonymizer_instances_total counter',
+                'dicom_anonymizer_instances_total {}'.format(self.instances),
+                '# TYPE dicom_anonymizer_errors_total counter',
+                'dicom_anonymizer_errors_total {}'.format(self.errors),
+                '# TYPE dicom_anonymizer_bytes_in_total counter',
+                'dicom_anonymizer_bytes_in_total {}'.format(self.bytes_in),
+                '# TYPE dicom_anonymizer_bytes_out_total counter',
+                'dicom_anonymizer_bytes_out_total {}'.format(self.bytes_out),
+                '# TYPE dicom_anonymizer_latency_seconds summary',
+            ]
+        lines.extend('dicom_anonymizer_latency_seconds{{quantile="{}"}} {:.6f}'.format(quantile, latency)
+                     for quantile, latency in quantiles)
+        return '\n'.join(lines) + '\n'
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+
+def parse_multipart(content_type: str, body: bytes) -> List[bytes]:
+    """
+    Split a multipart body into the content of its parts
+    Args:
+        content_type: value of the Content-Type header, with the boundary parameter
+        body: body of the request
+    Returns:
+        list: content of the parts
+    Raises:
+        ValueError: If the boundary is missing
+    """
+    header = email.message.Message()
+    header['Content-Type'] = content_type
+    boundary = header.get_param('boundary')
+    if not boundary:
+        raise ValueError('Missing multipart boundary')
+
+    parts = []
+    # The first chunk is the preamble, the last one follows the closing delimiter
+    for chunk in (b'\r\n' + body).split(b'\r\n--' + boundary.encode('ascii'))[1:]:
+        if chunk.startswith(b'--'):
+            break
+        headers_end = chunk.find(b'\r\n\r\n')
+        if headers_end < 0:
+            raise ValueError('Malformed multipart part')
+        parts.append(chunk[headers_end + 4:])
+    return parts
+
+
+def make_multipart(parts: List[Tuple[str, bytes]]) -> Tuple[str, bytes]:
+    """
+    Build a multipart/related body
+    Args:
+        parts: (content type, content) of the parts
+    Returns:
+        tuple: (value of the Content-Type header, body)
+    """
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for content_type, content in parts:
+        chunks.append('\r\n--{}\r\nContent-Type: {}\r\n\r\n'.format(boundary, content_type).encode('ascii'))
+        chunks.append(content)
+    chunks.append('\r\n--{}--\r\n'.format(boundary).encode('ascii'))
+    content_type = '{}; type="{}"; boundary={}'.format(MULTIPART_CONTENT_TYPE, DICOM_CONTENT_TYPE, boundary)
+    return content_type, b''.join(chunks)
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, 'text/plain; version=0.0.4', self.server.service.metrics().encode('ascii'))
+        elif self.path == '/health':
+            self._send(200, 'text/plain', b'ok')
+        else:
+            self._send(404, 'text/plain', b'Not found')
+
+    def do_POST(self):
+        if self.path != '/anonymize':
+            self._send(404, 'text/plain', b'Not found')
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', DICOM_CONTENT_TYPE)
+
+        if content_type.startswith(MULTIPART_CONTENT_TYPE):
+            try:
+                instances = parse_multipart(content_type, body)
+            except ValueError as error:
+                self._send(400, 'text/plain', str(error).encode())
+                return
+            results = self.server.service.anonymize(instances)
+            self._send(200, *make_multipart([(DICOM_CONTENT_TYPE, data) if error is None
+                                             else ('text/plain', error.encode()) for data, error in results]))
+        else:
+            (data, error), = self.server.service.anonymize([body])
+            if error is None:
+                self._send(200, DICOM_CONTENT_TYPE, data)
+            else:
+                self._send(422, 'text/plain', error.encode())
+
+
+class _TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _is_socket(path: str) -> bool:
+    """
+    Check if a path is a Unix socket, without following a symbolic link. False if it does not exist
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def make_server(service: AnonymizationService, host: str = '127.0.0.1', port: int = 8104,
+                unix_socket: str = None, verbose: bool = False) -> socketserver.BaseServer:
+    """
+    Create the HTTP server of the service, call serve_forever to run it
+    Args:
+        service: anonymization service answering the requests
+        host: listening address, local only by default
+        port: listening port, 0 for any free port
+        unix_socket: path to a Unix socket to listen on instead of the TCP port
+        verbose: if True, every request is logged
+    Returns:
+        server: the HTTP server
+    Raises:
+        FileExistsError: If unix_socket is an existing path which is not a socket, e.g. a regular file. A socket
+            left by a previous run is removed
+    """
+    if unix_socket is not None:
+        if _is_socket(unix_socket):
+            os.remove(unix_socket)
+        elif os.path.lexists(unix_socket):
+            raise FileExistsError('{} exists and is not a Unix socket'.format(unix_socket))
+        server = _UnixServer(unix_socket, _RequestHandler)
+    else:
+        server = _TCPServer((host, port), _RequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local DICOM anonymization service')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listening address')
+    parser.add_argument('--port', type=int, default=8104, help='Listening port')
+    parser.add_argument('--unix-socket', type=str, default=None, help='Listen on this Unix socket instead')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes, defaults to the number of CPUs with --project-secret-file '
+                             'or --uid-store and to 1 otherwise: the random UIDs are not shared by the workers')
+    parser.add_argument('--anonymization_actions', type=str, default=None, help='Extra anonymization actions')
+    parser.add_argument('--delete-private-tags', action='store_true', help='Delete the private tags')
+    uid_group = parser.add_mutually_exclusive_group()
+    uid_group.add_argument('--project-secret-file', type=str, default=None,
+                           help='File containing the project secret used to derive the new UIDs')
+    uid_group.add_argument('--uid-store', type=str, default=None,
+                           help='SQLite database storing the random UIDs')
+    parser.add_argument('--shift-dates', action='store_true',
+                        help='Shift the dates of each patient by an offset derived from its Patient ID and the project '
+                             'secret, requires --project-secret-file')
+    parser.add_argument('--max-date-shift-days', type=int, default=365,
+                        help='Maximum number of days of the date offsets with --shift-dates')
+    parser.add_argument('--keep-times', action='store_true',
+                        help='Keep the times (TM) with --shift-dates instead of anonymizing them with their rule')
+    parser.add_argument('--pseudonymize', action='store_true',
+                        help='Replace the patient, physician and institution names and IDs with pseudonyms derived '
+                             'from the project secret instead of constants, requires --project-secret-file')
+    parser.add_argument('--pseudonym-iterations', type=int, default=1,
+                        help='Number of PBKDF2 iterations of the pseudonyms with --pseudonymize')
+    parser.add_argument('--pseudonym-cache-mb', type=float, default=16,
+                        help='Maximum memory of the pseudonyms remembered by each worker with --pseudonymize')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    anonymization_actions = json.loads(args.anonymization_actions) if args.anonymization_actions else None
+    date_shifter = None
+    pseudonymizer = None
+    if args.shift_dates and args.project_secret_file is None:
+        parser.error('--shift-dates requires --project-secret-file')
+    if args.keep_times and not args.shift_dates:
+        parser.error('--keep-times requires --shift-dates')
+    if args.pseudonymize and args.project_secret_file is None:
+        parser.error('--pseudonymize requires --project-secret-file')
+    if args.project_secret_file is not None:
+        with open(args.project_secret_file, 'rb') as secret_file:
+            project_secret = secret_file.read().strip()
+        uid_mapper = KeyedUIDMapper(project_secret)
+        if args.shift_dates:
+            date_shifter = DateShifter(project_secret, args.max_date_shift_days, args.keep_times)
+        if args.pseudonymize:
+            pseudonymizer = CachedPseudonymizer(KeyedPseudonyms(project_secret, args.pseudonym_iterations),
+                                                int(args.pseudonym_cache_mb * 1024 ** 2))
+    elif args.uid_store is not None:
+        uid_mapper = PersistentUIDMapper(args.uid_store)
+    else:
+        # Remembered by the single worker
+        uid_mapper = RandomUIDMapper()
+    if args.workers is None:
+        args.workers = 1 if is_process_local(uid_mapper) else os.cpu_count()
+    elif args.workers < 1:
+        parser.error('--workers must be at least 1')
+    elif args.workers > 1 and is_process_local(uid_mapper):
+        parser.error('--workers above 1 requires --project-secret-file or --uid-store, the random UIDs are not '
+                     'shared by the worker processes')
+
+    if pseudonymizer is not None:
+        # The user rules keep precedence over the pseudonymized tags
+        anonymization_actions = {**generate_actions(PSEUDONYM_TAGS, 'pseudonymize'), **(anonymization_actions or {})}
+    service = AnonymizationService(compile_profile(anonymization_actions), args.delete_private_tags, uid_mapper,
+                                   args.workers, date_shifter=date_shifter, pseudonymizer=pseudonymizer)
+    server = make_server(service, args.host, args.port, args.unix_socket, args.verbose)
+    print('Listening on {}'.format(args.unix_socket or '{}:{}'.format(args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket is not None and _is_socket(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
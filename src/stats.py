@@ -0,0 +1,171 @@
+"""
+Optional instrumentation of the anonymization: time spent per stage (read, rules, private tags, write...) and per
+action type, number of elements visited and touched, bytes read and written, lookups of the pseudonym caches.
+
+The statistics are disabled by default and cost a single check per stage and per dataset then. They are enabled per
+process with enable_stats, each worker sends the statistics of its files with its results (see RunStats.pop) and the
+main process merges them.
+"""
+import collections
+import contextlib
+import json
+import time
+from typing import Callable, Optional
+
+# Stages of the anonymization of a file, in processing order
+READ = 'read'
+UIDS = 'uids'
+RULES = 'rules'
+DATES = 'dates'
+PRIVATE_TAGS = 'private_tags'
+PATCH = 'patch'
+WRITE = 'write'
+
+# Returned by stage when the statistics are disabled
+_NO_TIMER = contextlib.nullcontext()
+
+# Statistics of the current process, None if disabled
+_stats: Optional['RunStats'] = None
+
+
+class _StageTimer:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats: 'RunStats', name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.stage_seconds[self.name] += time.perf_counter() - self.start
+        self.stats.stage_calls[self.name] += 1
+
+
+class RunStats:
+    """
+    Counters of an anonymization run, mergeable across processes
+    """
+
+    def __init__(self):
+        self.stage_seconds = collections.Counter()
+        self.stage_calls = collections.Counter()
+        self.action_seconds = collections.Counter()
+        self.action_elements = collections.Counter()
+        # Lookups of the pseudonyms by outcome, see src.pseudonym.CachedPseudonymizer
+        self.pseudonym_lookups = collections.Counter()
+        self.elements = 0
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def stage(self, name: str) -> _StageTimer:
+        """
+        Time a stage, use as a context manager
+        """
+        return _StageTimer(self, name)
+
+    def time_action(self, action: Callable, dataset, tag, apply: Callable = None) -> None:
+        """
+        Apply an action on an element and record its duration under the name of the action
+        Args:
+            action: action of the element
+            dataset: dataset of the element
+            tag: tag of the element
+            apply: called with the action, the dataset and the tag to apply the action, e.g. actions.apply_action.
+                The action is called with the dataset and the tag if not set
+        """
+        start = time.perf_counter()
+        if apply is None:
+            action(dataset, tag)
+        else:
+            apply(action, dataset, tag)
+        name = getattr(action, '__name__', type(action).__name__)
+        self.action_seconds[name] += time.perf_counter() - start
+        self.action_elements[name] += 1
+
+    def to_dict(self) -> dict:
+        return {'files': self.files, 'elements': self.elements, 'bytes_read': self.bytes_read,
+                'bytes_written': self.bytes_written, 'stage_seconds': dict(self.stage_seconds),
+                'stage_calls': dict(self.stage_calls), 'action_seconds': dict(self.action_seconds),
+                'action_elements': dict(self.action_elements), 'pseudonym_lookups': dict(self.pseudonym_lookups)}
+
+    def merge(self, other: dict) -> None:
+        """
+        Add the counters of another process
+        Args:
+            other: counters of the other process, see to_dict
+        """
+        self.files += other['files']
+        self.elements += other['elements']
+        self.bytes_read += other['bytes_read']
+        self.bytes_written += other['bytes_written']
+        self.stage_seconds.update(other['stage_seconds'])
+        self.stage_calls.update(other['stage_calls'])
+        self.action_seconds.update(other['action_seconds'])
+        self.action_elements.update(other['action_elements'])
+        self.pseudonym_lookups.update(other['pseudonym_lookups'])
+
+    def pop(self) -> dict:
+        """
+        Get the counters and reset them, used by the workers to send the counters of each file
+        """
+        counters = self.to_dict()
+        self.__init__()
+        return counters
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = 'dicom_anonymizer') -> str:
+        """
+        Export the counters in the Prometheus text format
+        """
+        lines = []
+        for name, value in (('files', self.files), ('elements_visited', self.elements),
+                            ('bytes_read', self.bytes_read), ('bytes_written', self.bytes_written)):
+            lines.append('# TYPE {}_{}_total counter'.format(prefix, name))
+            lines.append('{}_{}_total {}'.format(prefix, name, value))
+        for name, label, counter in (('stage_seconds', 'stage', self.stage_seconds),
+                                     ('stage_calls', 'stage', self.stage_calls),
+                                     ('action_seconds', 'action', self.action_seconds),
+                                     ('action_elements', 'action', self.action_elements),
+                                     ('pseudonym_lookups', 'outcome', self.pseudonym_lookups)):
+            lines.append('# TYPE {}_{}_total counter'.format(prefix, name))
+            lines.extend('{}_{}_total{{{}="{}"}} {}'.format(prefix, name, label, key, counter[key])
+                         for key in sorted(counter))
+        return '\n'.join(lines) + '\n'
+
+
+def enable_stats() -> RunStats:
+    """
+    Enable the statistics in the current process
+    Returns:
+        RunStats: the statistics of the current process, kept if already enabled
+    """
+    global _stats
+    if _stats is None:
+        _stats = RunStats()
+    return _stats
+
+
+def disable_stats() -> None:
+    global _stats
+    _stats = None
+
+
+def get_stats() -> Optional[RunStats]:
+    """
+    Get the statistics of the current process, None if disabled
+    """
+    return _stats
+
+
+def stage(name: str):
+    """
+    Time a stage if the statistics are enabled, use as a context manager
+    """
+    stats = _stats
+    return _NO_TIMER if stats is None else _StageTimer(stats, name)
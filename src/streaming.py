@@ -0,0 +1,142 @@
+"""
+Helpers to read the header of a DICOM file without loading its pixel data, and to copy the pixel data element
+as is from the input file to the output file.
+"""
+import struct
+from typing import BinaryIO, Tuple
+
+import pydicom
+from pydicom.filebase import DicomFileLike
+from pydicom.filereader import read_dataset
+from pydicom.filewriter import write_dataset
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+
+# Size of the chunks used to copy the pixel data
+CHUNK_SIZE = 1024 * 1024
+
+# Explicit VRs with a 4 bytes length, see PS3.5 7.1.2
+_LONG_LENGTH_VRS = (b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'SV', b'UC', b'UN', b'UR', b'UT', b'UV')
+
+# First of the pixel data tags (Float Pixel Data), pydicom stops reading the header at any of them
+_FIRST_PIXEL_DATA_TAG = 0x7FE00008
+_ITEM_TAG = 0xFFFEE000
+_SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+_UNDEFINED_LENGTH = 0xFFFFFFFF
+
+
+def read_header(fp: BinaryIO) -> Tuple[pydicom.Dataset, int]:
+    """
+    Read the dataset of a DICOM file up to its pixel data element
+    Args:
+        fp: DICOM file opened in binary mode
+    Returns:
+        tuple: (dataset without the pixel data, offset of the pixel data element or None if the file cannot be
+            streamed because it is deflated)
+    """
+    dataset = pydicom.dcmread(fp, stop_before_pixels=True)
+    file_meta = getattr(dataset, 'file_meta', None)
+    if file_meta is not None and file_meta.get('TransferSyntaxUID') == DeflatedExplicitVRLittleEndian:
+        # The position in the file does not match the position in the inflated dataset
+        return dataset, None
+    return dataset, fp.tell()
+
+
+def pixel_data_end(fp: BinaryIO, offset: int, is_implicit_VR: bool, is_little_endian: bool) -> int:
+    """
+    Find the end of the pixel data element by reading its header, and the header of its fragments if encapsulated
+    Args:
+        fp: DICOM file opened in binary mode
+        offset: offset of the pixel data element, see read_header
+        is_implicit_VR: True if the transfer syntax is implicit VR
+        is_little_endian: True if the transfer syntax is little endian
+    Returns:
+        int: offset following the pixel data element, offset itself if there is no element left in the file
+    """
+    endian = '<' if is_little_endian else '>'
+    fp.seek(offset)
+    header = fp.read(8)
+    if len(header) < 8:
+        return offset
+
+    if is_implicit_VR:
+        length, = struct.unpack(endian + 'L', header[4:])
+    elif header[4:6] in _LONG_LENGTH_VRS:
+        length, = struct.unpack(endian + 'L', fp.read(4))
+    else:
+        length, = struct.unpack(endian + 'H', header[6:])
+
+    if length != _UNDEFINED_LENGTH:
+        return fp.tell() + length
+
+    # Encapsulated pixel data: items up to the sequence delimiter
+    while True:
+        group, element, length = struct.unpack(endian + 'HHL', fp.read(8))
+        tag = group << 16 | element
+        if tag == _SEQUENCE_DELIMITER_TAG:
+            return fp.tell()
+        if tag != _ITEM_TAG:
+            raise ValueError('Unexpected tag ({:04X},{:04X}) in the encapsulated pixel data'.format(group, element))
+        fp.seek(length, 1)
+
+
+def read_trailing_elements(fp: BinaryIO, offset: int, dataset: pydicom.Dataset) -> None:
+    """
+    Read the elements following the pixel data element, e.g. padding or digital signatures, into the dataset
+    Args:
+        fp: DICOM file opened in binary mode
+        offset: offset following the pixel data element, see pixel_data_end
+        dataset: header of the file, see read_header
+    Returns:
+        None
+    """
+    fp.seek(offset)
+    if not fp.read(1):
+        return
+    fp.seek(offset)
+    is_implicit_VR, is_little_endian = dataset.original_encoding
+    trailing = read_dataset(fp, is_implicit_VR, is_little_endian,
+                            parent_encoding=dataset.original_character_set)
+    for tag in trailing.keys():
+        dataset[tag] = trailing[tag]
+
+
+def write_streamed(dataset: pydicom.Dataset, in_fp: BinaryIO, out_fp: BinaryIO, start: int, end: int) -> None:
+    """
+    Write the header, then copy the pixel data element from the input file by chunks, then write the trailing
+    elements of the dataset
+    Args:
+        dataset: dataset without the pixel data element
+        in_fp: input DICOM file opened in binary mode
+        out_fp: output DICOM file opened in binary mode
+        start: offset of the pixel data element in the input file
+        end: offset following the pixel data element in the input file
+    Returns:
+        None
+    """
+    trailing = pydicom.Dataset()
+    for tag in [tag for tag in dataset.keys() if tag >= _FIRST_PIXEL_DATA_TAG]:
+        trailing[tag] = dataset[tag]
+        del dataset[tag]
+
+    dataset.save_as(out_fp)
+    copy_range(in_fp, out_fp, start, end)
+
+    if len(trailing):
+        out_file = DicomFileLike(out_fp)
+        out_file.is_implicit_VR, out_file.is_little_endian = dataset.original_encoding
+        write_dataset(out_file, trailing, dataset.original_character_set)
+
+
+def copy_range(in_fp: BinaryIO, out_fp: BinaryIO, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Copy a range of bytes from a file to another one by chunks
+    """
+    in_fp.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = in_fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise IOError('Unexpected end of file')
+        out_fp.write(chunk)
+        remaining -= len(chunk)
+
@@ -0,0 +1,203 @@
+"""
+UID remapping strategies used to replace the UIDs of the datasets, see actions.get_uid.
+A UID mapper is a callable taking the old UID and returning the new one.
+"""
+import csv
+import hashlib
+import hmac
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+from pydicom.uid import generate_uid
+
+from src.utils import key_id
+
+
+class RandomUIDMapper:
+    """
+    Replace every UID with a random UID.
+    Replacements are remembered in a bounded LRU cache, so that the same UID is replaced with the same value within
+    the process as long as it has not been evicted. The mapping is neither shared between processes nor between runs.
+    """
+
+    def __init__(self, maxsize: int = 1000000):
+        """
+        Args:
+            maxsize: maximum number of UIDs remembered, the least recently used ones are evicted first
+        """
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def __call__(self, old_uid: str) -> str:
+        new_uid = self._cache.get(old_uid)
+        if new_uid is None:
+            new_uid = generate_uid(None)
+            self._cache[old_uid] = new_uid
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(old_uid)
+        return new_uid
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def is_process_local(uid_mapper) -> bool:
+    """
+    Check if a UID mapper only remembers its UIDs in the current process: the workers of a pool would then replace
+    the UIDs of a study with different values
+    Args:
+        uid_mapper: UID mapper, None for the default RandomUIDMapper of actions.get_uid
+    Returns:
+        bool: True for RandomUIDMapper and None
+    """
+    return uid_mapper is None or isinstance(uid_mapper, RandomUIDMapper)
+
+
+class KeyedUIDMapper:
+    """
+    Derive the new UID from a keyed hash (HMAC-SHA256) of the old UID under a project secret.
+    The same UID is always replaced with the same value, on any process and on any run using the same secret,
+    without any shared state. The 128 first bits of the hash are formatted as a version 8 (custom) UUID and
+    converted to a UID of the 2.25 root, see PS3.5 B.2.
+    """
+
+    def __init__(self, secret: bytes):
+        """
+        Args:
+            secret: project secret, the UIDs cannot be linked back to the original ones without it
+        Raises:
+            ValueError: If the secret is empty
+        """
+        if not secret:
+            raise ValueError('The secret of the UID mapper cannot be empty')
+        self._secret = secret.encode('utf-8') if isinstance(secret, str) else bytes(secret)
+        self.key_id = key_id(self._secret)
+
+    def __call__(self, old_uid: str) -> str:
+        digest = hmac.new(self._secret, old_uid.encode('ascii', 'replace'), hashlib.sha256).digest()
+        value = int.from_bytes(digest[:16], 'big')
+        # Set the UUID version (8) and variant (RFC 4122) bits
+        value = (value & ~(0xF << 76)) | (0x8 << 76)
+        value = (value & ~(0x3 << 62)) | (0x2 << 62)
+        return '2.25.{}'.format(value)
+
+
+class PersistentUIDMapper:
+    """
+    Replace every UID with a random UID and store the mapping in a SQLite database, so that the same UID is replaced
+    with the same value across runs, e.g. for studies delivered in several parts.
+    The database is opened in WAL mode and can be shared by several worker processes. The UIDs of a dataset are
+    looked up and reserved at once with prepare, in a single transaction, instead of one round trip per UID.
+    """
+
+    # Maximum number of parameters in a SQLite query is 999 on old versions
+    _QUERY_SIZE = 500
+
+    def __init__(self, path: str, cache_size: int = 100000, timeout: float = 60.0):
+        """
+        Args:
+            path: path to the SQLite database, created if it does not exist
+            cache_size: maximum number of UIDs kept in memory by each process
+            timeout: time in seconds to wait for the lock of the database when other processes write to it
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self._cache = OrderedDict()
+        self._connection = None
+
+    def __getstate__(self):
+        # The connection is opened again by each process
+        return {"path": self.path, "cache_size": self.cache_size, "timeout": self.timeout}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS uid_map '
+                                     '(old_uid TEXT PRIMARY KEY, new_uid TEXT NOT NULL) WITHOUT ROWID')
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _remember(self, old_uid: str, new_uid: str) -> None:
+        self._cache[old_uid] = new_uid
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def prepare(self, old_uids: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up the replacement of the UIDs in the database and reserve a new UID for the unknown ones, in one
+        transaction
+        Args:
+            old_uids: UIDs which are going to be replaced
+        Returns:
+            dict: replacement of the UIDs which were not in the cache of the process. They are added to the cache,
+                which may evict some of them right away if there are more than cache_size
+        """
+        missing = list({uid for uid in old_uids if uid not in self._cache})
+        if not missing:
+            return {}
+
+        connection = self.connection
+        # The write lock is taken immediately, no other process can insert the same UIDs in the meantime
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            found = {}
+            for start in range(0, len(missing), self._QUERY_SIZE):
+                chunk = missing[start:start + self._QUERY_SIZE]
+                found.update(connection.execute(
+                    'SELECT old_uid, new_uid FROM uid_map WHERE old_uid IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk))
+            new_uids = [(uid, generate_uid(None)) for uid in missing if uid not in found]
+            if new_uids:
+                connection.executemany('INSERT INTO uid_map (old_uid, new_uid) VALUES (?, ?)', new_uids)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        found.update(new_uids)
+        for old_uid, new_uid in found.items():
+            self._remember(old_uid, new_uid)
+        return found
+
+    def __call__(self, old_uid: str) -> str:
+        new_uid = self._cache.get(old_uid)
+        if new_uid is None:
+            # Not read back from the cache, which may be full and have evicted it already
+            new_uid = self.prepare((old_uid,))[old_uid]
+        else:
+            self._cache.move_to_end(old_uid)
+        return new_uid
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM uid_map').fetchone()[0]
+
+    def export_csv(self, out_file: str) -> int:
+        """
+        Export the whole mapping, e.g. for an audit
+        Args:
+            out_file: path to the CSV file with the old_uid and new_uid columns
+        Returns:
+            int: number of exported UIDs
+        """
+        count = 0
+        with open(out_file, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(('old_uid', 'new_uid'))
+            for row in self.connection.execute('SELECT old_uid, new_uid FROM uid_map ORDER BY old_uid'):
+                writer.writerow(row)
+                count += 1
+        return count
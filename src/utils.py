@@ -1,52 +1,120 @@
+import collections
+import concurrent.futures
+import hashlib
+import hmac
 import os
+from typing import Iterator
 
 import pydicom
 
 
-def get_private_tag(dataset, tag):
+# Label hashed under a project secret to identify it, see key_id
+_KEY_ID_LABEL = b'dicom-anonymizer key id'
+
+
+def key_id(secret: bytes) -> str:
     """
-    Get the creator and element from tag
+    Identify a project secret without revealing it, e.g. in the fingerprint of a run
     Args:
-        dataset: pydicom dataset
-        tag: tag to get private creator and element
+        secret: project secret
     Returns:
-        private_tag: private tag with creator and element
+        str: hexadecimal HMAC-SHA256 of a fixed label under the secret
     """
-    element = dataset.get(tag)
+    return hmac.new(secret, _KEY_ID_LABEL, hashlib.sha256).hexdigest()
 
-    element_value = element.value
-    tag_group = element.tag.group
-    # The element is a private creator
-    if element_value in dataset.private_creators(tag_group):
-        return {"creator": {"tagGroup": tag_group, "creatorName": element.value}, "element": None}
-    # The element is a private element with an associated private creator
-    else:
-        # Shift the element tag in order to get the create_tag 0x1009 >> 8 will give 0x0010
-        create_tag_element = element.tag.element >> 8
-        create_tag = pydicom.tag.Tag(tag_group, create_tag_element)
-        create_dataset = dataset.get(create_tag)
-        # Define which offset should be applied to the creator to find this element 0x0010 << 8 will give 0x1000
-        offset_from_creator = element.tag.element - (create_tag_element << 8)
 
-        return {"creator": {"tagGroup": tag_group, "creatorName": create_dataset.value},
-                "element": {"element": element, "offset": offset_from_creator}}
+def is_sequence(dataset: pydicom.Dataset, tag: pydicom.tag.BaseTag) -> bool:
+    """
+    Check if an element is a sequence without converting the raw element when its VR is explicit
+    """
+    vr = dataset.get_item(tag).VR
+    if vr is None or vr == 'UN':
+        # Implicit VR or unknown VR, let pydicom resolve it
+        vr = dataset[tag].VR
+    return vr == 'SQ'
+
+
+def has_dicom_preamble(header: bytes) -> bool:
+    """
+    Check if the beginning of a file, e.g. of an archive member, is the preamble of a DICOM file
+    Args:
+        header: first bytes of the file, at least 0x84 bytes
+    Returns:
+        True if the DICM prefix follows the 128 bytes preamble
+    """
+    return header[0x80:0x84] == b'DICM'
 
 
 def is_dicom_file(filePath):
     """
     Check if input file is a DICOM File.
     Args:
-        filePath: Path to the file to check. Assume that the file exists.
+        filePath: Path to the file to check.
     Returns:
-        True if input file is a DICOM File. False otherwise.
-    Raises:
-        IOError: If input file does not exist.
+        True if input file is a regular DICOM File. False otherwise.
     """
-    tempFile = open(filePath, 'rb')
+    if not os.path.isfile(filePath):
+        return False
     try:
-        tempFile.seek(0x80, os.SEEK_SET)
-        return tempFile.read(4) == b'DICM'
+        with open(filePath, 'rb') as tempFile:
+            return has_dicom_preamble(tempFile.read(0x84))
     except IOError:
         return False
-    finally:
-        tempFile.close()
+
+
+def iter_files(folder: str, relative_folder: str = '') -> Iterator[str]:
+    """
+    Recursively yield the regular files of a folder as they are found, symbolic links to folders are not followed
+    Args:
+        folder: Path to the folder
+        relative_folder: Path of the folder relative to the root folder, used by the recursion
+    Returns:
+        Iterator of the paths of the files relative to the folder
+    """
+    try:
+        entries = os.scandir(os.path.join(folder, relative_folder))
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            relative_path = os.path.join(relative_folder, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from iter_files(folder, relative_path)
+                elif entry.is_file():
+                    yield relative_path
+            except OSError:
+                continue
+
+
+def iter_dicom_files(folder: str, sniff_threads: int = 0) -> Iterator[str]:
+    """
+    Recursively yield the DICOM files of a folder as they are found, see iter_files and is_dicom_file
+    Args:
+        folder: Path to the folder
+        sniff_threads: Number of threads checking the DICOM preamble of the files concurrently, the files are
+            checked in the current thread if 0
+    Returns:
+        Iterator of the paths of the DICOM files relative to the folder, in discovery order
+    """
+    def _check(relative_path):
+        return relative_path, is_dicom_file(os.path.join(folder, relative_path))
+
+    if sniff_threads <= 0:
+        checked = map(_check, iter_files(folder))
+        yield from (relative_path for relative_path, is_dicom in checked if is_dicom)
+        return
+
+    # Bounded number of pending checks, the discovery does not run ahead of the processing
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(sniff_threads) as executor:
+        for relative_path in iter_files(folder):
+            pending.append(executor.submit(_check, relative_path))
+            if len(pending) >= sniff_threads * 4:
+                relative_path, is_dicom = pending.popleft().result()
+                if is_dicom:
+                    yield relative_path
+        while pending:
+            relative_path, is_dicom = pending.popleft().result()
+            if is_dicom:
+                yield relative_path
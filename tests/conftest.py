@@ -0,0 +1,15 @@
+import pytest
+
+from src.actions import get_uid_mapper, set_uid_mapper
+from src.uid import KeyedUIDMapper
+
+
+@pytest.fixture
+def keyed_uids():
+    """
+    Derive the new UIDs from a fixed secret, so that two anonymizations of the same dataset give the same output
+    """
+    previous = get_uid_mapper()
+    set_uid_mapper(KeyedUIDMapper(b'test secret'))
+    yield
+    set_uid_mapper(previous)
@@ -0,0 +1,132 @@
+import copy
+
+import pydicom
+import pytest
+from pydicom.sequence import Sequence
+
+from benchmarks.synthetic import make_ct_dataset, make_nested_dataset
+from src.actions import delete, empty, get_uid, keep, replace
+from src.anonymizer import anonymize_dataset
+from src.profile import AnonymizationProfile, compile_profile
+
+# Overlay and curve data, as in the DICOM standard
+MASKED_RULES = {
+    (0x5000, 0x0000, 0xFF00, 0x0000): delete,
+    (0x6000, 0x3000, 0xFF00, 0xFFFF): delete,
+    (0x6000, 0x4000, 0xFF00, 0xFFFF): delete,
+}
+
+# Sequence without rule in the standard profile, its items are walked
+UNRULED_SEQUENCE = 'AnatomicRegionsInStudyCodeSequence'
+
+
+def _rule_of(profile: AnonymizationProfile, tag: pydicom.tag.BaseTag):
+    action = profile.actions.get((tag.group, tag.element))
+    if action is None:
+        for masked_tag, masked_action in profile.masked_actions:
+            if tag.group & masked_tag[2] == masked_tag[0] and tag.element & masked_tag[3] == masked_tag[1]:
+                return masked_action
+    return action
+
+
+def _apply_rules_per_rule(dataset: pydicom.Dataset, profile: AnonymizationProfile) -> None:
+    # Every individual rule is looked up in the dataset, then the repeating group rules are matched on its elements
+    for tag, action in profile.actions.items():
+        if tag[0] != 0x0002:
+            action(dataset, tag)
+    for tag, action in profile.masked_actions:
+        for element in list(dataset):
+            if element.tag.group & tag[2] == tag[0] and element.tag.element & tag[3] == tag[1]:
+                action(dataset, (element.tag.group, element.tag.element))
+    # The items of the sequences left to themselves, without rule or kept, get the rules as well
+    for element in list(dataset):
+        if element.VR == 'SQ' and _rule_of(profile, element.tag) in (None, keep):
+            for item in element.value:
+                _apply_rules_per_rule(item, profile)
+
+
+def anonymize_dataset_per_rule(dataset: pydicom.Dataset, profile: AnonymizationProfile) -> None:
+    """
+    Reference engine: one lookup per rule in each dataset, independent of the tag index of the profile
+    """
+    for tag, action in profile.actions.items():
+        if tag[0] == 0x0002:
+            action(dataset.file_meta, tag)
+    _apply_rules_per_rule(dataset, profile)
+    dataset.remove_private_tags()
+
+
+def _identifying_item() -> pydicom.Dataset:
+    item = pydicom.Dataset()
+    item.PatientName = 'Nested^Patient'
+    item.SOPInstanceUID = '1.2.3.4.5'
+    item.StudyDate = '20230412'
+    item.CodeMeaning = 'kept'
+    return item
+
+
+def _with_overlays(dataset: pydicom.Dataset) -> pydicom.Dataset:
+    """
+    Add overlay and curve elements, at the top level and in an item of a sequence without rule
+    """
+    item = pydicom.Dataset()
+    item.add_new(0x60020010, 'US', 16)
+    item.add_new(0x60023000, 'OW', bytes(4))
+    item.CodeMeaning = 'kept'
+    setattr(dataset, UNRULED_SEQUENCE, Sequence([item]))
+    dataset.add_new(0x60000010, 'US', 16)
+    dataset.add_new(0x60003000, 'OW', bytes(4))
+    dataset.add_new(0x60004000, 'LT', 'overlay comment')
+    dataset.add_new(0x50000005, 'US', 1)
+    return dataset
+
+
+def _with_nested_identifiers(dataset: pydicom.Dataset) -> pydicom.Dataset:
+    """
+    Add identifying elements in an item of a sequence without rule, of a kept sequence and of a sequence nested in
+    a kept sequence
+    """
+    setattr(dataset, UNRULED_SEQUENCE, Sequence([_identifying_item()]))
+    kept = _identifying_item()
+    kept.ContentSequence = Sequence([_identifying_item()])
+    dataset.ContentSequence = Sequence([kept])
+    return dataset
+
+
+FIXTURES = {
+    'ct': make_ct_dataset,
+    'nested': lambda: make_nested_dataset(depth=4, private_groups=5, private_elements=3),
+    'overlays': lambda: _with_overlays(make_ct_dataset()),
+    'nested_identifiers': lambda: _with_nested_identifiers(make_ct_dataset()),
+}
+
+RULES = {
+    'standard': None,
+    'masked': MASKED_RULES,
+    'user': {(0x0010, 0x0010): keep, (0x0008, 0x1030): replace, (0x0020, 0x0011): empty, (0x0028, 0x0010): delete},
+    'kept_sequence': {(0x0040, 0xA730): keep},
+}
+
+
+@pytest.mark.parametrize('rules', RULES)
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_single_pass_matches_per_rule_engine(keyed_uids, fixture, rules):
+    profile = compile_profile(RULES[rules])
+    template = FIXTURES[fixture]()
+    expected = copy.deepcopy(template)
+    anonymize_dataset_per_rule(expected, profile)
+    dataset = copy.deepcopy(template)
+    anonymize_dataset(dataset, profile=profile)
+    assert dataset.file_meta == expected.file_meta
+    assert dataset == expected
+
+
+def test_rules_apply_in_unruled_and_kept_sequences(keyed_uids):
+    dataset = _with_nested_identifiers(make_ct_dataset())
+    anonymize_dataset(dataset, profile=compile_profile(RULES['kept_sequence']))
+    kept = dataset.ContentSequence[0]
+    for item in (dataset[UNRULED_SEQUENCE][0], kept, kept.ContentSequence[0]):
+        assert item.PatientName == ''
+        assert item.SOPInstanceUID == get_uid('1.2.3.4.5')
+        assert item.StudyDate == '00010101'
+        assert item.CodeMeaning == 'kept'
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from src import compile_tags, dicomfields
+from src.dicomfields import (DATA_FOLDER, MASKED_TABLE_NAMES, TABLE_NAMES, TAG_TABLE_VERSIONS, convert_masked_tags,
+                             get_tag_tables)
+
+
+def _is_hex(value: str) -> bool:
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def _json_tables(version: str) -> dict:
+    with open(os.path.join(DATA_FOLDER, 'dicom_fields_{}.json'.format(version)), 'r') as json_file:
+        return json.load(json_file)
+
+
+@pytest.mark.parametrize('version', TAG_TABLE_VERSIONS)
+def test_generated_module_matches_json(version):
+    module = get_tag_tables(version)
+    assert module.SOURCE_SHA256 == compile_tags.source_sha256(version)
+    for name, entries in _json_tables(version).items():
+        # Plain tags as written in the JSON file, the repeating groups (0x60xx) are in the masked tables and the
+        # descriptions (0xgggg) are skipped
+        expected = tuple((int(group, 16), int(element, 16)) for group, element in (entry['tag'] for entry in entries)
+                         if _is_hex(group) and _is_hex(element))
+        assert getattr(module, name) == expected, name
+
+
+@pytest.mark.parametrize('version', TAG_TABLE_VERSIONS)
+def test_generated_module_is_up_to_date(version):
+    assert compile_tags.check(version) == []
+    namespace = {}
+    exec(compile_tags.render_module(version), namespace)
+    module = get_tag_tables(version)
+    for name in TABLE_NAMES + MASKED_TABLE_NAMES:
+        assert namespace[name] == getattr(module, name), name
+
+
+def test_masked_tables_have_the_repeating_groups():
+    module = get_tag_tables('latest')
+    assert set(module.X_MASKED_TAGS) == {(0x5000, 0x0000, 0xFF01, 0x0000), (0x6000, 0x4000, 0xFF01, 0xFFFF),
+                                         (0x6000, 0x3000, 0xFF01, 0xFFFF)}
+    assert all(getattr(module, name) == () for name in MASKED_TABLE_NAMES if name != 'X_MASKED_TAGS')
+
+
+def test_lazy_attributes():
+    module = get_tag_tables()
+    assert dicomfields.D_TAGS == list(module.D_TAGS)
+    assert dicomfields.X_MASKED_TAGS == list(module.X_MASKED_TAGS)
+    assert len(dicomfields.ALL_TAGS) == sum(len(getattr(module, name)) for name in TABLE_NAMES)
+    with pytest.raises(ValueError):
+        get_tag_tables('1999z')
+
+
+def test_convert_masked_tags():
+    tags = [{'tag': ['0x60xx', '0x3000']}, {'tag': ['0x50xx', '0xxxxx']}, {'tag': ['0x0010', '0x00x0']},
+            {'tag': ['0x0010', '0x0010']}, {'tag': ['0xgggg', '0xeeee']}]
+    assert convert_masked_tags(tags) == [(0x6000, 0x3000, 0xFF01, 0xFFFF), (0x5000, 0x0000, 0xFF01, 0x0000),
+                                         (0x0010, 0x0000, 0xFFFF, 0xFF0F)]
+
+
+@pytest.mark.parametrize('group, element, matches', [
+    (0x6000, 0x3000, True),
+    (0x60FE, 0x3000, True),
+    (0x6002, 0x4000, False),
+    # Odd groups are private, never matched by the repeating groups
+    (0x6001, 0x3000, False),
+    (0x6100, 0x3000, False),
+])
+def test_masked_tag_matching(group, element, matches):
+    (value_group, value_element, group_mask, element_mask), = convert_masked_tags([{'tag': ['0x60xx', '0x3000']}])
+    assert (group & group_mask == value_group and element & element_mask == value_element) == matches
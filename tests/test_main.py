@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+import pydicom
+import pytest
+from pydicom.uid import generate_uid
+
+from benchmarks.synthetic import make_ct_dataset
+from main import anonymize
+from src.uid import KeyedUIDMapper, PersistentUIDMapper, RandomUIDMapper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def study_folder(tmp_path):
+    """
+    Folder of 8 instances of the same study, series and frame of reference
+    """
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    template = make_ct_dataset(8, 8)
+    for index in range(8):
+        template.SOPInstanceUID = template.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        template.InstanceNumber = index + 1
+        template.save_as(str(folder / '{:02d}.dcm'.format(index)), enforce_file_format=True)
+    return folder
+
+
+@pytest.mark.parametrize('mapper', ['keyed', 'store'])
+def test_study_uids_are_shared_by_the_workers(tmp_path, study_folder, mapper):
+    uid_mapper = KeyedUIDMapper(b'test secret') if mapper == 'keyed' else PersistentUIDMapper(
+        str(tmp_path / 'uids.sqlite'))
+    output = tmp_path / 'out'
+    output.mkdir()
+    errors = anonymize(str(study_folder), str(output), None, True, workers=2, uid_mapper=uid_mapper)
+    assert errors == []
+    datasets = [pydicom.dcmread(str(output / name)) for name in sorted(os.listdir(output))]
+    assert len(datasets) == 8
+    original = pydicom.dcmread(str(study_folder / '00.dcm'))
+    for keyword in ('StudyInstanceUID', 'SeriesInstanceUID', 'FrameOfReferenceUID'):
+        values = {dataset[keyword].value for dataset in datasets}
+        assert len(values) == 1, keyword
+        assert values != {original[keyword].value}, keyword
+    assert len({dataset.SOPInstanceUID for dataset in datasets}) == 8
+
+
+@pytest.mark.parametrize('uid_mapper', [None, RandomUIDMapper()])
+def test_random_uids_require_a_single_worker(tmp_path, study_folder, uid_mapper):
+    output = tmp_path / 'out'
+    output.mkdir()
+    with pytest.raises(ValueError):
+        anonymize(str(study_folder), str(output), None, True, workers=2, uid_mapper=uid_mapper)
+
+
+def test_command_line_rejects_workers_with_random_uids(tmp_path, study_folder):
+    output = tmp_path / 'out'
+    output.mkdir()
+    process = subprocess.run([sys.executable, 'main.py', str(study_folder), str(output), '--workers', '2'], cwd=ROOT,
+                             capture_output=True, text=True)
+    assert process.returncode == 2
+    assert '--workers above 1 requires' in process.stderr
+    assert os.listdir(output) == []
+
+
+def test_command_line_checks_the_uid_store_export_first(tmp_path, study_folder):
+    output = tmp_path / 'out'
+    output.mkdir()
+    process = subprocess.run([sys.executable, 'main.py', str(study_folder), str(output), '--uid-store-export',
+                              str(tmp_path / 'uids.csv')], cwd=ROOT, capture_output=True, text=True)
+    assert process.returncode == 2
+    assert '--uid-store-export requires --uid-store' in process.stderr
+    assert os.listdir(output) == []
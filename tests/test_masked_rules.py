@@ -0,0 +1,71 @@
+import copy
+
+import pydicom
+import pytest
+from pydicom.sequence import Sequence
+
+from src.anonymizer import anonymize_dataset
+from src.profile import AnonymizationProfile, compile_profile
+
+ELEMENTS = [0x0010, 0x0011, 0x3000, 0x4000, 0x4001, 0x1500]
+
+
+def _repeating_groups_dataset() -> pydicom.Dataset:
+    """
+    Elements of every even group of the overlays and of a few curve groups, of their odd neighbours and of the next
+    groups, at the top level and in an item of a sequence
+    """
+    def add_elements(dataset):
+        for group in list(range(0x6000, 0x6100)) + [0x5000, 0x5002, 0x50FE, 0x5001, 0x5100, 0x6100]:
+            for element in ELEMENTS:
+                dataset.add_new(group << 16 | element, 'US', element)
+
+    dataset = pydicom.Dataset()
+    dataset.file_meta = pydicom.dataset.FileMetaDataset()
+    add_elements(dataset)
+    item = pydicom.Dataset()
+    add_elements(item)
+    dataset.AnatomicRegionsInStudyCodeSequence = Sequence([item])
+    return dataset
+
+
+def _walk_per_rule(dataset: pydicom.Dataset, profile: AnonymizationProfile) -> None:
+    """
+    Reference: one walk of the whole dataset per repeating group rule, as before the mask tables
+    """
+    for tag, action in profile.masked_actions:
+        def _range_callback(dataset, data_element):
+            if data_element.tag.group & tag[2] == tag[0] and data_element.tag.element & tag[3] == tag[1]:
+                action(dataset, (data_element.tag.group, data_element.tag.element))
+        dataset.walk(_range_callback)
+
+
+def test_standard_profile_has_the_repeating_groups():
+    masked = {tag for tag, _ in compile_profile().masked_actions}
+    assert masked == {(0x5000, 0x0000, 0xFF01, 0x0000), (0x6000, 0x3000, 0xFF01, 0xFFFF),
+                      (0x6000, 0x4000, 0xFF01, 0xFFFF)}
+
+
+@pytest.mark.parametrize('delete_private_tags', [False, True])
+def test_mask_tables_match_walk_per_rule(delete_private_tags):
+    # Only the repeating group rules of the standard profile, the individual rules do not hide any masked match
+    profile = AnonymizationProfile({}, compile_profile().masked_actions)
+    template = _repeating_groups_dataset()
+    expected = copy.deepcopy(template)
+    _walk_per_rule(expected, profile)
+    if delete_private_tags:
+        expected.remove_private_tags()
+    dataset = copy.deepcopy(template)
+    anonymize_dataset(dataset, delete_private_tags=delete_private_tags, profile=profile)
+    assert dataset == expected
+
+
+def test_repeating_groups_are_deleted():
+    dataset = _repeating_groups_dataset()
+    anonymize_dataset(dataset, delete_private_tags=False, profile=compile_profile())
+    tags = {int(element.tag) for element in dataset.iterall()}
+    # Curve groups are deleted whole, overlay data and comments in every even group
+    assert not any(tag >> 24 == 0x50 and not tag >> 16 & 1 for tag in tags)
+    assert {0x60003000, 0x60FE4000, 0x60223000} & tags == set()
+    # Other overlay elements, odd groups and the groups past the repeating ones are kept
+    assert {0x60000010, 0x60FE4001, 0x60013000, 0x61003000, 0x50013000, 0x51000010} <= tags
@@ -0,0 +1,73 @@
+import copy
+
+import pydicom
+import pytest
+from pydicom.dataelem import DataElement
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRBigEndian, ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from benchmarks.synthetic import make_ct_dataset
+from src import patching
+from src.actions import keep
+from src.anonymizer import PATCHED, REWRITTEN, anonymize_dicom_file
+from src.profile import compile_profile
+
+# The UIDs keep their length, every other change of the fixture keeps its length as well
+KEEP_UIDS = {(0x0002, 0x0003): keep, (0x0008, 0x0018): keep}
+
+SEQUENCE_TAG = 0x00080063
+
+
+def _write_fixture(path: str, transfer_syntax: str) -> None:
+    """
+    Write a file whose only identifying values are dates, one of them in a sequence of undefined length, which
+    pydicom converts while reading
+    """
+    template = make_ct_dataset()
+    dataset = pydicom.Dataset()
+    dataset.file_meta = template.file_meta
+    dataset.file_meta.TransferSyntaxUID = transfer_syntax
+    dataset.SOPClassUID = template.SOPClassUID
+    dataset.SOPInstanceUID = template.SOPInstanceUID
+    dataset.StudyDate = '20230412'
+    item = pydicom.Dataset()
+    item.StudyDate = '20230412'
+    item.CodeMeaning = 'kept'
+    dataset.AnatomicRegionsInStudyCodeSequence = Sequence([item])
+    dataset[SEQUENCE_TAG].is_undefined_length = True
+    dataset.save_as(path, enforce_file_format=True)
+
+
+@pytest.mark.parametrize('transfer_syntax', [ExplicitVRLittleEndian, ImplicitVRLittleEndian, ExplicitVRBigEndian])
+def test_converted_elements_are_patched(tmp_path, transfer_syntax):
+    in_file = str(tmp_path / 'in.dcm')
+    _write_fixture(in_file, transfer_syntax)
+    assert isinstance(pydicom.dcmread(in_file).get_item(SEQUENCE_TAG), DataElement)
+
+    profile = compile_profile(KEEP_UIDS)
+    assert anonymize_dicom_file(in_file, str(tmp_path / 'patched.dcm'), profile=profile,
+                                patch_in_place=True) == PATCHED
+    assert anonymize_dicom_file(in_file, str(tmp_path / 'rewritten.dcm'), profile=profile) == REWRITTEN
+    patched = pydicom.dcmread(str(tmp_path / 'patched.dcm'))
+    assert patched.AnatomicRegionsInStudyCodeSequence[0].StudyDate == '00010101'
+    assert patched == pydicom.dcmread(str(tmp_path / 'rewritten.dcm'))
+
+
+@pytest.mark.parametrize('transfer_syntax', [ExplicitVRLittleEndian, ImplicitVRLittleEndian])
+def test_value_offset_from_the_tag_position(tmp_path, transfer_syntax):
+    in_file = str(tmp_path / 'in.dcm')
+    _write_fixture(in_file, transfer_syntax)
+    dataset = pydicom.dcmread(in_file)
+    element = dataset.get_item(SEQUENCE_TAG)
+    encoding = dataset.original_encoding
+    header_length = 8 if encoding[0] else 12
+    with open(in_file, 'rb') as fp:
+        value_offset = patching._value_offset(fp, element, encoding)
+        assert value_offset == element.file_tell
+        # Position of the tag rather than of the value
+        at_tag = copy.copy(element)
+        at_tag.file_tell = value_offset - header_length
+        assert patching._value_offset(fp, at_tag, encoding) == value_offset
+        # Neither the position of the tag nor of the value
+        at_tag.file_tell = value_offset + 1
+        assert patching._value_offset(fp, at_tag, encoding) is None
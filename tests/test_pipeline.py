@@ -0,0 +1,44 @@
+import asyncio
+import io
+import threading
+
+from benchmarks.synthetic import make_ct_dataset
+from src.manifest import SKIPPED, hash_bytes
+from src.pipeline import run_pipeline
+from src.profile import compile_profile
+
+
+def _instance() -> bytes:
+    buffer = io.BytesIO()
+    make_ct_dataset(8, 8).save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def test_tasks_are_produced_off_the_event_loop(keyed_uids, tmp_path):
+    data = _instance()
+    files = {str(tmp_path / 'in{}.dcm'.format(index)): data for index in range(6)}
+    for path in files:
+        with open(path, 'wb') as fp:
+            fp.write(data)
+    written = {}
+    results = []
+    task_threads = set()
+
+    def tasks():
+        for index, path in enumerate(sorted(files)):
+            task_threads.add(threading.get_ident())
+            # The hash of the first file did not change, it is skipped
+            yield path, str(tmp_path / 'out{}.dcm'.format(index)), hash_bytes(data) if index == 0 else None
+
+    async def run():
+        loop_thread = threading.get_ident()
+        await run_pipeline(tasks(), compile_profile(), on_result=results.append, io_concurrency=3, hash_inputs=True,
+                           write=written.__setitem__)
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert loop_thread not in task_threads
+    assert sorted(result['path'] for result in results) == sorted(files)
+    assert all(result['error'] is None for result in results)
+    assert [result['path'] for result in results if result['written'] == SKIPPED] == [str(tmp_path / 'in0.dcm')]
+    assert sorted(written) == [str(tmp_path / 'out{}.dcm'.format(index)) for index in range(1, 6)]
@@ -0,0 +1,45 @@
+import pydicom
+from pydicom.sequence import Sequence
+
+from benchmarks.synthetic import make_ct_dataset
+from src.actions import keep
+from src.anonymizer import anonymize_dataset
+from src.private_tags import delete_private_tags
+from src.profile import compile_profile
+
+
+def _with_private_sequence() -> pydicom.Dataset:
+    """
+    CT dataset with a private sequence whose item has an allowed and a disallowed private element
+    """
+    dataset = make_ct_dataset()
+    item = pydicom.Dataset()
+    item.PatientName = 'Nested^Patient'
+    block = item.private_block(0x0015, 'INNER VENDOR', create=True)
+    block.add_new(0x01, 'LO', 'identifying value')
+    block.add_new(0x02, 'LO', 'allowed value')
+    dataset.private_block(0x0013, 'OUTER VENDOR', create=True).add_new(0x10, 'SQ', Sequence([item]))
+    return dataset
+
+
+def test_kept_private_sequence_is_filtered(keyed_uids):
+    dataset = _with_private_sequence()
+    anonymize_dataset(dataset, profile=compile_profile({(0x0013, 0x1010): keep, (0x0015, 0x1002): keep}))
+    assert [int(tag) for tag in dataset.keys() if tag.group & 1] == [0x00130010, 0x00131010]
+    item = dataset[0x00131010].value[0]
+    assert [int(tag) for tag in item.keys()] == [0x00100010, 0x00150010, 0x00151002]
+    assert item.PatientName == ''
+    assert item[0x00151002].value == 'allowed value'
+
+
+def test_private_sequence_is_deleted_unless_kept(keyed_uids):
+    dataset = _with_private_sequence()
+    anonymize_dataset(dataset, profile=compile_profile({(0x0015, 0x1002): keep}))
+    assert not any(element.tag.is_private for element in dataset.iterall())
+
+
+def test_nothing_kept():
+    dataset = _with_private_sequence()
+    # Private creators (0009,0010) and (0013,0010), 2 elements of the CT dataset and the private sequence
+    assert delete_private_tags(dataset) == 5
+    assert not any(element.tag.is_private for element in dataset.iterall())
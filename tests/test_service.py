@@ -0,0 +1,126 @@
+import http.client
+import io
+import socket
+import threading
+
+import pydicom
+import pytest
+
+from benchmarks.synthetic import make_ct_dataset
+from src.actions import get_uid_mapper, set_uid_mapper
+from src.anonymizer import anonymize_bytes
+from src.profile import compile_profile
+from src.service import DICOM_CONTENT_TYPE, AnonymizationService, make_multipart, make_server, parse_multipart
+from src.uid import KeyedUIDMapper
+
+SECRET = b'test secret'
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__('localhost')
+        self.unix_socket = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_socket)
+
+
+def _instance() -> bytes:
+    buffer = io.BytesIO()
+    make_ct_dataset(8, 8).save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = AnonymizationService(compile_profile(), uid_mapper=KeyedUIDMapper(SECRET), workers=1)
+    yield service
+    service.close()
+
+
+@pytest.fixture(params=['tcp', 'unix'])
+def connect(request, service, tmp_path):
+    unix_socket = str(tmp_path / 'service.sock') if request.param == 'unix' else None
+    server = make_server(service, port=0, unix_socket=unix_socket)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def _connect():
+        if unix_socket is not None:
+            return _UnixHTTPConnection(unix_socket)
+        return http.client.HTTPConnection(*server.server_address[:2])
+
+    yield _connect
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _request(connection, method: str, path: str, body: bytes = None, content_type: str = DICOM_CONTENT_TYPE):
+    connection.request(method, path, body, {'Content-Type': content_type} if body is not None else {})
+    response = connection.getresponse()
+    return response.status, response.getheader('Content-Type'), response.read()
+
+
+def _reference(data: bytes) -> bytes:
+    # Output of the same instance anonymized in the current process with the same UIDs
+    previous = get_uid_mapper()
+    set_uid_mapper(KeyedUIDMapper(SECRET))
+    try:
+        return anonymize_bytes(data)
+    finally:
+        set_uid_mapper(previous)
+
+
+def test_single_instance(connect):
+    data = _instance()
+    status, content_type, body = _request(connect(), 'POST', '/anonymize', data)
+    assert status == 200
+    assert content_type == DICOM_CONTENT_TYPE
+    assert body == _reference(data)
+    assert pydicom.dcmread(io.BytesIO(body)).PatientName != 'Patient^Test'
+
+
+def test_multipart_batch(connect):
+    data = _instance()
+    request_type, request_body = make_multipart([(DICOM_CONTENT_TYPE, data), (DICOM_CONTENT_TYPE, b'not dicom'),
+                                                 (DICOM_CONTENT_TYPE, data)])
+    status, content_type, body = _request(connect(), 'POST', '/anonymize', request_body, request_type)
+    assert status == 200
+    assert content_type.startswith('multipart/related')
+    first, error, last = parse_multipart(content_type, body)
+    assert first == last == _reference(data)
+    assert b'text/plain' in body
+    assert error.startswith(b'InvalidDicomError')
+
+
+def test_errors(connect):
+    connection = connect()
+    status, _, body = _request(connection, 'POST', '/anonymize', b'not dicom')
+    assert status == 422
+    assert body
+    status, _, body = _request(connection, 'POST', '/anonymize', b'--x--\r\n', 'multipart/related')
+    assert (status, body) == (400, b'Missing multipart boundary')
+    assert _request(connection, 'POST', '/other', b'')[0] == 404
+    assert _request(connection, 'GET', '/other')[0] == 404
+    assert _request(connection, 'GET', '/health')[::2] == (200, b'ok')
+    status, _, body = _request(connection, 'GET', '/metrics')
+    assert status == 200
+    assert b'dicom_anonymizer_errors_total' in body
+
+
+def test_unix_socket_path_must_be_a_socket(service, tmp_path):
+    path = tmp_path / 'service.sock'
+    path.write_bytes(b'not a socket')
+    with pytest.raises(FileExistsError):
+        make_server(service, unix_socket=str(path))
+    assert path.read_bytes() == b'not a socket'
+
+    # A socket left by a previous run is replaced
+    path.unlink()
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+    server = make_server(service, unix_socket=str(path))
+    server.server_close()
@@ -0,0 +1,58 @@
+import os
+
+import pydicom
+import pytest
+from pydicom.encaps import encapsulate
+from pydicom.uid import ExplicitVRBigEndian, ExplicitVRLittleEndian, ImplicitVRLittleEndian, JPEGBaseline8Bit
+
+from benchmarks.synthetic import make_ct_dataset
+from src import streaming
+from src.anonymizer import anonymize_dicom_file
+
+
+def _native(transfer_syntax: str, rows: int = 32) -> pydicom.Dataset:
+    dataset = make_ct_dataset(rows, 32)
+    dataset.file_meta.TransferSyntaxUID = transfer_syntax
+    dataset.PixelData = os.urandom(rows * 32 * 2)
+    return dataset
+
+
+def _encapsulated() -> pydicom.Dataset:
+    dataset = make_ct_dataset(32, 32)
+    dataset.file_meta.TransferSyntaxUID = JPEGBaseline8Bit
+    dataset.NumberOfFrames = 3
+    # Odd sizes, the fragments are padded
+    dataset.PixelData = encapsulate([os.urandom(101 + frame) for frame in range(3)])
+    dataset['PixelData'].VR = 'OB'
+    return dataset
+
+
+def _trailing_padding() -> pydicom.Dataset:
+    dataset = _native(ExplicitVRLittleEndian)
+    dataset.DataSetTrailingPadding = bytes(8)
+    return dataset
+
+
+FIXTURES = {
+    'explicit_little': lambda: _native(ExplicitVRLittleEndian),
+    'implicit_little': lambda: _native(ImplicitVRLittleEndian),
+    'explicit_big': lambda: _native(ExplicitVRBigEndian),
+    # Copied in several chunks
+    'large': lambda: _native(ExplicitVRLittleEndian, 2 * streaming.CHUNK_SIZE // 64 + 1),
+    'encapsulated': _encapsulated,
+    'trailing_padding': _trailing_padding,
+}
+
+
+@pytest.mark.parametrize('options', [{'stream_pixel_data': True}, {'patch_in_place': True}])
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_streamed_file_matches_loaded_file(keyed_uids, tmp_path, fixture, options):
+    original = FIXTURES[fixture]()
+    in_file = str(tmp_path / 'in.dcm')
+    original.save_as(in_file, enforce_file_format=True)
+    anonymize_dicom_file(in_file, str(tmp_path / 'loaded.dcm'))
+    anonymize_dicom_file(in_file, str(tmp_path / 'streamed.dcm'), **options)
+
+    streamed = (tmp_path / 'streamed.dcm').read_bytes()
+    assert streamed == (tmp_path / 'loaded.dcm').read_bytes()
+    assert pydicom.dcmread(str(tmp_path / 'streamed.dcm')).PixelData == original.PixelData
@@ -0,0 +1,21 @@
+import pytest
+
+from src.uid import PersistentUIDMapper
+
+
+@pytest.mark.parametrize('cache_size', [0, 1, 3])
+def test_persistent_mapper_with_a_full_cache(tmp_path, cache_size):
+    path = str(tmp_path / 'uids.sqlite')
+    mapper = PersistentUIDMapper(path, cache_size=cache_size)
+    uids = ['1.2.{}'.format(index) for index in range(10)]
+    # More UIDs than the cache can hold, the first ones are evicted by the last ones
+    prepared = mapper.prepare(uids)
+    assert sorted(prepared) == sorted(uids)
+    new_uids = [mapper(uid) for uid in uids]
+    assert new_uids == [prepared[uid] for uid in uids]
+    assert [mapper(uid) for uid in reversed(uids)] == new_uids[::-1]
+    assert len(set(new_uids)) == len(uids)
+
+    # Another process of the same store gets the same UIDs
+    assert [PersistentUIDMapper(path, cache_size=cache_size)(uid) for uid in uids] == new_uids
+    assert len(mapper) == len(uids)